@@ -0,0 +1,408 @@
+"""
+Harness Fakes
+In-process stand-ins for OpenAI (chat and batch), Gmail, Twilio, Stripe and
+Whisper with configurable latency and error injection.
+"""
+
+import asyncio
+import base64
+import csv
+import itertools
+import json
+import random
+import re
+import threading
+import time
+from types import SimpleNamespace
+from typing import Optional, Dict, Any, List
+
+from services.gmail_service import GmailService
+from services.metrics import external_call
+
+
+class InjectedFault(Exception):
+    """Raised by a fake when the fault injector decides a call should fail."""
+
+    # Looks like a 503 to retry logic
+    status_code = 503
+
+
+class FaultInjector:
+    """Adds latency and random failures to fake service calls."""
+
+    def __init__(
+        self,
+        latency_ms: Optional[Dict[str, float]] = None,
+        error_rate: Optional[Dict[str, float]] = None,
+        jitter: float = 0.25,
+        seed: Optional[int] = None
+    ):
+        """
+        Initialize the injector.
+
+        Args:
+            latency_ms: Mean latency per service name (openai, gmail, twilio, stripe, whisper)
+            error_rate: Probability (0-1) that a call to each service fails
+            jitter: Relative spread of latency around the mean
+            seed: Random seed for reproducible runs
+        """
+        self.latency_ms = latency_ms or {}
+        self.error_rate = error_rate or {}
+        self.jitter = jitter
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def _draw(self, service: str) -> tuple:
+        with self._lock:
+            spread = self._random.uniform(1 - self.jitter, 1 + self.jitter)
+            fail = self._random.random() < self.error_rate.get(service, 0.0)
+        return self.latency_ms.get(service, 0.0) * spread / 1000.0, fail
+
+    def apply(self, service: str) -> None:
+        """Sleep for the configured latency, then maybe raise InjectedFault."""
+        delay, fail = self._draw(service)
+        if delay > 0:
+            time.sleep(delay)
+        if fail:
+            raise InjectedFault(f"Injected {service} failure")
+
+    async def apply_async(self, service: str) -> None:
+        """Like apply(), without blocking the event loop."""
+        delay, fail = self._draw(service)
+        if delay > 0:
+            await asyncio.sleep(delay)
+        if fail:
+            raise InjectedFault(f"Injected {service} failure")
+
+
+def load_catalog(pricing_csv_path: str = "data/pricing.csv") -> List[Dict[str, Any]]:
+    """Load service names and keywords from the pricing CSV without pandas."""
+    with open(pricing_csv_path, 'r') as f:
+        rows = list(csv.DictReader(f))
+    for row in rows:
+        keywords = [k.strip().lower() for k in (row.get("Keywords") or "").split(",") if k.strip()]
+        row["_keywords"] = keywords + [row["Service Name"].lower()]
+    return rows
+
+
+class FakeOpenAI:
+    """Mimics `AsyncOpenAI().chat.completions.create` with a keyword-matching parser."""
+
+    def __init__(self, faults: FaultInjector, catalog: List[Dict[str, Any]]):
+        self.faults = faults
+        self.catalog = catalog
+        self.calls = 0
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self._create))
+
+    # Share of the latency spent before the first streamed token
+    TIME_TO_FIRST_TOKEN = 0.25
+
+    # Pieces a streamed answer is split into
+    STREAM_CHUNKS = 20
+
+    async def _create(self, model: str = None, messages: List[Dict[str, str]] = None, stream: bool = False, **kwargs):
+        self.calls += 1
+        prompt = messages[-1]["content"] if messages else ""
+        content = json.dumps(self._parse_prompt(prompt), indent=2)
+        usage = SimpleNamespace(
+            prompt_tokens=sum(len(m["content"]) for m in messages or []) // 4,
+            completion_tokens=len(content) // 4
+        )
+
+        if stream:
+            delay, fail = self.faults._draw("openai")
+            await asyncio.sleep(delay * self.TIME_TO_FIRST_TOKEN)
+            if fail:
+                raise InjectedFault("Injected openai failure")
+            return self._stream(content, usage, delay * (1 - self.TIME_TO_FIRST_TOKEN))
+
+        await self.faults.apply_async("openai")
+        return SimpleNamespace(
+            choices=[SimpleNamespace(message=SimpleNamespace(content=content))],
+            usage=usage
+        )
+
+    async def _stream(self, content: str, usage: SimpleNamespace, duration: float):
+        """Yield the answer in chunks spread over `duration`, then a usage-only chunk."""
+        size = max(1, len(content) // self.STREAM_CHUNKS + 1)
+        for start in range(0, len(content), size):
+            await asyncio.sleep(duration / self.STREAM_CHUNKS)
+            delta = SimpleNamespace(content=content[start:start + size])
+            yield SimpleNamespace(choices=[SimpleNamespace(delta=delta)], usage=None)
+        yield SimpleNamespace(choices=[], usage=usage)
+
+    def _parse_prompt(self, prompt: str) -> Dict[str, Any]:
+        """Answer a user message, picking service IDs from its catalog shortlist if it has one."""
+        shortlist, _, email = prompt.rpartition("Parse this email:\n\n")
+        ids = {}
+        for line in shortlist.splitlines():
+            fields = [field.strip() for field in line.split("|")]
+            if len(fields) == 4:
+                ids[fields[1]] = fields[0]
+        parsed = self._parse(email)
+        for item in parsed["items"]:
+            item["service_id"] = ids.get(item["service_requested"])
+        return parsed
+
+    def _parse(self, email: str) -> Dict[str, Any]:
+        text = email.lower()
+        items = []
+        for row in self.catalog:
+            hits = sum(1 for keyword in row["_keywords"] if keyword in text)
+            if hits >= 2 or row["Service Name"].lower() in text:
+                quantity = 1
+                match = re.search(r"(\d+)\s+" + re.escape(row["_keywords"][0]), text)
+                if match:
+                    quantity = int(match.group(1))
+                items.append({"service_requested": row["Service Name"], "quantity": quantity})
+
+        lines = [line.strip() for line in email.strip().splitlines() if line.strip()]
+        customer_name = lines[-1] if lines and len(lines[-1].split()) in (2, 3) else "Customer"
+
+        return {
+            "customer_name": customer_name,
+            "confidence_score": 85 if items else 30,
+            "ai_reasoning": ["Matched services by keyword (harness fake)"],
+            "job_type": "HVAC",
+            "items": items or [{"service_requested": "Service Call", "quantity": 1}]
+        }
+
+
+class FakeBatchAPI:
+    """
+    Mimics the `files` and `batches` parts of the OpenAI client for batch jobs.
+
+    Jobs run on a background thread: after the `openai_batch` latency every
+    request is answered by the FakeOpenAI parser, or fails at the `openai`
+    error rate. Status checks and downloads fail at the `openai_poll` error rate.
+    """
+
+    def __init__(self, faults: FaultInjector, openai: FakeOpenAI):
+        self.faults = faults
+        self.openai = openai
+        self._files: Dict[str, str] = {}
+        self._batches: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.files = SimpleNamespace(create=self._create_file, content=self._file_content)
+        self.batches = SimpleNamespace(create=self._create_batch, retrieve=self._retrieve, cancel=self._cancel)
+
+    def _create_file(self, file: tuple, purpose: str):
+        file_id = f"file-{next(self._ids)}"
+        self._files[file_id] = file[1].decode("utf-8")
+        return SimpleNamespace(id=file_id, purpose=purpose)
+
+    def _file_content(self, file_id: str):
+        self.faults.apply("openai_poll")
+        return SimpleNamespace(text=self._files[file_id])
+
+    def _create_batch(self, input_file_id: str, endpoint: str, completion_window: str, **kwargs):
+        batch_id = f"batch-{next(self._ids)}"
+        with self._lock:
+            self._batches[batch_id] = {
+                "id": batch_id, "status": "validating", "input_file_id": input_file_id,
+                "output_file_id": None, "error_file_id": None
+            }
+        threading.Thread(target=self._run, args=(batch_id,), daemon=True).start()
+        return self._status(batch_id)
+
+    def _retrieve(self, batch_id: str):
+        self.faults.apply("openai_poll")
+        return self._status(batch_id)
+
+    def _status(self, batch_id: str):
+        with self._lock:
+            return SimpleNamespace(**self._batches[batch_id])
+
+    def _cancel(self, batch_id: str):
+        with self._lock:
+            if self._batches[batch_id]["status"] not in ("completed", "failed", "cancelled"):
+                self._batches[batch_id]["status"] = "cancelling"
+        return self._status(batch_id)
+
+    def _run(self, batch_id: str) -> None:
+        with self._lock:
+            batch = self._batches[batch_id]
+            if batch["status"] == "validating":
+                batch["status"] = "in_progress"
+        delay, _ = self.faults._draw("openai_batch")
+        time.sleep(delay)
+
+        outputs, errors = [], []
+        for line in self._files[batch["input_file_id"]].splitlines():
+            request = json.loads(line)
+            _, fail = self.faults._draw("openai")
+            if fail:
+                errors.append({
+                    "id": f"req-{next(self._ids)}", "custom_id": request["custom_id"],
+                    "response": {"status_code": 500, "body": {"error": {"message": "Injected openai failure"}}},
+                    "error": None
+                })
+                continue
+            self.openai.calls += 1
+            messages = request["body"]["messages"]
+            content = json.dumps(self.openai._parse_prompt(messages[-1]["content"]))
+            outputs.append({
+                "id": f"req-{next(self._ids)}", "custom_id": request["custom_id"],
+                "response": {"status_code": 200, "body": {
+                    "choices": [{"index": 0, "message": {"role": "assistant", "content": content}}],
+                    "usage": {"prompt_tokens": sum(len(m["content"]) for m in messages) // 4, "completion_tokens": len(content) // 4}
+                }},
+                "error": None
+            })
+
+        with self._lock:
+            for records, field in ((outputs, "output_file_id"), (errors, "error_file_id")):
+                if records:
+                    file_id = f"file-{next(self._ids)}"
+                    self._files[file_id] = "\n".join(json.dumps(record) for record in records) + "\n"
+                    batch[field] = file_id
+            batch["status"] = "cancelled" if batch["status"] == "cancelling" else "completed"
+
+
+class FakeGmailService:
+    """In-memory inbox with the same interface as GmailService."""
+
+    def __init__(self, faults: FaultInjector):
+        self.faults = faults
+        self.mock_mode = False
+        self.messages: Dict[str, Dict[str, Any]] = {}
+        self.unread: List[str] = []
+        self.drafts: List[Dict[str, Any]] = []
+        # (history ID, message ID) for every delivery, oldest first
+        self.history: List[tuple] = []
+        self.history_id = 1000
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _call(self, operation: str):
+        return external_call("gmail", operation)
+
+    def deliver(self, from_email: str, body: str, subject: str = "Quote request") -> str:
+        """Put a new unread message into the inbox and return its ID."""
+        msg_id = f"fake{next(self._ids):08d}"
+        self.messages[msg_id] = {
+            "id": msg_id,
+            "threadId": f"thread-{msg_id}",
+            "payload": {
+                "mimeType": "multipart/alternative",
+                "headers": [
+                    {"name": "From", "value": from_email},
+                    {"name": "Subject", "value": subject}
+                ],
+                "parts": [{
+                    "mimeType": "text/plain",
+                    "body": {"data": base64.urlsafe_b64encode(body.encode("utf-8")).decode("ascii")}
+                }]
+            }
+        }
+        with self._lock:
+            self.unread.append(msg_id)
+            self.history_id += 1
+            self.history.append((self.history_id, msg_id))
+        return msg_id
+
+    def list_messages(self, query: str = "is:unread", max_results: int = 10) -> list:
+        try:
+            with self._call("messages.list"):
+                self.faults.apply("gmail")
+        except InjectedFault:
+            return []
+        with self._lock:
+            return [{"id": msg_id} for msg_id in self.unread[:max_results]]
+
+    def list_history(self, start_history_id: str) -> tuple:
+        try:
+            with self._call("history.list"):
+                self.faults.apply("gmail")
+        except InjectedFault:
+            return [], start_history_id
+        with self._lock:
+            if self.history and int(start_history_id) < self.history[0][0] - 1:
+                # Older than the history Gmail keeps
+                return None, start_history_id
+            added = [msg_id for history_id, msg_id in self.history if history_id > int(start_history_id)]
+            return added, str(self.history_id)
+
+    def watch_mailbox(self, topic_name: str, label_ids: Optional[List[str]] = None) -> Optional[str]:
+        with self._lock:
+            return str(self.history_id)
+
+    def get_message(self, message_id: str) -> Optional[Dict[str, Any]]:
+        return self.get_messages([message_id]).get(message_id)
+
+    def get_messages(self, message_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        try:
+            with self._call("batch"):
+                self.faults.apply("gmail")
+        except InjectedFault:
+            return {}
+        fetched = {}
+        with self._lock:
+            for msg_id in message_ids:
+                if msg_id in self.messages:
+                    fetched[msg_id] = self.messages[msg_id]
+                    if msg_id in self.unread:
+                        self.unread.remove(msg_id)
+        return fetched
+
+    def get_message_body(self, message: Dict[str, Any]) -> str:
+        return GmailService.get_message_body(self, message)
+
+    def create_draft(self, to_email: str, subject: str, body: str, thread_id: Optional[str] = None, pdf_path: Optional[str] = None, pdf_bytes: Optional[bytes] = None, **kwargs) -> Optional[Dict[str, Any]]:
+        try:
+            with self._call("drafts.create"):
+                self.faults.apply("gmail")
+        except InjectedFault:
+            return None
+        draft = {"id": f"draft-{len(self.drafts) + 1}", "to": to_email, "subject": subject, "thread_id": thread_id,
+                 "attachment_bytes": len(pdf_bytes) if pdf_bytes else None}
+        with self._lock:
+            self.drafts.append(draft)
+        return {"id": draft["id"], "message": {"threadId": thread_id or "fake_thread_id"}}
+
+
+class FakeTwilioClient:
+    """Mimics `twilio.rest.Client` for SMSService."""
+
+    def __init__(self, faults: FaultInjector, *args, **kwargs):
+        self.faults = faults
+        self.sent: List[Dict[str, Any]] = []
+        self.messages = SimpleNamespace(create=self._create)
+
+    def _create(self, body: str, from_: str, to: str):
+        self.faults.apply("twilio")
+        self.sent.append({"body": body, "from": from_, "to": to})
+        return SimpleNamespace(sid=f"SM{len(self.sent):032d}")
+
+
+class FakeStripe:
+    """Mimics the parts of the `stripe` module StripeService uses."""
+
+    def __init__(self, faults: FaultInjector):
+        self.faults = faults
+        self.api_key = "sk_test_harness"
+        self.sessions: Dict[str, Dict[str, Any]] = {}
+        self.checkout = SimpleNamespace(Session=SimpleNamespace(create=self._create, retrieve=self._retrieve))
+
+    def _create(self, **kwargs):
+        self.faults.apply("stripe")
+        session_id = f"cs_test_{len(self.sessions) + 1:08d}"
+        self.sessions[session_id] = kwargs
+        return SimpleNamespace(id=session_id, url=f"https://checkout.stripe.test/{session_id}")
+
+    def _retrieve(self, session_id: str):
+        self.faults.apply("stripe")
+        return SimpleNamespace(id=session_id, payment_status="paid" if session_id in self.sessions else "unpaid")
+
+
+class FakeWhisperModel:
+    """Mimics a loaded Whisper model for VoiceService."""
+
+    def __init__(self, faults: FaultInjector, transcript: str = "I need a furnace installed, 2 thermostats too."):
+        self.faults = faults
+        self.transcript = transcript
+
+    def transcribe(self, audio_path: str) -> Dict[str, Any]:
+        self.faults.apply("whisper")
+        return {"text": self.transcript}
@@ -0,0 +1,370 @@
+"""
+Velocity Logic - Load / Replay Harness
+Replays an email corpus through the quote pipeline against in-process fakes
+and reports throughput, per-stage latency and resource usage.
+
+Usage (from the backend directory):
+    python -m harness.replay --count 200 --mode pipeline --latency openai=1500,gmail=120
+    python -m harness.replay --corpus emails.jsonl --mode http --concurrency 8
+"""
+
+import argparse
+import json
+import os
+import random
+import resource
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, Any, List
+
+from harness.fakes import (
+    FaultInjector, FakeOpenAI, FakeBatchAPI, FakeGmailService, FakeTwilioClient,
+    FakeStripe, FakeWhisperModel, load_catalog
+)
+from services.metrics import STAGE_SECONDS, EXTERNAL_CALL_SECONDS, EXTERNAL_CALL_ERRORS, PARSE_SOURCE, PROMPT_TOKENS_SAVED
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+FIRST_NAMES = ["John", "Priya", "Marc", "Aiyana", "Wei", "Sarah", "Tomasz", "Fatima"]
+LAST_NAMES = ["Smith", "Patel", "Tremblay", "Bear", "Chen", "Olsen", "Kowalski", "Haddad"]
+
+TEMPLATES = [
+    "Hi, I need a {service} at my place. Please send me a quote.\n\nThanks,\n{name}",
+    "Hello,\n\nCould you quote {qty} {service}? We're in {city}.\n\nRegards,\n{name}",
+    "need {service} asap, it's -35 out\n{name}",
+    "Hi there,\n\nOur old unit died. Looking for a {service} and maybe {service2} too.\n"
+    "Let me know pricing.\n\n{name}\n\n-----Original Message-----\n> Thanks for reaching out last winter.\n> We serviced your furnace on Jan 4.",
+    "Something's wrong with the heating, can someone take a look?\n\n{name}"
+]
+
+CITIES = ["Winnipeg", "Brandon", "Regina", "Saskatoon", "Moose Jaw"]
+
+
+def synthetic_corpus(count: int, catalog: List[Dict[str, Any]], seed: int = 7) -> List[Dict[str, Any]]:
+    """Generate realistic-looking quote requests from the pricing catalog."""
+    rng = random.Random(seed)
+    corpus = []
+    for i in range(count):
+        first, last = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        service, service2 = rng.sample(catalog, 2)
+        body = rng.choice(TEMPLATES).format(
+            service=service["Service Name"].lower(),
+            service2=service2["Service Name"].lower(),
+            qty=rng.randint(1, 4),
+            city=rng.choice(CITIES),
+            name=f"{first} {last}"
+        )
+        corpus.append({
+            "from_email": f"{first.lower()}.{last.lower()}{i}@example.com",
+            "email_body": body,
+            "city": rng.choice(CITIES)
+        })
+    return corpus
+
+
+def load_corpus(path: str) -> List[Dict[str, Any]]:
+    """Load a recorded corpus: JSONL with `from_email` and `email_body` per line."""
+    corpus = []
+    with open(path, 'r') as f:
+        for line in f:
+            if line.strip():
+                record = json.loads(line)
+                corpus.append({
+                    "from_email": record.get("from_email") or record.get("from", "customer@example.com"),
+                    "email_body": record.get("email_body") or record.get("body", ""),
+                    "city": record.get("city")
+                })
+    return corpus
+
+
+def parse_service_map(value: Optional[str]) -> Dict[str, float]:
+    """Parse `openai=800,gmail=120` into a dictionary."""
+    result = {}
+    for pair in (value or "").split(","):
+        if "=" in pair:
+            key, number = pair.split("=", 1)
+            result[key.strip()] = float(number)
+    return result
+
+
+class Harness:
+    """Builds a VelocityLogicAgent wired to fakes, in a throwaway working directory."""
+
+    def __init__(self, faults: FaultInjector, workdir: str):
+        self.faults = faults
+        self.workdir = workdir
+        self.catalog = load_catalog()
+
+        os.environ.setdefault("OPENAI_API_KEY", "harness-fake-key")
+        os.environ["LEDGER_DB_PATH"] = os.path.join(workdir, "ledger.db")
+        os.environ["LLM_CACHE_PATH"] = os.path.join(workdir, "llm_cache.db")
+        os.environ["PDF_CACHE_DIR"] = os.path.join(workdir, "pdf_cache")
+        os.environ["PDF_ARCHIVE_DIR"] = os.path.join(workdir, "pdf_archive")
+
+        from main import VelocityLogicAgent
+        from services.mailbox_service import MailboxPool
+        from services.llm_client import AsyncLLMClient
+        from services.llm_batch import LLMBatchClient
+
+        self.agent = VelocityLogicAgent()
+        self.openai = FakeOpenAI(faults, self.catalog)
+        self.gmail = FakeGmailService(faults)
+
+        self.agent.llm_service.llm_client = AsyncLLMClient.from_env(client=self.openai)
+        self.agent.llm_service.batch_client = LLMBatchClient(
+            client=FakeBatchAPI(faults, self.openai), poll_interval=0.05, base_delay=0.01,
+            state_path=os.path.join(workdir, "llm_batches.json")
+        )
+        self.agent.pdf_service.output_dir = os.path.join(workdir, "output")
+        os.makedirs(self.agent.pdf_service.output_dir, exist_ok=True)
+        self.agent.gmail_service = self.gmail
+        self.agent.mailboxes = MailboxPool(
+            default_service=self.gmail,
+            contractors_path=os.path.join(workdir, "no_contractors.json")
+        )
+
+    def install_web_fakes(self):
+        """Point the Flask app at this harness's agent and fake SMS/payment/voice services."""
+        import web_interface
+        from services.voice_service import VoiceService
+
+        web_interface.agent_service.set(self.agent)
+        web_interface.QUOTES_DB = os.path.join(self.workdir, "quotes.json")
+
+        voice = VoiceService.__new__(VoiceService)
+        voice.model = FakeWhisperModel(self.faults)
+        web_interface.voice.set(voice)
+
+        try:
+            import services.sms_service as sms_module
+            import services.stripe_service as stripe_module
+            sms_module.Client = lambda *args, **kwargs: FakeTwilioClient(self.faults)
+            stripe_module.stripe = FakeStripe(self.faults)
+            os.environ.setdefault("TWILIO_ACCOUNT_SID", "AC_harness")
+            os.environ.setdefault("TWILIO_AUTH_TOKEN", "harness")
+        except ImportError as e:
+            print(f"⚠ SMS/Stripe fakes not installed ({e}); /api/webhook/sms is not replayed")
+
+        return web_interface.app
+
+    def run_sequential(self, corpus: List[Dict[str, Any]], concurrency: int) -> List[tuple]:
+        return [self._timed(self.agent.process_email, **email) for email in corpus]
+
+    def run_pipeline(self, corpus: List[Dict[str, Any]], concurrency: int) -> List[tuple]:
+        timings = []
+        finished = threading.Condition()
+        for email in corpus:
+            started = time.perf_counter()
+            future = self.agent.pipeline.submit(self.agent._new_job(**email))
+
+            def done(f, started=started):
+                with finished:
+                    timings.append((f.result(), time.perf_counter() - started))
+                    finished.notify()
+
+            future.add_done_callback(done)
+        with finished:
+            finished.wait_for(lambda: len(timings) == len(corpus))
+        return timings
+
+    def run_batch(self, corpus: List[Dict[str, Any]], concurrency: int) -> List[tuple]:
+        started = time.perf_counter()
+        results = self.agent.process_backlog(corpus)
+        elapsed = time.perf_counter() - started
+        # The whole backlog waits for the batch, so only the average latency is known
+        return [(result, elapsed / max(len(corpus), 1)) for result in results]
+
+    def run_inbox(self, corpus: List[Dict[str, Any]], concurrency: int) -> List[tuple]:
+        # Start from a watch like run_continuous does, so syncs go through history
+        mailboxes = self.agent.mailboxes.all()
+        for mailbox in mailboxes:
+            mailbox.history_id = mailbox.gmail_service.watch_mailbox("harness")
+        for email in corpus:
+            self.gmail.deliver(email["from_email"], email["email_body"])
+        started = time.perf_counter()
+        passes = 0
+        while (self.gmail.unread or any(mailbox.retry_ids for mailbox in mailboxes)) and passes < 10 * len(corpus):
+            self.agent.sync_inbox()
+            passes += 1
+        elapsed = time.perf_counter() - started
+        drafted = len(self.gmail.drafts)
+        # Messages are processed in bulk, so only the average latency is known
+        return [({"success": i < drafted}, elapsed / max(len(corpus), 1)) for i in range(len(corpus))]
+
+    def run_http(self, corpus: List[Dict[str, Any]], concurrency: int) -> List[tuple]:
+        app = self.install_web_fakes()
+
+        def post(email):
+            client = app.test_client()
+            payload = {
+                "customer_email": email["from_email"],
+                "email_body": email["email_body"],
+                "city": email.get("city"),
+                "province": "Manitoba"
+            }
+            started = time.perf_counter()
+            response = client.post('/api/process-email', json=payload)
+            body = response.get_json(silent=True) or {}
+            success = response.status_code == 200 and "quote_number" in body
+            return ({"success": success, "error": body.get("error")}, time.perf_counter() - started)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            return list(pool.map(post, corpus))
+
+    @staticmethod
+    def _timed(fn, **kwargs) -> tuple:
+        started = time.perf_counter()
+        result = fn(**kwargs)
+        return result, time.perf_counter() - started
+
+    def shutdown(self):
+        if self.agent._pipeline is not None:
+            self.agent._pipeline.shutdown()
+
+
+def percentile(values: List[float], q: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+
+def build_report(timings: List[tuple], wall: float, usage_before, usage_after, children_before, children_after) -> Dict[str, Any]:
+    """Summarize a run into a JSON-serializable report."""
+    latencies = [elapsed for _, elapsed in timings]
+    succeeded = sum(1 for result, _ in timings if result.get("success"))
+
+    stages = {}
+    for stage in ("parse", "price", "pdf", "compose", "draft"):
+        snapshot = STAGE_SECONDS.snapshot(stage=stage)
+        if snapshot["count"]:
+            stages[stage] = {
+                "count": snapshot["count"],
+                "mean_s": round(snapshot["mean"], 4),
+                "p95_s": round(STAGE_SECONDS.quantile(0.95, stage=stage), 4)
+            }
+
+    external = {}
+    for labels in EXTERNAL_CALL_SECONDS.label_sets():
+        snapshot = EXTERNAL_CALL_SECONDS.snapshot(**labels)
+        external[f"{labels['service']} {labels['operation']}"] = {
+            "count": snapshot["count"],
+            "errors": int(EXTERNAL_CALL_ERRORS.value(**labels)),
+            "mean_s": round(snapshot["mean"], 4),
+            "p95_s": round(EXTERNAL_CALL_SECONDS.quantile(0.95, **labels), 4)
+        }
+
+    cpu_self = (usage_after.ru_utime - usage_before.ru_utime) + (usage_after.ru_stime - usage_before.ru_stime)
+    cpu_children = (children_after.ru_utime - children_before.ru_utime) + (children_after.ru_stime - children_before.ru_stime)
+    # ru_maxrss is KiB on Linux, bytes on macOS
+    rss_divisor = 1024 * 1024 if sys.platform == "darwin" else 1024
+
+    return {
+        "emails": len(timings),
+        "succeeded": succeeded,
+        "failed": len(timings) - succeeded,
+        "wall_s": round(wall, 3),
+        "quotes_per_sec": round(succeeded / wall, 2) if wall else 0.0,
+        "latency_s": {
+            "p50": round(percentile(latencies, 0.50), 4),
+            "p95": round(percentile(latencies, 0.95), 4),
+            "max": round(max(latencies, default=0.0), 4)
+        },
+        "stages": stages,
+        "parse_source": {source: int(PARSE_SOURCE.value(source=source)) for source in ("rules", "llm", "llm_batch")},
+        "prompt_tokens_saved": int(PROMPT_TOKENS_SAVED.value()),
+        "external_calls": external,
+        "resources": {
+            "cpu_s": round(cpu_self, 3),
+            "cpu_children_s": round(cpu_children, 3),
+            "cpu_utilization": round((cpu_self + cpu_children) / wall, 2) if wall else 0.0,
+            "peak_rss_mb": round(usage_after.ru_maxrss / rss_divisor, 1),
+            "peak_rss_children_mb": round(children_after.ru_maxrss / rss_divisor, 1)
+        }
+    }
+
+
+def print_report(report: Dict[str, Any]) -> None:
+    print("\n" + "=" * 60)
+    print("📊 Replay Results")
+    print("=" * 60)
+    print(f"Quotes:      {report['succeeded']}/{report['emails']} succeeded ({report['failed']} failed)")
+    print(f"Wall time:   {report['wall_s']:.2f}s")
+    print(f"Throughput:  {report['quotes_per_sec']:.2f} quotes/sec")
+    latency = report["latency_s"]
+    print(f"End-to-end:  p50 {latency['p50']:.3f}s  p95 {latency['p95']:.3f}s  max {latency['max']:.3f}s")
+    print("\nStage latency (mean / p95):")
+    for stage, stats in report["stages"].items():
+        print(f"  {stage:<8} {stats['mean_s']:.4f}s / {stats['p95_s']:.4f}s  (n={stats['count']})")
+    parse_source = report["parse_source"]
+    print(f"\nParsed by:   rules {parse_source['rules']}, llm {parse_source['llm']}, llm batch {parse_source['llm_batch']} "
+          f"({report['prompt_tokens_saved']} prompt tokens saved by pre-processing)")
+    print("\nExternal calls (mean / p95):")
+    for name, stats in report["external_calls"].items():
+        print(f"  {name:<28} {stats['mean_s']:.4f}s / {stats['p95_s']:.4f}s  (n={stats['count']}, errors={stats['errors']})")
+    resources = report["resources"]
+    print("\nResources:")
+    print(f"  CPU: {resources['cpu_s']:.2f}s self + {resources['cpu_children_s']:.2f}s workers "
+          f"({resources['cpu_utilization']:.2f} cores busy on average)")
+    print(f"  Peak RSS: {resources['peak_rss_mb']:.1f} MB self, {resources['peak_rss_children_mb']:.1f} MB largest worker")
+    print("=" * 60)
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Replay emails through the quote pipeline against local fakes")
+    parser.add_argument("--mode", choices=["sequential", "pipeline", "batch", "inbox", "http"], default="pipeline")
+    parser.add_argument("--count", type=int, default=50, help="Synthetic emails to generate")
+    parser.add_argument("--corpus", help="JSONL corpus to replay instead of synthetic emails")
+    parser.add_argument("--concurrency", type=int, default=8, help="Client threads for http mode")
+    parser.add_argument("--latency", default="openai=800,openai_batch=3000,gmail=100,twilio=150,stripe=200,whisper=2000",
+                        help="Mean latency in ms per fake service")
+    parser.add_argument("--error-rate", default="", help="Failure probability per fake service, e.g. openai=0.05")
+    parser.add_argument("--seed", type=int, default=7)
+    parser.add_argument("--json", help="Also write the report to this file")
+    parser.add_argument("--keep", action="store_true", help="Keep the working directory (PDFs, ledger)")
+    args = parser.parse_args()
+
+    os.chdir(BACKEND_DIR)
+    workdir = tempfile.mkdtemp(prefix="velocity-replay-")
+    faults = FaultInjector(parse_service_map(args.latency), parse_service_map(args.error_rate), seed=args.seed)
+    harness = Harness(faults, workdir)
+
+    corpus = load_corpus(args.corpus) if args.corpus else synthetic_corpus(args.count, harness.catalog, args.seed)
+    runner = getattr(harness, f"run_{args.mode}")
+
+    print(f"\n🧪 Replaying {len(corpus)} emails in {args.mode} mode (workdir: {workdir})")
+    usage_before = resource.getrusage(resource.RUSAGE_SELF)
+    children_before = resource.getrusage(resource.RUSAGE_CHILDREN)
+    started = time.perf_counter()
+    try:
+        timings = runner(corpus, args.concurrency)
+        wall = time.perf_counter() - started
+    finally:
+        # Joins worker processes so their CPU time shows up in RUSAGE_CHILDREN
+        harness.shutdown()
+    report = build_report(
+        timings, wall,
+        usage_before, resource.getrusage(resource.RUSAGE_SELF),
+        children_before, resource.getrusage(resource.RUSAGE_CHILDREN)
+    )
+    report["mode"] = args.mode
+
+    print_report(report)
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(report, f, indent=4)
+        print(f"✓ Report written to {args.json}")
+
+    if args.keep:
+        print(f"✓ Working directory kept at {workdir}")
+    else:
+        shutil.rmtree(workdir, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -4,64 +4,127 @@ Orchestrates the automated quoting workflow.
 """
 
 import os
+import json
 import time
 import sys
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import zip_longest
 from datetime import datetime
-from typing import Optional, Dict, Any
+from typing import Optional, Dict, Any, List, Callable, Tuple
 from dotenv import load_dotenv
 
 # Import services
 from services.llm_service import LLMService
-from services.pricing_engine import PricingEngine
+from services.llm_client import LLMUnavailableError
+from services.pricing_engine import PricingEngine, item_key
 from services.pdf_service import PDFService
+from services.pdf_cache import PDFCache
+from services.pdf_bulk import BulkPDFRenderer
+from services.pdf_retention import PDFArchive
 from services.gmail_service import GmailService
+from services.ledger_service import MessageLedger
+from services.mailbox_service import Mailbox, MailboxPool
+from services.pipeline import QuotePipeline
+from services.intent_rules import RuleBasedIntentExtractor
+from services.email_preprocessor import preprocess_email, EmptyEmailError
+from services.metrics import STAGE_SECONDS, EMAILS_PROCESSED, PARSE_SOURCE, PROMPT_TOKENS_SAVED, record_cache
+from services.quote_ids import next_quote_number
+from services.log_service import get_logger
 
 # Load environment variables
 load_dotenv()
 
+logger = get_logger("agent")
+
 
 class VelocityLogicAgent:
     """Main agent orchestrating the quoting workflow."""
     
     def __init__(self):
         """Initialize all services."""
-        print("=" * 60)
-        print("🚀 Velocity Logic Agent - Starting Up")
-        print("=" * 60)
+        logger.info("Velocity Logic Agent starting up")
         
         try:
             self.llm_service = LLMService()
-            print("✓ LLM Service initialized")
+            logger.info("LLM Service initialized")
         except Exception as e:
-            print(f"✗ Failed to initialize LLM Service: {e}")
+            logger.critical("Failed to initialize LLM Service: %s", e)
             sys.exit(1)
         
         try:
             self.pricing_engine = PricingEngine()
-            print("✓ Pricing Engine initialized")
+            logger.info("Pricing Engine initialized")
         except Exception as e:
-            print(f"✗ Failed to initialize Pricing Engine: {e}")
+            logger.critical("Failed to initialize Pricing Engine: %s", e)
             sys.exit(1)
         
+        # Stream LLM answers and price each item while the rest is generated
+        self.stream_llm = os.getenv("LLM_STREAMING", "true").lower() != "false"
+        
+        # Catalog shortlists in the prompt let the model answer with service IDs
+        if os.getenv("CATALOG_PROMPT_ENABLED", "true").lower() != "false":
+            self.llm_service.catalog = self.pricing_engine.catalog
+        
         try:
             self.pdf_service = PDFService()
-            print("✓ PDF Service initialized")
+            # Closed quotes' PDFs are moved to the archive (see PDFRetentionManager) and restored from it
+            self.pdf_archive = PDFArchive.from_env()
+            self.pdf_cache = PDFCache.from_env(archive=self.pdf_archive)
+            self.pdf_bulk = BulkPDFRenderer(
+                self.pdf_service, self.pdf_cache, max_workers=int(os.getenv("PDF_BULK_WORKERS", "0")) or None
+            )
+            logger.info("PDF Service initialized")
         except Exception as e:
-            print(f"✗ Failed to initialize PDF Service: {e}")
+            logger.critical("Failed to initialize PDF Service: %s", e)
             sys.exit(1)
         
+        # Quotes below this confidence are flagged for review on the dashboard
+        self.review_confidence = int(os.getenv("REVIEW_CONFIDENCE_THRESHOLD", "70"))
+        # Saved quote templates the LLM can point at with template_hint
+        self.templates_path = os.getenv("QUOTE_TEMPLATES_PATH", "data/templates.json")
+        
+        # Routine requests are parsed locally; see _parse_intent
+        self.intent_rules = None
+        self.fast_path_min_confidence = int(os.getenv("FAST_PATH_MIN_CONFIDENCE", "80"))
+        if os.getenv("FAST_PATH_ENABLED", "true").lower() != "false":
+            try:
+                self.intent_rules = RuleBasedIntentExtractor(self.pricing_engine.pricing_csv_path)
+                logger.info("Rule-based fast path initialized")
+            except Exception as e:
+                logger.warning("Rule-based fast path disabled: %s", e)
+        
+        self.gmail_service = None
         try:
             self.gmail_service = GmailService()
-            print("✓ Gmail Service initialized")
+            logger.info("Gmail Service initialized")
         except Exception as e:
-            print(f"✗ Failed to initialize Gmail Service: {e}")
+            logger.error("Failed to initialize Gmail Service: %s", e)
             # Don't exit - can run in mock mode
         
-        print("=" * 60)
-        print("✓ All services initialized successfully")
-        print("=" * 60)
+        # One mailbox per contractor, or just the default inbox
+        self.mailboxes = MailboxPool(default_service=self.gmail_service)
+        # History syncs also list unread mail this often, in case a message was missed
+        self.full_sync_interval = float(os.getenv("MAILBOX_FULL_SYNC_SECONDS", "3600"))
+        logger.info("Polling %d mailbox(es)", len(self.mailboxes.all()))
+        
+        try:
+            self.ledger = MessageLedger(os.getenv("LEDGER_DB_PATH", "data/ledger.db"))
+            logger.info("Message Ledger initialized")
+        except Exception as e:
+            logger.critical("Failed to initialize Message Ledger: %s", e)
+            sys.exit(1)
+        
+        # Push notification state (see notify_push / sync_inbox)
+        self._wake_event = threading.Event()
+        self._sync_lock = threading.Lock()
+        self.loop_running = False
+        self._pipeline = None
+        self._pipeline_lock = threading.Lock()
+        
+        logger.info("All services initialized successfully")
     
-    def process_email(self, email_body: str, from_email: str, thread_id: Optional[str] = None, markup_percent: float = 0.0, winter_multiplier_active: bool = False, city: str = None, province: str = None) -> Dict[str, Any]:
+    def process_email(self, email_body: str, from_email: str, thread_id: Optional[str] = None, markup_percent: float = 0.0, winter_multiplier_active: bool = False, city: str = None, province: str = None, contractor_id: Optional[str] = None) -> Dict[str, Any]:
         """
         Process a single email through the full workflow.
         
@@ -73,95 +136,406 @@ class VelocityLogicAgent:
             winter_multiplier_active: Whether to apply winter surcharge
             city: Optional city for regional premium
             province: Optional province
+            contractor_id: Contractor whose mailbox the email arrived in
         
         Returns:
             Dictionary with results
         """
+        job = self._new_job(
+            email_body, from_email, thread_id,
+            markup_percent=markup_percent,
+            winter_multiplier_active=winter_multiplier_active,
+            city=city,
+            province=province,
+            contractor_id=contractor_id
+        )
         try:
-            print(f"\n{'='*60}")
-            print(f"📧 Processing email from: {from_email}")
-            print(f"{'='*60}")
-            
-            # Step 1: Parse email intent with LLM
-            print("\n[1/5] Parsing email intent...")
-            parsed_data = self.llm_service.parse_email_intent(email_body)
-            customer_name = parsed_data.get("customer_name", "Customer")
-            extracted_items = parsed_data.get("extracted_items", [])
-            confidence_score = parsed_data.get("confidence_score", 0)
-            ai_reasoning = parsed_data.get("ai_reasoning", [])
-            
-            print(f"   ✓ Customer: {customer_name}")
-            print(f"   ✓ Confidence: {confidence_score}/100")
-            print(f"   ✓ Services requested: {len(extracted_items)}")
-            
-            # Step 2: Calculate quote
-            print("\n[2/5] Calculating quote...")
-            quote_data = self.pricing_engine.calculate_quote(
-                extracted_items, 
-                markup_percent=markup_percent,
-                winter_multiplier_active=winter_multiplier_active,
-                city=city,
-                province=province
-            )
-            print(f"   ✓ Subtotal: ${quote_data['subtotal']:.2f}")
-            if city and quote_data.get('regional_premium_total', 0) > 0:
-                print(f"   ✓ Regional Premium ({city}): +${quote_data['regional_premium_total']:.2f}")
-            print(f"   ✓ Tax: ${quote_data['tax']:.2f}")
-            print(f"   ✓ Total: ${quote_data['total']:.2f}")
-            if winter_multiplier_active:
-                print(f"   ❄ Winter Multiplier Applied: +${quote_data['winter_surcharge_total']:.2f}")
-            
-            # Step 3: Generate PDF
-            print("\n[3/5] Generating PDF quote...")
-            quote_number = f"QT-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
-            pdf_path = self.pdf_service.generate_quote_pdf(
-                customer_name=customer_name,
-                quote_data=quote_data,
-                quote_number=quote_number
-            )
-            print(f"   ✓ PDF generated: {pdf_path}")
-            
-            # Step 4: Create email body
-            print("\n[4/5] Preparing email draft...")
-            email_subject = f"Quote #{quote_number} - Velocity Logic"
-            email_body = self._generate_email_body(customer_name, quote_data, quote_number)
+            for stage, run_stage in (
+                ("parse", self._stage_parse),
+                ("price", self._stage_price),
+                ("pdf", self._stage_pdf),
+                ("compose", self._stage_compose),
+                ("draft", self._stage_draft)
+            ):
+                with STAGE_SECONDS.time(stage=stage):
+                    run_stage(job)
+            return self._build_result(job)
             
-            # Step 5: Create Gmail draft
-            print("\n[5/5] Creating Gmail draft...")
-            draft = self.gmail_service.create_draft(
-                to_email=from_email,
-                subject=email_subject,
-                body=email_body,
-                thread_id=thread_id,
-                pdf_path=pdf_path
-            )
-            
-            if draft:
-                print(f"\n✅ Successfully processed email and created draft!")
-                return {
-                    "success": True,
-                    "quote_number": quote_number,
-                    "customer_name": customer_name,
-                    "confidence_score": confidence_score,
-                    "ai_reasoning": ai_reasoning,
-                    "quote_data": quote_data,
-                    "pdf_path": pdf_path,
-                    "status": "DRAFT_SENT",
-                    "status_history": [
-                        {"status": "RECEIVED", "timestamp": datetime.now().isoformat(), "message": "Email received from client"},
-                        {"status": "AI_PARSING", "timestamp": datetime.now().isoformat(), "message": f"AI identified intent with {confidence_score}% confidence"},
-                        {"status": "PDF_GENERATED", "timestamp": datetime.now().isoformat(), "message": "Quote PDF generated and Gmail draft created"}
-                    ]
-                }
+        except LLMUnavailableError as e:
+            logger.warning("LLM unavailable, email not quoted: %s", e, extra={"sender": from_email})
+            return self._error_result(e)
+        except EmptyEmailError as e:
+            logger.warning("Email not quoted: %s", e, extra={"sender": from_email})
+            return self._error_result(e)
+        except Exception as e:
+            logger.exception("Error processing email: %s", e, extra={"sender": from_email})
+            return self._error_result(e)
+    
+    def process_emails(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Process many emails concurrently through the staged pipeline.
+        
+        Args:
+            jobs: Dictionaries of process_email keyword arguments
+        
+        Returns:
+            Result dictionaries, in the same order as the jobs
+        """
+        futures = [self.pipeline.submit(self._new_job(**job)) for job in jobs]
+        return [future.result() for future in futures]
+    
+    def process_backlog(self, jobs: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """
+        Quote a backlog or reprocess old emails, parsing with OpenAI Batch jobs.
+        
+        Emails the rules are confident about go straight to pricing. The rest
+        are parsed in one batch run, which costs less and skips the
+        interactive rate limits but can take hours. Each parsed email then
+        goes through the price, PDF, compose and draft stages of the pipeline.
+        
+        Args:
+            jobs: Dictionaries of process_email keyword arguments
+        
+        Returns:
+            Result dictionaries, in the same order as the jobs
+        """
+        queued = [self._new_job(**job) for job in jobs]
+        futures: List[Optional[Future]] = [None] * len(queued)
+        batch_texts, rules_results = {}, {}
+        for index, job in enumerate(queued):
+            try:
+                text = self._prepare_parse(job)
+            except EmptyEmailError as e:
+                logger.warning("Email not quoted: %s", e, extra={"sender": job["from_email"]})
+                futures[index] = Future()
+                futures[index].set_result(self._error_result(e))
+                continue
+            rules_data = self._rules_intent(text)
+            if rules_data is not None and rules_data["confidence_score"] >= self.fast_path_min_confidence:
+                PARSE_SOURCE.inc(source="rules")
+                self._apply_intent(job, rules_data)
+                futures[index] = self.pipeline.submit(job, stage="price")
             else:
-                print(f"\n⚠ Draft creation may have failed (check logs)")
-                return {"success": False, "error": "Draft creation failed"}
-            
+                batch_texts[str(index)] = text
+                rules_results[str(index)] = rules_data
+        
+        if batch_texts:
+            logger.info("Parsing %d email(s) in batch mode (%d by rules)", len(batch_texts), len(queued) - len(batch_texts))
+            try:
+                parsed, errors = self.llm_service.parse_email_intents_batch(batch_texts)
+            except Exception as e:
+                # Rules results or retryable errors for these; the rest of the backlog goes on
+                logger.warning("Batch parsing failed for %d email(s): %s", len(batch_texts), e)
+                parsed, errors = {}, {key: str(e) for key in batch_texts}
+            for key in batch_texts:
+                index = int(key)
+                try:
+                    if key in parsed:
+                        PARSE_SOURCE.inc(source="llm_batch")
+                        parsed_data = parsed[key]
+                    else:
+                        parsed_data = self._rules_fallback(
+                            rules_results[key], LLMUnavailableError(errors.get(key, "No batch result"))
+                        )
+                except LLMUnavailableError as e:
+                    logger.warning("Batch parse failed: %s", e, extra={"sender": queued[index]["from_email"]})
+                    futures[index] = Future()
+                    futures[index].set_result(self._error_result(e))
+                    continue
+                self._apply_intent(queued[index], parsed_data)
+                futures[index] = self.pipeline.submit(queued[index], stage="price")
+        
+        return [future.result() for future in futures]
+    
+    @property
+    def pipeline(self) -> QuotePipeline:
+        """Staged worker pipeline, started on first use."""
+        if self._pipeline is None:
+            with self._pipeline_lock:
+                if self._pipeline is None:
+                    pipeline = QuotePipeline.from_env(self)
+                    pipeline.start()
+                    self._pipeline = pipeline
+        return self._pipeline
+    
+    def _new_job(self, email_body: str, from_email: str, thread_id: Optional[str] = None, markup_percent: float = 0.0, winter_multiplier_active: bool = False, city: str = None, province: str = None, contractor_id: Optional[str] = None) -> Dict[str, Any]:
+        """Bundle the inputs of one email into a job passed between stages."""
+        return {
+            "email_body": email_body,
+            "from_email": from_email,
+            "thread_id": thread_id,
+            "contractor_id": contractor_id,
+            "pricing_options": {
+                "markup_percent": markup_percent,
+                "winter_multiplier_active": winter_multiplier_active,
+                "city": city,
+                "province": province
+            },
+            "received_at": datetime.now().isoformat()
+        }
+    
+    def _stage_parse(self, job: Dict[str, Any]) -> None:
+        """Step 1: Parse email intent with LLM."""
+        job["priced_items"] = {}
+        on_item = (lambda item: self._price_streamed_item(job, item)) if self.stream_llm else None
+        self._apply_intent(job, self._parse_intent(self._prepare_parse(job), on_item=on_item))
+    
+    def _price_streamed_item(self, job: Dict[str, Any], item: Dict[str, Any]) -> None:
+        """Price one item while the model is still writing the rest of the answer."""
+        key = item_key(item)
+        if key in job["priced_items"]:
+            return
+        try:
+            job["priced_items"][key] = self.pricing_engine.price_item(item, **job["pricing_options"])
         except Exception as e:
-            print(f"\n✗ Error processing email: {e}")
-            import traceback
-            traceback.print_exc()
-            return {"success": False, "error": str(e)}
+            # The price stage prices it again from the final item list
+            logger.debug("Could not pre-price streamed item: %s", e)
+    
+    def _prepare_parse(self, job: Dict[str, Any]) -> str:
+        """
+        Pre-process the job's email body and return the text to parse.
+        
+        Raises:
+            EmptyEmailError: Nothing is left to parse, so the LLM isn't called
+        """
+        logger.info("Processing email", extra={"sender": job["from_email"], "contractor": job["contractor_id"]})
+        logger.debug("[1/5] Parsing email intent")
+        # Parse only what the customer wrote; job["email_body"] keeps the original for audit
+        prepared = preprocess_email(job["email_body"])
+        job["preprocessing"] = {
+            key: prepared[key] for key in ("removed", "original_tokens", "tokens", "tokens_saved")
+        }
+        PROMPT_TOKENS_SAVED.inc(prepared["tokens_saved"])
+        if prepared["tokens_saved"]:
+            logger.debug("Pre-processing removed %s", ", ".join(prepared["removed"]), extra=job["preprocessing"])
+        if not prepared["text"].strip():
+            raise EmptyEmailError("Email has no body text to quote from")
+        return prepared["text"]
+    
+    def _apply_intent(self, job: Dict[str, Any], parsed_data: Dict[str, Any]) -> None:
+        """Store a parse result on the job."""
+        job["customer_name"] = parsed_data.get("customer_name", "Customer")
+        job["extracted_items"] = parsed_data.get("extracted_items", [])
+        job["confidence_score"] = parsed_data.get("confidence_score", 0)
+        job["ai_reasoning"] = parsed_data.get("ai_reasoning", [])
+        job["template_hint"] = parsed_data.get("template_hint")
+        job["parsed_at"] = datetime.now().isoformat()
+        
+        logger.info("Parsed email intent", extra={
+            "customer": job["customer_name"],
+            "confidence": job["confidence_score"],
+            "services": len(job["extracted_items"])
+        })
+    
+    def _parse_intent(self, email_body: str, on_item=None) -> Dict[str, Any]:
+        """
+        Parse an email locally when the rules are confident, else with the LLM.
+        
+        Args:
+            email_body: The email body text to parse
+            on_item: Passed to LLMService.parse_email_intent to stream the LLM answer
+        
+        Returns:
+            Parsed intent in the LLMService.parse_email_intent format
+        """
+        rules_data = self._rules_intent(email_body)
+        if rules_data is not None:
+            if rules_data["confidence_score"] >= self.fast_path_min_confidence:
+                PARSE_SOURCE.inc(source="rules")
+                return rules_data
+            logger.debug(
+                "Escalating to LLM (rules confidence %d < %d)",
+                rules_data["confidence_score"], self.fast_path_min_confidence
+            )
+        
+        try:
+            parsed_data = self.llm_service.parse_email_intent(email_body, on_item=on_item)
+        except LLMUnavailableError as e:
+            return self._rules_fallback(rules_data, e)
+        PARSE_SOURCE.inc(source="llm")
+        return parsed_data
+    
+    def _rules_intent(self, email_body: str) -> Optional[Dict[str, Any]]:
+        """Rules parse of an email, or None when the fast path is disabled."""
+        if self.intent_rules is None:
+            return None
+        return self.intent_rules.extract(email_body)
+    
+    def _rules_fallback(self, rules_data: Optional[Dict[str, Any]], error: LLMUnavailableError) -> Dict[str, Any]:
+        """
+        Use a low-confidence rules result when the LLM could not answer.
+        
+        Under load, a local parse flagged for review beats no quote at all;
+        with nothing matched the error is re-raised so the email is retried later.
+        """
+        if not rules_data or not rules_data["extracted_items"]:
+            raise error
+        logger.warning("LLM unavailable (%s); using rules result", error)
+        PARSE_SOURCE.inc(source="rules_fallback")
+        rules_data["ai_reasoning"] = rules_data["ai_reasoning"] + ["AI parser unavailable; parsed by keyword rules - please review"]
+        # Below the dashboard's review threshold so a person checks it
+        rules_data["confidence_score"] = min(rules_data["confidence_score"], 60)
+        return rules_data
+    
+    def _stage_price(self, job: Dict[str, Any]) -> None:
+        """Step 2: Calculate quote."""
+        logger.debug("[2/5] Calculating quote")
+        job["quote_data"] = self.pricing_engine.calculate_quote(
+            job["extracted_items"],
+            priced_items=job.get("priced_items"),
+            **job["pricing_options"]
+        )
+        self._report_pricing(job)
+    
+    def _report_pricing(self, job: Dict[str, Any]) -> None:
+        quote_data = job["quote_data"]
+        fields = {
+            "subtotal": round(quote_data["subtotal"], 2),
+            "tax": round(quote_data["tax"], 2),
+            "total": round(quote_data["total"], 2)
+        }
+        if job["pricing_options"]["city"] and quote_data.get('regional_premium_total', 0) > 0:
+            fields["regional_premium"] = round(quote_data["regional_premium_total"], 2)
+        if job["pricing_options"]["winter_multiplier_active"]:
+            fields["winter_surcharge"] = round(quote_data["winter_surcharge_total"], 2)
+        logger.info("Calculated quote", extra=fields)
+    
+    def _assign_quote_number(self, job: Dict[str, Any]) -> str:
+        job["quote_number"] = next_quote_number(tenant=job["contractor_id"])
+        return job["quote_number"]
+    
+    def _stage_pdf(self, job: Dict[str, Any]) -> None:
+        """Step 3: Generate PDF."""
+        logger.debug("[3/5] Generating PDF quote")
+        self._attach_pdf(job, self._assign_quote_number(job))
+    
+    def _needs_review(self, job: Dict[str, Any]) -> bool:
+        return job["confidence_score"] < self.review_confidence
+    
+    def _apply_template(self, job: Dict[str, Any]) -> None:
+        """Swap in the line items of the saved template the LLM suggested, if one matches."""
+        hint = job.get("template_hint")
+        if not hint or not os.path.exists(self.templates_path):
+            return
+        try:
+            with open(self.templates_path, 'r') as f:
+                templates = json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring templates file %s: %s", self.templates_path, e)
+            return
+        match = next((t for t in templates if hint.lower() in t.get('name', '').lower()), None)
+        if match is None:
+            return
+        subtotal = sum(item["line_total"] for item in match["line_items"])
+        tax = subtotal * 0.10
+        job["quote_data"] = {
+            **job["quote_data"],
+            "line_items": match["line_items"],
+            "subtotal": subtotal,
+            "tax": tax,
+            "total": subtotal + tax
+        }
+        logger.info("Applied quote template", extra={"template": match["name"]})
+    
+    def _attach_pdf(self, job: Dict[str, Any], quote_number: str, render: Optional[Callable[[], bytes]] = None) -> None:
+        """
+        Put the job's PDF on it, from the cache or rendered with render() (in-process by default).
+        
+        Any template is applied first, so the key and PDF match the stored quote.
+        The draft is the point where the quote goes out, so review-bound quotes
+        are rendered here too.
+        """
+        self._apply_template(job)
+        job["pdf_key"] = self.pdf_service.content_key(job["customer_name"], job["quote_data"], quote_number)
+        job["pdf_filename"] = self.pdf_service.pdf_filename(quote_number)
+        job["pdf_bytes"] = self.pdf_cache.get_or_render(
+            job["pdf_key"],
+            render or (lambda: self.pdf_service.render_quote_pdf(job["customer_name"], job["quote_data"], quote_number))
+        )
+        job["pdf_path"] = self.pdf_cache.path_for(job["pdf_key"])
+        logger.debug("PDF ready", extra={"pdf_bytes": len(job["pdf_bytes"]), "pdf_key": job["pdf_key"]})
+    
+    def quote_pdf(self, customer_name: str, quote_data: Dict[str, Any], quote_number: str) -> Tuple[str, str]:
+        """
+        A quote's PDF, rendered on first request and then served from the cache.
+        
+        Args:
+            customer_name: Name of the customer
+            quote_data: Dictionary with line_items, subtotal, tax, total
+            quote_number: Quote number printed on the PDF
+        
+        Returns:
+            (content key, path of the cached PDF)
+        """
+        key = self.pdf_service.content_key(customer_name, quote_data, quote_number)
+        path = self.pdf_cache.get_or_render_path(
+            key, lambda: self.pdf_service.render_quote_pdf(customer_name, quote_data, quote_number)
+        )
+        return key, path
+    
+    def _stage_compose(self, job: Dict[str, Any]) -> None:
+        """Step 4: Create email body."""
+        logger.debug("[4/5] Preparing email draft")
+        job["email_subject"] = f"Quote #{job['quote_number']} - Velocity Logic"
+        job["reply_body"] = self._generate_email_body(job["customer_name"], job["quote_data"], job["quote_number"])
+    
+    def _stage_draft(self, job: Dict[str, Any]) -> None:
+        """Step 5: Create Gmail draft."""
+        logger.debug("[5/5] Creating Gmail draft")
+        job["draft"] = self.mailboxes.gmail_for(job["contractor_id"]).create_draft(
+            to_email=job["from_email"],
+            subject=job["email_subject"],
+            body=job["reply_body"],
+            thread_id=job["thread_id"],
+            pdf_bytes=job["pdf_bytes"],
+            pdf_filename=job["pdf_filename"]
+        )
+        # The draft holds the only copy now
+        job.pop("pdf_bytes", None)
+        job["drafted_at"] = datetime.now().isoformat()
+    
+    def _build_result(self, job: Dict[str, Any]) -> Dict[str, Any]:
+        """Turn a job that went through every stage into the result dictionary."""
+        if not job.get("draft"):
+            logger.warning("Draft creation may have failed", extra={"quote_number": job.get("quote_number")})
+            EMAILS_PROCESSED.inc(outcome="draft_failed")
+            return {"success": False, "error": "Draft creation failed"}
+        
+        logger.info("Processed email and created draft", extra={"quote_number": job["quote_number"]})
+        EMAILS_PROCESSED.inc(outcome="success")
+        needs_review = self._needs_review(job)
+        return {
+            "success": True,
+            "quote_number": job["quote_number"],
+            "contractor_id": job["contractor_id"],
+            "customer_name": job["customer_name"],
+            "confidence_score": job["confidence_score"],
+            "ai_reasoning": job["ai_reasoning"],
+            "quote_data": job["quote_data"],
+            "pdf_path": job["pdf_path"],
+            "pdf_key": job["pdf_key"],
+            "original_email_body": job["email_body"],
+            "preprocessing": job["preprocessing"],
+            "status": "NEEDS_REVIEW" if needs_review else "DRAFT_SENT",
+            "status_history": [
+                {"status": "RECEIVED", "timestamp": job["received_at"], "message": "Email received from client"},
+                {"status": "AI_PARSING", "timestamp": job["parsed_at"], "message": f"AI identified intent with {job['confidence_score']}% confidence"},
+                {"status": "PDF_GENERATED", "timestamp": job["drafted_at"], "message": "Quote PDF generated and Gmail draft created"}
+                if not needs_review else
+                {"status": "NEEDS_REVIEW", "timestamp": job["drafted_at"], "message": "Quote PDF generated and Gmail draft created; awaiting review"}
+            ]
+        }
+    
+    def _error_result(self, error: Exception) -> Dict[str, Any]:
+        """Result dictionary for an email that failed; LLM overload is marked retryable, empty emails skipped."""
+        EMAILS_PROCESSED.inc(outcome="empty" if isinstance(error, EmptyEmailError) else "error")
+        result = {"success": False, "error": str(error)}
+        if isinstance(error, EmptyEmailError):
+            result["skipped"] = True
+        elif isinstance(error, LLMUnavailableError):
+            result["retryable"] = True
+            result["retry_after"] = error.retry_after
+        return result
     
     def _generate_email_body(self, customer_name: str, quote_data: Dict[str, Any], quote_number: str) -> str:
         """Generate professional email body for the quote."""
@@ -190,74 +564,271 @@ Velocity Logic Team
 """
         return body
     
-    def run_continuous(self, check_interval: int = 60):
+    def _collect_messages(self, mailbox: Mailbox) -> List[tuple]:
+        """
+        Find, lease and fetch new messages for one mailbox.
+        
+        Consults the ledger before any expensive step so already-processed
+        messages are never fetched again. History only reports each message
+        once, so messages left unfinished by earlier passes are tried again
+        from `mailbox.retry_ids`, and unread mail is listed every
+        `full_sync_interval` seconds as well. The new history ID is only
+        adopted (see Mailbox.commit_history) after the messages are recorded.
+        
+        Args:
+            mailbox: Mailbox to sync
+        
+        Returns:
+            List of (message ID, full message) tuples this instance now holds leases on
+        """
+        gmail = mailbox.gmail_service
+        message_ids = None
+        mailbox.next_history_id = None
+        
+        if mailbox.history_id:
+            message_ids, mailbox.next_history_id = gmail.list_history(mailbox.history_id)
+        
+        if message_ids is None or time.time() - mailbox.last_full_sync >= self.full_sync_interval:
+            # No usable history ID, or a periodic check of unread mail
+            messages = gmail.list_messages(
+                query="is:unread",
+                max_results=10
+            )
+            message_ids = list(dict.fromkeys((message_ids or []) + [msg['id'] for msg in messages]))
+            mailbox.last_full_sync = time.time()
+            if mailbox.next_history_id is None and mailbox.pushed_history_id:
+                mailbox.next_history_id = mailbox.pushed_history_id
+        
+        retry_ids, mailbox.retry_ids = mailbox.retry_ids, set()
+        message_ids = list(dict.fromkeys(message_ids + sorted(retry_ids)))
+        
+        # Skip if already processed (survives restarts)
+        pending = []
+        for msg_id in message_ids:
+            needed = self.ledger.should_process(mailbox.ledger_key(msg_id))
+            record_cache("ledger", hit=not needed)
+            if needed:
+                pending.append(msg_id)
+        
+        # Skip if another agent instance is working on it, or finished it since
+        # the check above (acquire_lease checks the ledger again)
+        leased = []
+        for msg_id in pending:
+            if self.ledger.acquire_lease(mailbox.ledger_key(msg_id)):
+                leased.append(msg_id)
+            else:
+                # Checked again next pass in case the other instance gives up on it
+                mailbox.retry_ids.add(msg_id)
+                logger.debug("Message %s (%s) is leased by another instance", msg_id, mailbox.label)
+        
+        if not leased:
+            return []
+        
+        # Fetch all full messages in one batched round trip
+        full_messages = gmail.get_messages(leased)
+        
+        fetched = []
+        for msg_id in leased:
+            if msg_id in full_messages:
+                fetched.append((msg_id, full_messages[msg_id]))
+            else:
+                self.ledger.release_lease(mailbox.ledger_key(msg_id))
+                mailbox.retry_ids.add(msg_id)
+        return fetched
+    
+    def _submit_message(self, mailbox: Mailbox, msg_id: str, full_message: Dict[str, Any]):
+        """
+        Hand one fetched Gmail message to the pipeline.
+        
+        Args:
+            mailbox: Mailbox the message arrived in
+            msg_id: Gmail message ID
+            full_message: Gmail message dictionary
+        
+        Returns:
+            Future resolving to the process_email-style result
+        """
+        # Extract email details
+        headers = full_message.get('payload', {}).get('headers', [])
+        from_email = next(
+            (h['value'] for h in headers if h['name'].lower() == 'from'),
+            'unknown@example.com'
+        )
+        thread_id = full_message.get('threadId')
+        
+        # Extract email body
+        email_body = mailbox.gmail_service.get_message_body(full_message)
+        
+        return self.pipeline.submit(
+            self._new_job(email_body, from_email, thread_id, contractor_id=mailbox.contractor_id)
+        )
+    
+    def _record_message(self, mailbox: Mailbox, msg_id: str, result: Dict[str, Any]) -> None:
+        """Record the outcome of a processed message in the ledger and release its lease."""
+        ledger_key = mailbox.ledger_key(msg_id)
+        try:
+            if result.get("success"):
+                self.ledger.record(ledger_key, "QUOTED", quote_number=result.get("quote_number"))
+                logger.debug("Marked message %s (%s) as processed", msg_id, mailbox.label)
+            elif result.get("retryable"):
+                # LLM overload isn't the message's fault; don't use up its attempts
+                logger.info("Deferring message %s (%s): %s", msg_id, mailbox.label, result.get("error"))
+            elif result.get("skipped"):
+                # Nothing to quote, and retrying won't change that
+                self.ledger.record(ledger_key, "SKIPPED", error=result.get("error"))
+            else:
+                self.ledger.record(ledger_key, "FAILED", error=result.get("error"))
+            if not result.get("success") and self.ledger.should_process(ledger_key):
+                mailbox.retry_ids.add(msg_id)
+        finally:
+            self.ledger.release_lease(ledger_key)
+    
+    def notify_push(self, history_id: Optional[str] = None, email_address: Optional[str] = None) -> None:
+        """
+        Signal that Gmail reported new mail, waking the polling loop immediately.
+        
+        Args:
+            history_id: Mailbox history ID from the push notification
+            email_address: Mailbox the notification was sent for
+        """
+        if history_id:
+            mailbox = self.mailboxes.find_by_email(email_address)
+            targets = [mailbox] if mailbox else self.mailboxes.all()
+            for target in targets:
+                target.note_push(history_id)
+        self._wake_event.set()
+    
+    def sync_inbox(self) -> int:
+        """
+        Run one sync across every mailbox.
+        
+        Mailboxes are listed and fetched concurrently. Messages are then
+        submitted to the pipeline round-robin across mailboxes so a busy inbox
+        cannot starve the others. Each mailbox uses Gmail history for an incremental sync
+        when a history ID is known, and lists unread messages otherwise.
+        
+        Returns:
+            Number of new messages found
+        """
+        with self._sync_lock:
+            mailboxes = self.mailboxes.all()
+            if not mailboxes:
+                return 0
+            
+            workers = min(len(mailboxes), int(os.getenv("MAILBOX_POLL_WORKERS", "8")))
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                collected = list(pool.map(self._collect_messages, mailboxes))
+            
+            found = sum(len(messages) for messages in collected)
+            if not found:
+                for mailbox in mailboxes:
+                    mailbox.commit_history()
+                logger.debug("No new unread messages")
+                return 0
+            
+            logger.info("Found %d new message(s) across %d mailbox(es)", found, len(mailboxes))
+            queues = [[(mailbox, msg_id, message) for msg_id, message in messages]
+                      for mailbox, messages in zip(mailboxes, collected)]
+            submitted = []
+            for round_ in zip_longest(*queues):
+                for mailbox, msg_id, message in filter(None, round_):
+                    try:
+                        future = self._submit_message(mailbox, msg_id, message)
+                    except Exception as e:
+                        self._record_message(mailbox, msg_id, {"success": False, "error": str(e)})
+                        continue
+                    submitted.append((mailbox, msg_id, future))
+            
+            self._await_messages(submitted)
+            # Only now is everything up to the new history ID recorded or queued for retry
+            for mailbox in mailboxes:
+                mailbox.commit_history()
+            
+            return found
+    
+    def _await_messages(self, submitted: List[tuple]) -> None:
+        """
+        Record pipeline results as they finish, keeping the other leases alive.
+        
+        Leases are taken for a whole pass at once, and a long pass (LLM
+        retries, a deep pipeline queue) can outlast `lease_seconds`. Every
+        third of that, the leases of messages still in flight are renewed so
+        no other instance takes them over mid-way.
+        
+        Args:
+            submitted: (mailbox, message ID, future) tuples from _submit_message
+        """
+        pending = {future: (mailbox, msg_id) for mailbox, msg_id, future in submitted}
+        renew_interval = self.ledger.lease_seconds / 3
+        last_renewal = time.time()
+        while pending:
+            done, _ = wait(pending, timeout=renew_interval, return_when=FIRST_COMPLETED)
+            for future in done:
+                mailbox, msg_id = pending.pop(future)
+                self._record_message(mailbox, msg_id, future.result())
+            if pending and time.time() - last_renewal >= renew_interval:
+                for mailbox, msg_id in pending.values():
+                    if not self.ledger.renew_lease(mailbox.ledger_key(msg_id)):
+                        logger.warning("Lost the lease on message %s (%s) while processing it", msg_id, mailbox.label)
+                last_renewal = time.time()
+    
+    def run_continuous(self, check_interval: int = 60, min_interval: int = 5):
         """
         Run the agent continuously, checking for new emails.
         
+        Push notifications (see notify_push) wake the loop immediately. Polling
+        remains as a fallback with an adaptive interval: it drops to
+        `min_interval` after finding mail and backs off to `check_interval`
+        while the inbox is idle.
+        
         Args:
-            check_interval: Seconds between email checks
+            check_interval: Maximum seconds between email checks
+            min_interval: Minimum seconds between email checks
         """
-        print(f"\n🔄 Starting continuous monitoring (checking every {check_interval} seconds)")
+        logger.info("Starting continuous monitoring (checking at most every %d seconds)", check_interval)
         print("Press Ctrl+C to stop\n")
         
-        processed_message_ids = set()
+        removed = self.ledger.compact()
+        if removed:
+            logger.info("Compacted ledger (%d stale entries removed)", removed)
+        
+        push_topic = os.getenv("GMAIL_PUSH_TOPIC")
+        last_watch = 0.0
+        interval = min_interval
+        self.loop_running = True
         
         try:
             while True:
-                print(f"\n[{datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] Checking for new emails...")
+                # Gmail watches expire after 7 days; renew daily
+                if push_topic and time.time() - last_watch > 86400:
+                    for mailbox in self.mailboxes.all():
+                        history_id = mailbox.gmail_service.watch_mailbox(push_topic)
+                        if history_id and not mailbox.history_id:
+                            mailbox.history_id = history_id
+                    last_watch = time.time()
                 
-                # Get unread messages
-                messages = self.gmail_service.list_messages(
-                    query="is:unread",
-                    max_results=10
-                )
+                logger.debug("Checking for new emails")
+                self._wake_event.clear()
+                found = self.sync_inbox()
                 
-                if not messages:
-                    print("   No new unread messages")
+                if found:
+                    interval = min_interval
                 else:
-                    print(f"   Found {len(messages)} unread message(s)")
-                    
-                    for msg in messages:
-                        msg_id = msg['id']
-                        
-                        # Skip if already processed
-                        if msg_id in processed_message_ids:
-                            continue
-                        
-                        # Get full message
-                        full_message = self.gmail_service.get_message(msg_id)
-                        if not full_message:
-                            continue
-                        
-                        # Extract email details
-                        headers = full_message.get('payload', {}).get('headers', [])
-                        from_email = next(
-                            (h['value'] for h in headers if h['name'].lower() == 'from'),
-                            'unknown@example.com'
-                        )
-                        thread_id = full_message.get('threadId')
-                        
-                        # Extract email body
-                        email_body = self.gmail_service.get_message_body(full_message)
-                        
-                        # Process the email
-                        if self.process_email(email_body, from_email, thread_id):
-                            processed_message_ids.add(msg_id)
-                            print(f"   ✓ Marked message {msg_id} as processed")
+                    interval = min(interval * 2, check_interval)
                 
-                # Wait before next check
-                print(f"\n⏳ Waiting {check_interval} seconds until next check...")
-                time.sleep(check_interval)
+                # Wait before next check, or until a push notification arrives
+                logger.debug("Waiting up to %d seconds until next check", interval)
+                if self._wake_event.wait(timeout=interval):
+                    logger.info("Push notification received")
         
         except KeyboardInterrupt:
-            print("\n\n🛑 Shutdown requested by user")
-            print("👋 Velocity Logic Agent stopped")
+            logger.info("Shutdown requested by user; Velocity Logic Agent stopped")
             sys.exit(0)
         except Exception as e:
-            print(f"\n✗ Fatal error in main loop: {e}")
-            import traceback
-            traceback.print_exc()
+            logger.exception("Fatal error in main loop: %s", e)
             sys.exit(1)
+        finally:
+            self.loop_running = False
 
 
 def main():
@@ -276,6 +847,17 @@ def main():
         John Smith
         """
         agent.process_email(sample_email, "john.smith@example.com")
+    elif len(sys.argv) > 2 and sys.argv[1] == "--backlog":
+        # JSONL with from_email and email_body per line, parsed in batch mode
+        with open(sys.argv[2], 'r') as f:
+            jobs = [json.loads(line) for line in f if line.strip()]
+        results = agent.process_backlog([
+            {"email_body": job["email_body"], "from_email": job["from_email"], "thread_id": job.get("thread_id")}
+            for job in jobs
+        ])
+        quoted = sum(1 for result in results if result.get("success"))
+        print(f"\n✓ Backlog done: {quoted}/{len(results)} emails quoted")
+        agent.pipeline.shutdown()
     else:
         # Run continuously
         agent.run_continuous(check_interval=60)
@@ -0,0 +1,138 @@
+"""
+Email Preprocessor
+Strips quoted history, signatures, legal footers and HTML remnants from email
+bodies before they are sent to the LLM.
+"""
+
+import html
+import re
+from typing import Dict, Any, List
+
+try:
+    import tiktoken
+    _ENCODING = tiktoken.get_encoding("o200k_base")
+except Exception:
+    # Optional: without tiktoken, fall back to the ~4 characters per token rule of thumb
+    _ENCODING = None
+
+
+# Lines that start quoted history; everything from here down is dropped
+QUOTE_HEADERS = [
+    re.compile(r"^On .{5,200}wrote:\s*$", re.IGNORECASE),
+    re.compile(r"^-{2,}\s*Original Message\s*-{2,}$", re.IGNORECASE),
+    re.compile(r"^_{10,}$"),
+    re.compile(r"^Le .{5,200}a écrit\s*:\s*$", re.IGNORECASE)
+]
+
+# Outlook-style "From: ... Sent: ..." header; only quoted history once the reply has started
+OUTLOOK_HEADER = re.compile(r"^From:\s.+$", re.IGNORECASE)
+
+# Lines that start a legal footer or disclaimer; everything from here down is dropped
+FOOTER_HEADERS = re.compile(
+    r"^(confidentiality notice|disclaimer|this (e-?mail|message)( and any attachments)? (is|are) "
+    r"(intended|confidential)|the information contained in this|please consider the environment)",
+    re.IGNORECASE
+)
+
+# Mobile client and mailing boilerplate, dropped line by line
+BOILERPLATE_LINES = re.compile(
+    r"^(sent from my \w+.*|get outlook for \w+.*|sent from (yahoo )?mail for \w+.*|"
+    r"sent via .+|unsubscribe.*|this email was scanned .+|\[cid:[^\]]+\])$",
+    re.IGNORECASE
+)
+
+SIGNATURE_DELIMITER = re.compile(r"^--\s?$")
+HTML_BLOCKS = re.compile(r"<(style|script|head)[^>]*>.*?</\1>", re.IGNORECASE | re.DOTALL)
+HTML_BREAKS = re.compile(r"<\s*(br|/p|/div|/li|/tr)\s*/?>", re.IGNORECASE)
+HTML_TAGS = re.compile(r"<[^>]+>")
+
+
+def estimate_tokens(text: str) -> int:
+    """Approximate the number of prompt tokens in a piece of text."""
+    if not text:
+        return 0
+    if _ENCODING is not None:
+        return len(_ENCODING.encode(text))
+    return (len(text) + 3) // 4
+
+
+class EmptyEmailError(ValueError):
+    """The email has no text to quote from (blank, or only attachments)."""
+
+
+def html_to_text(text: str) -> str:
+    """Plain text of an HTML body: scripts and styles dropped, line breaks kept, entities decoded."""
+    if "<" not in text and "&" not in text:
+        return text
+    text = HTML_BLOCKS.sub("", text)
+    text = HTML_BREAKS.sub("\n", text)
+    text = HTML_TAGS.sub("", text)
+    return html.unescape(text).replace("\xa0", " ")
+
+
+def _is_quote_header(line: str) -> bool:
+    return any(pattern.match(line) for pattern in QUOTE_HEADERS)
+
+
+def preprocess_email(email_body: str) -> Dict[str, Any]:
+    """
+    Reduce an email body to what the customer actually wrote.
+
+    Args:
+        email_body: Raw body as returned by GmailService.get_message_body
+
+    Returns:
+        Dictionary with the cleaned `text`, the untouched `original`, what was
+        `removed`, and token estimates before and after
+    """
+    original = email_body or ""
+    text = html_to_text(original)
+
+    removed: List[str] = []
+    kept: List[str] = []
+    in_signature = False
+    signature_name_kept = False
+    for raw_line in text.replace("\r\n", "\n").replace("\r", "\n").split("\n"):
+        line = re.sub(r"[ \t\f\v]+", " ", raw_line).strip()
+
+        if line.startswith(">") or _is_quote_header(line) or (OUTLOOK_HEADER.match(line) and any(kept)):
+            removed.append("quoted_history")
+            break
+        if FOOTER_HEADERS.match(line):
+            removed.append("legal_footer")
+            break
+        if SIGNATURE_DELIMITER.match(raw_line):
+            removed.append("signature")
+            in_signature = True
+            continue
+        if in_signature:
+            # Keep the name on the first signature line; drop titles, phones and links
+            if line and not signature_name_kept:
+                kept.append(line)
+                signature_name_kept = True
+            continue
+        if BOILERPLATE_LINES.match(line):
+            removed.append("boilerplate")
+            continue
+        kept.append(line)
+
+    cleaned = re.sub(r"\n{3,}", "\n\n", "\n".join(kept)).strip()
+
+    if not cleaned:
+        # A bare forward: the quoted text is the request, so keep it without the markers
+        cleaned = "\n".join(
+            line.lstrip("> ").strip() for line in text.splitlines() if not _is_quote_header(line.strip())
+        ).strip()
+        cleaned = re.sub(r"\n{3,}", "\n\n", cleaned)
+        removed = ["quote_markers"]
+
+    original_tokens = estimate_tokens(original)
+    tokens = estimate_tokens(cleaned)
+    return {
+        "text": cleaned,
+        "original": original,
+        "removed": sorted(set(removed)),
+        "original_tokens": original_tokens,
+        "tokens": tokens,
+        "tokens_saved": max(original_tokens - tokens, 0)
+    }
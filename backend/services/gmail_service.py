@@ -4,18 +4,98 @@ Handles Gmail API authentication and draft creation.
 """
 
 import os
+import io
 import base64
+import logging
 from email.mime.multipart import MIMEMultipart
 from email.mime.text import MIMEText
-from email.mime.base import MIMEBase
-from email import encoders
-from typing import Optional, Dict, Any
+from email.mime.application import MIMEApplication
+from typing import Optional, Dict, Any, List
 from google.auth.transport.requests import Request
 from google.oauth2.credentials import Credentials
 from google_auth_oauthlib.flow import InstalledAppFlow
-from googleapiclient.discovery import build
+from googleapiclient.discovery import build_from_document
 from googleapiclient.errors import HttpError
-import pickle
+from googleapiclient.http import MediaIoBaseUpload
+from services.metrics import external_call
+from services.log_service import get_logger
+from services.gmail_transport import discovery_document, credential_store, save_credentials, HttpPool
+from services.email_preprocessor import html_to_text
+
+logger = get_logger("gmail")
+
+# Characters of a draft body shown in mock mode debug output
+MOCK_BODY_PREVIEW_CHARS = 200
+
+# MIME nesting levels requested from Gmail (mixed > related > alternative > text, plus forwards)
+MAX_PART_DEPTH = 5
+
+
+def _part_fields(depth: int) -> str:
+    """Field mask for a message part and `depth` levels of nested parts."""
+    fields = "mimeType,filename,headers,body(data,attachmentId)"
+    if depth > 0:
+        fields += f",parts({_part_fields(depth - 1)})"
+    return fields
+
+
+def _header(part: Dict[str, Any], name: str) -> str:
+    return next((h.get('value', '') for h in part.get('headers') or [] if h.get('name', '').lower() == name), '')
+
+
+def _decode_part(part: Dict[str, Any], max_bytes: int) -> str:
+    """Decode at most max_bytes of a part's base64url body, in its declared charset."""
+    data = part.get('body', {}).get('data') or ''
+    # Every 4 base64 characters hold 3 bytes; don't decode more than the cap
+    data = data[:-(-max_bytes // 3) * 4]
+    raw = base64.urlsafe_b64decode(data + '=' * (-len(data) % 4))[:max_bytes]
+    charset = 'utf-8'
+    for param in _header(part, 'content-type').split(';')[1:]:
+        key, _, value = param.partition('=')
+        if key.strip().lower() == 'charset' and value.strip():
+            charset = value.strip().strip('"\'')
+    try:
+        return raw.decode(charset, errors='replace')
+    except LookupError:
+        return raw.decode('utf-8', errors='replace')
+
+
+def extract_message_body(payload: Dict[str, Any], max_bytes: int = 64 * 1024) -> str:
+    """
+    Text of a Gmail message payload, however deeply its parts are nested.
+    
+    Parts are walked depth-first in document order with an explicit stack.
+    The first text/plain part wins. Otherwise the first text/html part is
+    converted to text. Attachments (parts with a file name, an attachment ID
+    or an attachment disposition) are skipped without being decoded.
+    
+    Args:
+        payload: The message's `payload`
+        max_bytes: Most bytes of body decoded; longer bodies are truncated
+    
+    Returns:
+        The body text, or an empty string if the message has none
+    """
+    html_part = None
+    stack = [payload]
+    while stack:
+        part = stack.pop()
+        if part.get('filename') or part.get('body', {}).get('attachmentId') \
+                or _header(part, 'content-disposition').lower().startswith('attachment'):
+            continue
+        mime_type = (part.get('mimeType') or '').lower()
+        if part.get('parts'):
+            stack.extend(reversed(part['parts']))
+        elif mime_type == 'text/plain' and part.get('body', {}).get('data'):
+            return _decode_part(part, max_bytes)
+        elif mime_type == 'text/html' and html_part is None and part.get('body', {}).get('data'):
+            html_part = part
+    
+    if html_part is not None:
+        # Markup takes most of an HTML body, so allow more of it before converting
+        text = html_to_text(_decode_part(html_part, max_bytes * 4)).strip()
+        return text.encode('utf-8')[:max_bytes].decode('utf-8', errors='ignore')
+    return ''
 
 
 class GmailService:
@@ -24,6 +104,12 @@ class GmailService:
     # Gmail API scopes
     SCOPES = ['https://www.googleapis.com/auth/gmail.compose']
     
+    # Field mask limiting message responses to what get_message_body reads
+    MESSAGE_FIELDS = f"id,threadId,payload({_part_fields(MAX_PART_DEPTH)})"
+    
+    # Gmail rejects batches over 100 calls and throttles above ~50
+    BATCH_SIZE = 50
+    
     def __init__(self, credentials_path: str = "credentials.json", token_path: str = "token.pickle"):
         """
         Initialize Gmail service.
@@ -35,28 +121,28 @@ class GmailService:
         self.credentials_path = credentials_path
         self.token_path = token_path
         self.service = None
+        self.transport: Optional[HttpPool] = None
         self.mock_mode = False
         
         if not os.path.exists(credentials_path):
-            print("⚠ Warning: Google Cloud Credentials not found. Running in Mock Mode (simulated email).")
+            logger.warning("Google Cloud Credentials not found. Running in Mock Mode (simulated email).")
             self.mock_mode = True
         else:
             self.authenticate_gmail()
     
     def authenticate_gmail(self) -> None:
-        """Authenticate with Gmail API using OAuth2."""
+        """
+        Authenticate with Gmail API using OAuth2.
+        
+        Credentials are shared per token file and refreshed in the background
+        (see gmail_transport.CredentialStore); the service is built from the
+        process-wide parsed discovery document.
+        """
         if self.mock_mode:
             return
         
-        creds = None
-        
-        # Load existing token
-        if os.path.exists(self.token_path):
-            try:
-                with open(self.token_path, 'rb') as token:
-                    creds = pickle.load(token)
-            except Exception as e:
-                print(f"⚠ Error loading token: {e}")
+        # Load existing token (once per process)
+        creds = credential_store.load(self.token_path)
         
         # If there are no (valid) credentials available, let the user log in
         if not creds or not creds.valid:
@@ -64,7 +150,7 @@ class GmailService:
                 try:
                     creds.refresh(Request())
                 except Exception as e:
-                    print(f"⚠ Error refreshing token: {e}")
+                    logger.warning("Error refreshing token: %s", e)
                     creds = None
             
             if not creds:
@@ -74,59 +160,77 @@ class GmailService:
                     )
                     creds = flow.run_local_server(port=0)
                 except Exception as e:
-                    print(f"✗ Error during OAuth flow: {e}")
-                    print("⚠ Falling back to Mock Mode")
+                    logger.error("Error during OAuth flow: %s; falling back to Mock Mode", e)
                     self.mock_mode = True
                     return
             
             # Save the credentials for the next run
             try:
-                with open(self.token_path, 'wb') as token:
-                    pickle.dump(creds, token)
+                save_credentials(creds, self.token_path)
             except Exception as e:
-                print(f"⚠ Warning: Could not save token: {e}")
+                logger.warning("Could not save token: %s", e)
+        
+        credential_store.register(self.token_path, creds)
         
         try:
-            self.service = build('gmail', 'v1', credentials=creds)
-            print("✓ Gmail API authenticated successfully")
+            self.transport = HttpPool(
+                creds,
+                timeout=float(os.getenv("GMAIL_TIMEOUT", "30")),
+                max_idle=int(os.getenv("GMAIL_MAX_IDLE_CONNECTIONS", "8"))
+            )
+            # Requests are always executed on a pooled connection (see _execute)
+            self.service = build_from_document(discovery_document(), credentials=creds)
+            logger.info("Gmail API authenticated successfully")
         except Exception as e:
-            print(f"✗ Error building Gmail service: {e}")
-            print("⚠ Falling back to Mock Mode")
+            logger.error("Error building Gmail service: %s; falling back to Mock Mode", e)
             self.mock_mode = True
     
+    def _execute(self, request, operation: str) -> Dict[str, Any]:
+        """Execute a Gmail API request on a pooled keep-alive connection, recording its latency."""
+        with external_call("gmail", operation), self.transport.connection() as http:
+            return request.execute(http=http)
+    
     def create_draft(
         self,
         to_email: str,
         subject: str,
         body: str,
         thread_id: Optional[str] = None,
-        pdf_path: Optional[str] = None
+        pdf_path: Optional[str] = None,
+        pdf_bytes: Optional[bytes] = None,
+        pdf_filename: Optional[str] = None
     ) -> Optional[Dict[str, Any]]:
         """
         Create a Gmail draft with optional PDF attachment.
         
+        The message is uploaded as raw RFC 822 media, so the PDF is
+        base64-encoded once (as its MIME part) rather than again with the
+        whole message.
+        
         Args:
             to_email: Recipient email address
             subject: Email subject
             body: Email body text
             thread_id: Optional thread ID to reply to
             pdf_path: Optional path to PDF file to attach
+            pdf_bytes: PDF to attach straight from memory (takes precedence over pdf_path)
+            pdf_filename: Attachment name for pdf_bytes
         
         Returns:
             Dictionary with draft info or None if in mock mode
         """
         if self.mock_mode:
-            print(f"\n{'='*60}")
-            print("📧 MOCK MODE - Email Draft (Not Sent)")
-            print(f"{'='*60}")
-            print(f"To: {to_email}")
-            print(f"Subject: {subject}")
-            if thread_id:
-                print(f"Thread ID: {thread_id}")
-            print(f"\nBody:\n{body}")
-            if pdf_path:
-                print(f"\nAttachment: {pdf_path}")
-            print(f"{'='*60}\n")
+            # Never log whole bodies; a short preview is enough to eyeball output
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug("MOCK MODE - Email draft (not sent)", extra={
+                    "to": to_email,
+                    "subject": subject,
+                    "thread_id": thread_id,
+                    "attachment": pdf_filename or pdf_path,
+                    "attachment_bytes": len(pdf_bytes) if pdf_bytes else None,
+                    "body_chars": len(body),
+                    "body_preview": body[:MOCK_BODY_PREVIEW_CHARS].replace("\n", " ")
+                })
             return {
                 "id": "mock_draft_id",
                 "message": {"threadId": thread_id or "mock_thread_id"}
@@ -142,45 +246,38 @@ class GmailService:
             message.attach(MIMEText(body, 'plain'))
             
             # Add PDF attachment if provided
-            if pdf_path and os.path.exists(pdf_path):
+            if pdf_bytes is None and pdf_path and os.path.exists(pdf_path):
                 with open(pdf_path, "rb") as attachment:
-                    part = MIMEBase('application', 'octet-stream')
-                    part.set_payload(attachment.read())
-                
-                encoders.encode_base64(part)
-                part.add_header(
-                    'Content-Disposition',
-                    f'attachment; filename= {os.path.basename(pdf_path)}'
-                )
+                    pdf_bytes = attachment.read()
+                pdf_filename = pdf_filename or os.path.basename(pdf_path)
+            if pdf_bytes is not None:
+                # Base64-encoded here, once
+                part = MIMEApplication(pdf_bytes, 'pdf')
+                part.add_header('Content-Disposition', 'attachment', filename=pdf_filename or "quote.pdf")
                 message.attach(part)
             
-            # Encode message
-            raw_message = base64.urlsafe_b64encode(message.as_bytes()).decode('utf-8')
-            
-            # Create draft
-            draft_body = {
-                'message': {
-                    'raw': raw_message
-                }
-            }
+            # Create draft; thread ID goes in the metadata, the message itself as media
+            draft_body = {'message': {}}
             
             # Add thread ID if replying
             if thread_id:
                 draft_body['message']['threadId'] = thread_id
             
-            draft = self.service.users().drafts().create(
+            media = MediaIoBaseUpload(io.BytesIO(message.as_bytes()), mimetype='message/rfc822')
+            draft = self._execute(self.service.users().drafts().create(
                 userId='me',
-                body=draft_body
-            ).execute()
+                body=draft_body,
+                media_body=media
+            ), "drafts.create")
             
-            print(f"✓ Created Gmail draft: {draft['id']}")
+            logger.info("Created Gmail draft %s", draft['id'])
             return draft
             
         except HttpError as error:
-            print(f"✗ Gmail API error: {error}")
+            logger.error("Gmail API error: %s", error)
             return None
         except Exception as e:
-            print(f"✗ Error creating draft: {e}")
+            logger.error("Error creating draft: %s", e)
             return None
     
     def get_message(self, message_id: str) -> Optional[Dict[str, Any]]:
@@ -197,16 +294,58 @@ class GmailService:
             return None
         
         try:
-            message = self.service.users().messages().get(
+            message = self._execute(self.service.users().messages().get(
                 userId='me',
                 id=message_id,
-                format='full'
-            ).execute()
+                format='full',
+                fields=self.MESSAGE_FIELDS
+            ), "messages.get")
             return message
         except HttpError as error:
-            print(f"✗ Error getting message: {error}")
+            logger.error("Error getting message: %s", error)
             return None
     
+    def get_messages(self, message_ids: List[str]) -> Dict[str, Dict[str, Any]]:
+        """
+        Get many Gmail messages using batched HTTP requests.
+        
+        Args:
+            message_ids: Gmail message IDs
+        
+        Returns:
+            Dictionary of message ID to message; failed fetches are omitted
+        """
+        if self.mock_mode or not message_ids:
+            return {}
+        
+        messages = {}
+        
+        def on_response(request_id, response, exception):
+            if exception is not None:
+                logger.error("Error getting message %s: %s", request_id, exception)
+            else:
+                messages[request_id] = response
+        
+        for start in range(0, len(message_ids), self.BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=on_response)
+            for message_id in message_ids[start:start + self.BATCH_SIZE]:
+                batch.add(
+                    self.service.users().messages().get(
+                        userId='me',
+                        id=message_id,
+                        format='full',
+                        fields=self.MESSAGE_FIELDS
+                    ),
+                    request_id=message_id
+                )
+            try:
+                with external_call("gmail", "batch"), self.transport.connection() as http:
+                    batch.execute(http=http)
+            except HttpError as error:
+                logger.error("Error executing message batch: %s", error)
+        
+        return messages
+    
     def list_messages(self, query: str = "is:unread", max_results: int = 10) -> list:
         """
         List Gmail messages matching a query.
@@ -219,22 +358,100 @@ class GmailService:
             List of message dictionaries
         """
         if self.mock_mode:
-            print(f"📧 MOCK MODE - Would search for: {query}")
+            logger.debug("MOCK MODE - Would search for: %s", query)
             return []
         
         try:
-            results = self.service.users().messages().list(
+            results = self._execute(self.service.users().messages().list(
                 userId='me',
                 q=query,
                 maxResults=max_results
-            ).execute()
+            ), "messages.list")
             
             messages = results.get('messages', [])
             return messages
         except HttpError as error:
-            print(f"✗ Error listing messages: {error}")
+            logger.error("Error listing messages: %s", error)
             return []
     
+    def watch_mailbox(self, topic_name: str, label_ids: Optional[List[str]] = None) -> Optional[str]:
+        """
+        Ask Gmail to publish mailbox changes to a Pub/Sub topic.
+        
+        Watches expire after 7 days and must be renewed.
+        
+        Args:
+            topic_name: Full Pub/Sub topic name (projects/<project>/topics/<topic>)
+            label_ids: Labels to watch (defaults to INBOX)
+        
+        Returns:
+            The mailbox history ID at the time of the watch, or None
+        """
+        if self.mock_mode:
+            logger.info("MOCK MODE - Would watch mailbox via: %s", topic_name)
+            return None
+        
+        try:
+            response = self._execute(self.service.users().watch(
+                userId='me',
+                body={
+                    'topicName': topic_name,
+                    'labelIds': label_ids or ['INBOX'],
+                    'labelFilterBehavior': 'INCLUDE'
+                }
+            ), "watch")
+            return response.get('historyId')
+        except HttpError as error:
+            logger.error("Error watching mailbox: %s", error)
+            return None
+    
+    def list_history(self, start_history_id: str) -> tuple:
+        """
+        List messages added to the inbox since a history ID.
+        
+        Args:
+            start_history_id: History ID from a previous sync or push notification
+        
+        Returns:
+            Tuple of (new message IDs, latest history ID). The message list is
+            None if the start ID is too old and a full sync is required.
+        """
+        if self.mock_mode:
+            return [], start_history_id
+        
+        message_ids = []
+        latest_history_id = start_history_id
+        page_token = None
+        
+        try:
+            while True:
+                results = self._execute(self.service.users().history().list(
+                    userId='me',
+                    startHistoryId=start_history_id,
+                    historyTypes=['messageAdded'],
+                    labelId='INBOX',
+                    pageToken=page_token
+                ), "history.list")
+                
+                for record in results.get('history', []):
+                    for added in record.get('messagesAdded', []):
+                        msg_id = added['message']['id']
+                        if msg_id not in message_ids:
+                            message_ids.append(msg_id)
+                
+                latest_history_id = results.get('historyId', latest_history_id)
+                page_token = results.get('nextPageToken')
+                if not page_token:
+                    break
+            
+            return message_ids, latest_history_id
+        except HttpError as error:
+            # 404 means the history ID is no longer available
+            if error.resp.status == 404:
+                return None, latest_history_id
+            logger.error("Error listing history: %s", error)
+            return [], latest_history_id
+    
     def get_message_body(self, message: Dict[str, Any]) -> str:
         """
         Extract plain text body from a Gmail message.
@@ -243,30 +460,16 @@ class GmailService:
             message: Gmail message dictionary
         
         Returns:
-            Plain text body
+            Plain text body (at most GMAIL_MAX_BODY_BYTES), or an empty string
         """
         if self.mock_mode:
             return "Mock email body"
         
         try:
-            payload = message.get('payload', {})
-            parts = payload.get('parts', [])
-            
-            # Try to find plain text part
-            for part in parts:
-                if part.get('mimeType') == 'text/plain':
-                    data = part.get('body', {}).get('data')
-                    if data:
-                        return base64.urlsafe_b64decode(data).decode('utf-8')
-            
-            # If no plain text part, try the body directly
-            body = payload.get('body', {})
-            data = body.get('data')
-            if data:
-                return base64.urlsafe_b64decode(data).decode('utf-8')
-            
-            return ""
+            return extract_message_body(
+                message.get('payload', {}),
+                max_bytes=int(os.getenv("GMAIL_MAX_BODY_BYTES", str(64 * 1024)))
+            )
         except Exception as e:
-            print(f"✗ Error extracting message body: {e}")
+            logger.error("Error extracting message body: %s", e)
             return ""
-
@@ -0,0 +1,200 @@
+"""
+Gmail Transport
+Process-wide pieces shared by every GmailService: the parsed discovery
+document, cached OAuth credentials with background refresh, and a pool of
+keep-alive HTTP connections.
+"""
+
+import json
+import os
+import pickle
+import tempfile
+import threading
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Optional, Dict, Any, List, Tuple, Iterator
+
+import httplib2
+from google.auth.transport.requests import Request
+from google_auth_httplib2 import AuthorizedHttp
+from googleapiclient import discovery_cache
+
+from services.log_service import get_logger
+
+logger = get_logger("gmail.transport")
+
+
+_discovery_lock = threading.Lock()
+_discovery_documents: Dict[Tuple[str, str], Dict[str, Any]] = {}
+
+
+def discovery_document(service_name: str = "gmail", version: str = "v1") -> Dict[str, Any]:
+    """
+    The API's discovery document, parsed once per process.
+
+    Read from GMAIL_DISCOVERY_PATH if set, otherwise from the copy bundled
+    with google-api-python-client, so building a service never touches the network.
+    """
+    key = (service_name, version)
+    if key not in _discovery_documents:
+        with _discovery_lock:
+            if key not in _discovery_documents:
+                path = os.getenv("GMAIL_DISCOVERY_PATH")
+                if path:
+                    with open(path, "r") as f:
+                        text = f.read()
+                else:
+                    text = discovery_cache.get_static_doc(service_name, version)
+                if text is None:
+                    raise RuntimeError(f"No bundled discovery document for {service_name} {version}")
+                _discovery_documents[key] = json.loads(text)
+    return _discovery_documents[key]
+
+
+def save_credentials(credentials, token_path: str) -> None:
+    """Write credentials to their token file (atomically, so a crash can't truncate it)."""
+    # A unique temp file, since the background refresher and a request may save at once
+    fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(os.path.abspath(token_path)), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as token:
+            pickle.dump(credentials, token)
+        os.replace(temp_path, token_path)
+    except BaseException:
+        try:
+            os.remove(temp_path)
+        except FileNotFoundError:
+            pass
+        raise
+
+
+class CredentialStore:
+    """
+    OAuth credentials shared across services, loaded once per token file.
+
+    A daemon thread refreshes access tokens `refresh_margin` before they
+    expire and saves them back to their token file, so requests never wait
+    on a token refresh.
+    """
+
+    def __init__(self, refresh_margin: timedelta = timedelta(minutes=10), check_interval: float = 60.0):
+        """
+        Initialize the store.
+
+        Args:
+            refresh_margin: How long before expiry a token is refreshed
+            check_interval: Seconds between expiry checks
+        """
+        self.refresh_margin = refresh_margin
+        self.check_interval = check_interval
+        self._credentials: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+        self._thread: Optional[threading.Thread] = None
+        self._stop = threading.Event()
+
+    def load(self, token_path: str) -> Optional[Any]:
+        """Credentials for a token file, unpickled on first use; None if there is no usable file."""
+        with self._lock:
+            if token_path in self._credentials:
+                return self._credentials[token_path]
+            creds = None
+            if os.path.exists(token_path):
+                try:
+                    with open(token_path, 'rb') as token:
+                        creds = pickle.load(token)
+                except Exception as e:
+                    logger.warning("Error loading token %s: %s", token_path, e)
+            if creds is not None:
+                self._credentials[token_path] = creds
+            return creds
+
+    def register(self, token_path: str, credentials) -> None:
+        """Track credentials (e.g. from a fresh OAuth flow) and keep them refreshed."""
+        with self._lock:
+            self._credentials[token_path] = credentials
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="gmail-token-refresh", daemon=True)
+                self._thread.start()
+
+    def refresh_due(self) -> List[str]:
+        """Refresh every token that expires within refresh_margin; returns their token paths."""
+        with self._lock:
+            tracked = list(self._credentials.items())
+        # google-auth keeps expiry as naive UTC
+        deadline = datetime.utcnow() + self.refresh_margin
+        refreshed = []
+        for token_path, creds in tracked:
+            if not getattr(creds, "refresh_token", None) or creds.expiry is None or creds.expiry > deadline:
+                continue
+            try:
+                creds.refresh(Request())
+                save_credentials(creds, token_path)
+                refreshed.append(token_path)
+            except Exception as e:
+                # The request path refreshes on its own if this keeps failing
+                logger.warning("Background token refresh failed for %s: %s", token_path, e)
+        if refreshed:
+            logger.debug("Refreshed %d Gmail token(s)", len(refreshed))
+        return refreshed
+
+    def _run(self) -> None:
+        while not self._stop.wait(self.check_interval):
+            self.refresh_due()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+
+# Shared by every GmailService in the process
+credential_store = CredentialStore()
+
+
+class HttpPool:
+    """
+    Authorized keep-alive connections to Gmail, shared by every thread.
+
+    httplib2.Http isn't thread-safe, so each request checks a connection out
+    for its duration and returns it afterwards. Connections outlive the
+    threads that used them (poll workers, Flask request threads), so TLS
+    handshakes aren't repeated per call.
+    """
+
+    def __init__(self, credentials, timeout: Optional[float] = None, max_idle: int = 8):
+        """
+        Initialize the pool.
+
+        Args:
+            credentials: google-auth credentials applied to every request
+            timeout: Socket timeout in seconds
+            max_idle: Idle connections kept open; extras are closed when returned
+        """
+        self.credentials = credentials
+        self.timeout = timeout
+        self.max_idle = max_idle
+        self._idle: List[AuthorizedHttp] = []
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def connection(self) -> Iterator[AuthorizedHttp]:
+        """Check out a connection for one request (or batch)."""
+        with self._lock:
+            http = self._idle.pop() if self._idle else None
+        if http is None:
+            http = AuthorizedHttp(self.credentials, http=httplib2.Http(timeout=self.timeout))
+        try:
+            yield http
+        except BaseException:
+            # The connection may be mid-response; don't hand it to anyone else
+            http.close()
+            raise
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append(http)
+                return
+        http.close()
+
+    def close(self) -> None:
+        """Close every idle connection."""
+        with self._lock:
+            idle, self._idle = self._idle, []
+        for http in idle:
+            http.close()
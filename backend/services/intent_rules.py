@@ -0,0 +1,324 @@
+"""
+Intent Rules
+Local, rule-based email intent extraction that answers routine requests
+without an LLM round trip.
+"""
+
+import csv
+import re
+from typing import Optional, Dict, Any, List, Tuple
+
+
+NUMBER_WORDS = {
+    "a": 1, "an": 1, "one": 1, "single": 1, "two": 2, "couple": 2, "pair": 2, "three": 3,
+    "four": 4, "five": 5, "six": 6, "seven": 7, "eight": 8, "nine": 9, "ten": 10
+}
+
+CLOSINGS = re.compile(
+    r"^(thanks|thank you|thx|regards|best|best regards|kind regards|cheers|sincerely|warm regards)[\s,!.]*$",
+    re.IGNORECASE
+)
+INTRODUCTION = re.compile(r"\b(?:[Mm]y name is|[Tt]his is|I am|I'm)\s+([A-Z][a-z]+(?:\s+[A-Z][a-z]+){0,2})")
+NAME_LINE = re.compile(r"^[A-Z][a-zA-Z'\-]+(?:\s+[A-Z][a-zA-Z'\-]+){0,2}$")
+HOURS = re.compile(r"\b(\d{1,2})\s*(?:hours?|hrs?)\b")
+
+# Punctuation and conjunctions that end a clause; quantities and negations don't carry across them
+CLAUSE_BREAK = re.compile(r"[.,;:!?\n]+|\s(?:but|however|although|though)\s", re.IGNORECASE)
+
+# Words (after tokenize) that reverse what follows: "don't install", "no AC", "instead of a furnace"
+NEGATIONS = {"no", "not", "never", "without", "dont", "instead", "nor"}
+
+# Words allowed between a quantity and the service it counts: "two new furnaces", "a pair of units"
+QUANTITY_FILLER = {"of", "new", "x", "more", "extra", "additional", "replacement", "separate", "the"}
+
+# Phrases that signal the customer needs advice rather than a straight quote
+UNCERTAINTY = re.compile(
+    r"\b(not sure|unsure|no idea|don'?t know|recommend|what do you think|options|compare|something'?s wrong|take a look)\b",
+    re.IGNORECASE
+)
+
+# Wording about an existing job rather than a request for a new quote
+NON_REQUEST = re.compile(
+    r"\b(cancel\w*|invoice\w*|bill(?:ed|ing)?|receipt|refund\w*|reschedul\w*|paid|payment|warranty|you did|already done)\b",
+    re.IGNORECASE
+)
+
+# Stemmed work verbs, mapped to the kind of job they ask for
+ACTIONS = {
+    "install": "install", "repair": "repair", "fix": "repair", "clean": "clean",
+    "replace": "replace", "replac": "replace", "replacement": "replace",
+    "inspect": "inspect", "inspection": "inspect"
+}
+
+WORD = re.compile(r"[a-z0-9']+")
+
+
+def _stem(word: str) -> str:
+    """Crude suffix stripping so install/installed/installation compare equal."""
+    for suffix in ("ations", "ation", "ing", "ed", "s"):
+        if word.endswith(suffix) and len(word) - len(suffix) >= 3:
+            return word[:-len(suffix)]
+    return word
+
+
+def tokenize(text: str) -> List[str]:
+    """Lowercased, stemmed words of a piece of text."""
+    return [_stem(word) for word in WORD.findall(text.lower())]
+
+
+def _is_negation(token: str) -> bool:
+    return token in NEGATIONS or token.endswith("n't")
+
+
+def _clauses(text: str) -> List[str]:
+    """The text split into clauses, e.g. "no furnace, just AC" -> ["no furnace", " just AC"]."""
+    return [clause for clause in CLAUSE_BREAK.split(text) if WORD.search(clause)]
+
+
+def _own_lines(email_body: str) -> List[str]:
+    """Non-empty lines the customer wrote, stopping at quoted history."""
+    lines = []
+    for line in email_body.strip().splitlines():
+        line = line.strip()
+        if line.startswith(">") or line.startswith("-----") or re.match(r"^On .+ wrote:$", line):
+            break
+        if line:
+            lines.append(line)
+    return lines
+
+
+class RuleBasedIntentExtractor:
+    """
+    Matches email text against pricing catalog keywords.
+
+    Each keyword is weighted by how few catalog rows share it, so "furnace"
+    (installation and repair) counts less than "ductwork", and spelling out a
+    full service name earns a bonus. Items are picked greedily: the
+    best-scoring row wins and consumes the words it matched, then the
+    remaining words are scored again. Confidence drops when another row
+    explains the same words almost as well, for long emails and for requests
+    for advice, so anything non-routine is escalated to the LLM.
+    """
+
+    # Minimum keyword weight for a catalog row to become a line item
+    MIN_ITEM_SCORE = 0.75
+
+    # Score gap to the runner-up below which a match counts as ambiguous
+    AMBIGUITY_MARGIN = 0.25
+
+    # Added when the whole service name appears, e.g. "furnace installation"
+    FULL_NAME_BONUS = 0.5
+
+    # Emails longer than this (in words) are rarely one-line routine requests
+    LONG_EMAIL_WORDS = 80
+
+    # Tokens before a service phrase searched for a negation
+    NEGATION_WINDOW = 4
+
+    # Highest confidence for several items, negated wording, keyword-only
+    # matches and mismatched verbs, kept below the fast path threshold
+    # (FAST_PATH_MIN_CONFIDENCE) so the LLM checks them
+    CAUTIOUS_CONFIDENCE = 75
+
+    def __init__(self, pricing_csv_path: str = "data/pricing.csv", rows: Optional[List[Dict[str, Any]]] = None):
+        """
+        Initialize the extractor.
+
+        Args:
+            pricing_csv_path: Path to the pricing CSV file
+            rows: Catalog rows (dicts with Service Name, Keywords, Unit) to use instead of the CSV
+        """
+        if rows is None:
+            with open(pricing_csv_path, 'r') as f:
+                rows = list(csv.DictReader(f))
+
+        # (service name, unit, full name tokens, [keyword token tuples])
+        self.services: List[Tuple[str, str, Tuple[str, ...], List[Tuple[str, ...]]]] = []
+        document_frequency: Dict[str, int] = {}
+        for row in rows:
+            name = tuple(tokenize(row["Service Name"]))
+            phrases = {name}
+            phrases.update(
+                tuple(tokenize(keyword)) for keyword in str(row.get("Keywords") or "").split(",") if keyword.strip()
+            )
+            phrases.discard(())
+            self.services.append((row["Service Name"], str(row.get("Unit") or "Each"), name, sorted(phrases)))
+            for token in {token for phrase in phrases for token in phrase}:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+
+        self.weights = {token: 1.0 / count for token, count in document_frequency.items()}
+
+    def _match(self, tokens: List[str]) -> List[Dict[str, Any]]:
+        """Find keyword phrases of every catalog row in the token list."""
+        matches = []
+        for service_name, unit, name, phrases in self.services:
+            positions: Dict[int, str] = {}
+            name_spans = []
+            for phrase in phrases:
+                size = len(phrase)
+                for start in range(len(tokens) - size + 1):
+                    if tuple(tokens[start:start + size]) == phrase:
+                        for offset, token in enumerate(phrase):
+                            positions[start + offset] = token
+                        if phrase == name:
+                            name_spans.append(range(start, start + size))
+            if positions:
+                matches.append({
+                    "service_name": service_name,
+                    "unit": unit,
+                    "positions": positions,
+                    "name": name,
+                    "name_spans": name_spans,
+                    "actions": {ACTIONS[token] for phrase in phrases for token in phrase if token in ACTIONS}
+                })
+        return matches
+
+    def _score(self, match: Dict[str, Any], consumed: set) -> float:
+        tokens = {token for position, token in match["positions"].items() if position not in consumed}
+        score = sum(self.weights.get(token, 0.0) for token in tokens)
+        if any(not consumed.intersection(span) for span in match["name_spans"]):
+            score += self.FULL_NAME_BONUS
+        return score
+
+    def _quantity(self, tokens: List[str], text: str, clause_text: str, clause_start: int, position: int, unit: str) -> int:
+        """
+        Quantity of the service whose phrase starts at `position`.
+
+        Only a number directly in front of the phrase counts ("2 furnaces",
+        "a pair of thermostats"), so "3 units ... for the 2 story house"
+        doesn't leak into an unrelated item. Hourly services also take an
+        hour count from their own clause, or from anywhere in the email if
+        it mentions exactly one.
+        """
+        if unit.lower() == "hour":
+            hours = HOURS.findall(clause_text.lower()) or HOURS.findall(text.lower())
+            if len(hours) == 1:
+                return int(hours[0])
+        index = position - 1
+        while index >= clause_start and tokens[index] in QUANTITY_FILLER:
+            index -= 1
+        if index >= clause_start:
+            token = tokens[index]
+            if token.isdigit() and 0 < int(token) <= 50:
+                return int(token)
+            if token in NUMBER_WORDS:
+                return NUMBER_WORDS[token]
+        return 1
+
+    def _customer_name(self, email_body: str, lines: List[str]) -> str:
+        for index, line in enumerate(lines[:-1]):
+            if CLOSINGS.match(line) and NAME_LINE.match(lines[index + 1]):
+                return lines[index + 1]
+
+        introduction = INTRODUCTION.search(email_body)
+        if introduction:
+            return introduction.group(1)
+
+        if len(lines) > 1 and NAME_LINE.match(lines[-1]) and len(lines[-1].split()) >= 2:
+            return lines[-1]
+        return "Customer"
+
+    def extract(self, email_body: str) -> Dict[str, Any]:
+        """
+        Extract intent from an email body.
+
+        Args:
+            email_body: The email body text to parse
+
+        Returns:
+            Dictionary shaped like LLMService.parse_email_intent output, with
+            confidence_score 0 when nothing in the catalog matched
+        """
+        lines = _own_lines(email_body)
+        text = "\n".join(lines)
+        clause_texts = _clauses(text)
+        # Tokens of every clause in order, and the clause each token belongs to
+        tokens, clause_of, clause_starts = [], [], []
+        for index, clause in enumerate(clause_texts):
+            clause_starts.append(len(tokens))
+            clause_tokens = tokenize(clause)
+            tokens.extend(clause_tokens)
+            clause_of.extend([index] * len(clause_tokens))
+        matches = self._match(tokens)
+
+        consumed: set = set()
+        items, reasoning, confidences = [], [], []
+        negated = False
+        unconfirmed = []
+        while matches:
+            ranked = sorted(matches, key=lambda m: self._score(m, consumed), reverse=True)
+            best = ranked[0]
+            score = self._score(best, consumed)
+            if score < self.MIN_ITEM_SCORE:
+                break
+
+            claimed = set(best["positions"]) - consumed
+            start = min(claimed)
+            clause = clause_of[start]
+            clause_start = clause_starts[clause]
+            clause_tokens = [t for i, t in enumerate(tokens) if clause_of[i] == clause]
+            if any(_is_negation(token) for token in clause_tokens):
+                negated = True
+            if any(_is_negation(token) for token in tokens[max(clause_start, start - self.NEGATION_WINDOW):start]):
+                # "don't install a furnace": the words are used up, but nothing is quoted
+                reasoning.append(f"Skipped {best['service_name']}: the customer said they don't need it")
+                consumed.update(claimed)
+                matches = [m for m in matches if m is not best]
+                continue
+
+            # Only rows competing for the same words make a match ambiguous
+            rivals = [m for m in ranked[1:] if claimed.intersection(m["positions"])]
+            runner_up = self._score(rivals[0], consumed) if rivals else 0.0
+            ambiguous = score - runner_up < self.AMBIGUITY_MARGIN
+            confidences.append(min(90, 55 + 35 * min(score, 1.0)) - (25 if ambiguous else 0))
+
+            # "my ducts cleaned" hits a Ductwork Installation keyword, but names
+            # neither the service nor its kind of work
+            named = {ACTIONS.get(token, token) for token in best["name"]} <= {ACTIONS.get(token, token) for token in tokens}
+            actions = {ACTIONS[token] for token in clause_tokens if token in ACTIONS}
+            if not named or actions - best["actions"]:
+                unconfirmed.append(best["service_name"])
+
+            quantity = self._quantity(tokens, text, clause_texts[clause], clause_start, start, best["unit"])
+            items.append((start, {"service_requested": best["service_name"], "quantity": quantity}))
+            words = sorted({best["positions"][position] for position in claimed})
+            reasoning.append(
+                f"Matched {best['service_name']} from the words: {', '.join(words)}"
+                + (f" (close to {rivals[0]['service_name']})" if ambiguous else "")
+            )
+
+            consumed.update(claimed)
+            matches = [m for m in matches if m is not best]
+
+        if not items:
+            return {
+                "customer_name": self._customer_name(text, lines),
+                "confidence_score": 0,
+                "ai_reasoning": ["No catalog service matched"],
+                "extracted_items": []
+            }
+
+        confidence = min(confidences)
+        if len(items) > 1 or negated:
+            confidence = min(confidence, self.CAUTIOUS_CONFIDENCE)
+            reasoning.append("Several services or negated wording; needs a closer read")
+        if unconfirmed:
+            confidence = min(confidence, self.CAUTIOUS_CONFIDENCE)
+            reasoning.append(f"Service name or kind of work not stated for: {', '.join(unconfirmed)}")
+        if NON_REQUEST.search(text):
+            confidence = min(confidence, self.CAUTIOUS_CONFIDENCE)
+            reasoning.append("Mentions cancelling, billing or past work; may not be a quote request")
+        if len(tokens) > self.LONG_EMAIL_WORDS:
+            confidence -= 15
+            reasoning.append("Long email; may contain details the rules missed")
+        if UNCERTAINTY.search(text):
+            confidence -= 20
+            reasoning.append("Customer seems unsure what they need")
+
+        return {
+            "customer_name": self._customer_name(text, lines),
+            "confidence_score": int(max(confidence, 0)),
+            "ai_reasoning": reasoning,
+            # In the order the customer mentioned them
+            "extracted_items": [item for _, item in sorted(items, key=lambda pair: pair[0])]
+        }
@@ -0,0 +1,88 @@
+"""
+JSON Stream
+Incremental scanner that pulls complete elements out of a JSON array while
+the rest of the document is still being generated.
+"""
+
+import json
+from typing import Any, List, Optional
+
+
+class ArrayItemStream:
+    """
+    Yields the elements of one top-level array (e.g. `"items": [...]`) of a
+    JSON object as soon as each element's closing bracket arrives.
+
+    Feed it text in arbitrary pieces; it only tracks nesting, strings and
+    escapes, so each character is looked at once.
+    """
+
+    def __init__(self, key: str = "items"):
+        """
+        Initialize the scanner.
+
+        Args:
+            key: Top-level key of the array whose elements are wanted
+        """
+        self.key = key
+        self.reset()
+
+    def reset(self) -> None:
+        """Forget everything seen so far (e.g. when a failed stream is retried)."""
+        self._buffer = ""
+        self._position = 0
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escaped = False
+        self._string_start = 0
+        self._last_key: Optional[str] = None
+        self._in_array = False
+        self._element_start: Optional[int] = None
+
+    def feed(self, text: str) -> List[Any]:
+        """
+        Scan another piece of the document.
+
+        Args:
+            text: Next chunk of the JSON text
+
+        Returns:
+            Elements of the array completed by this chunk, in order
+        """
+        self._buffer += text
+        completed = []
+        buffer = self._buffer
+        for index in range(self._position, len(buffer)):
+            char = buffer[index]
+            if self._in_string:
+                if self._escaped:
+                    self._escaped = False
+                elif char == "\\":
+                    self._escaped = True
+                elif char == '"':
+                    self._in_string = False
+                    if len(self._stack) == 1:
+                        # A key or string value of the top-level object
+                        self._last_key = json.loads(buffer[self._string_start:index + 1])
+                continue
+
+            if char == '"':
+                self._in_string = True
+                self._string_start = index
+            elif char in "{[":
+                if char == "[" and self._stack == ["{"] and self._last_key == self.key:
+                    self._in_array = True
+                elif self._in_array and len(self._stack) == 2:
+                    self._element_start = index
+                self._stack.append(char)
+            elif char in "}]":
+                if self._stack:
+                    self._stack.pop()
+                if self._in_array and len(self._stack) == 2 and self._element_start is not None:
+                    completed.append(json.loads(buffer[self._element_start:index + 1]))
+                    self._element_start = None
+                elif self._in_array and len(self._stack) == 1:
+                    self._in_array = False
+                    self._last_key = None
+        self._position = len(buffer)
+        return completed
@@ -0,0 +1,101 @@
+"""
+Lazy Service
+Thread-safe, lazily constructed service singletons with optional background warm-up.
+"""
+
+import threading
+import time
+from typing import Any, Callable, Dict, Optional
+
+from services.log_service import get_logger
+
+logger = get_logger("lazy")
+
+
+class LazyService:
+    """
+    Builds a service on first use instead of at import time.
+
+    Concurrent first callers share one construction. A failed construction is
+    remembered and retried after `retry_seconds`, so a missing credential
+    doesn't cause the expensive setup to rerun on every request.
+    """
+
+    def __init__(self, name: str, factory: Callable[[], Any], retry_seconds: float = 30.0):
+        """
+        Initialize the lazy service.
+
+        Args:
+            name: Name shown in readiness output and logs
+            factory: Zero-argument callable that builds the service
+            retry_seconds: Minimum delay before retrying a failed construction
+        """
+        self.name = name
+        self.factory = factory
+        self.retry_seconds = retry_seconds
+        self._instance = None
+        self._lock = threading.Lock()
+        self._state = "idle"
+        self._error: Optional[str] = None
+        self._failed_at = 0.0
+        self._load_seconds: Optional[float] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._instance is not None
+
+    def get(self) -> Optional[Any]:
+        """
+        Return the service, building it on first use.
+
+        Returns:
+            The service instance, or None if construction failed
+        """
+        if self._instance is not None:
+            return self._instance
+
+        with self._lock:
+            if self._instance is not None:
+                return self._instance
+            if self._state == "failed" and time.monotonic() - self._failed_at < self.retry_seconds:
+                return None
+
+            self._state = "loading"
+            started = time.perf_counter()
+            try:
+                instance = self.factory()
+            # VelocityLogicAgent calls sys.exit on fatal init errors
+            except (Exception, SystemExit) as e:
+                self._state = "failed"
+                self._error = str(e) or type(e).__name__
+                self._failed_at = time.monotonic()
+                logger.error("Failed to initialize %s: %s", self.name, self._error)
+                return None
+
+            self._load_seconds = time.perf_counter() - started
+            self._instance = instance
+            self._state = "ready"
+            self._error = None
+            logger.info("%s initialized in %.2fs", self.name, self._load_seconds)
+            return instance
+
+    def set(self, instance: Any) -> None:
+        """Install a pre-built instance (e.g. a test or harness double)."""
+        with self._lock:
+            self._instance = instance
+            self._state = "ready"
+            self._error = None
+
+    def warm_up(self) -> threading.Thread:
+        """Build the service on a background thread."""
+        thread = threading.Thread(target=self.get, name=f"warmup-{self.name}", daemon=True)
+        thread.start()
+        return thread
+
+    def status(self) -> Dict[str, Any]:
+        """Readiness details for this service."""
+        return {
+            "state": self._state,
+            "error": self._error,
+            "load_seconds": round(self._load_seconds, 3) if self._load_seconds is not None else None
+        }
@@ -0,0 +1,222 @@
+"""
+Ledger Service
+Durable record of processed Gmail messages and inbox leases for the agent loop.
+"""
+
+import os
+import socket
+import sqlite3
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any
+
+
+class MessageLedger:
+    """SQLite-backed ledger of message id -> outcome, plus per-message leases."""
+
+    # Outcomes that mean the message must never be re-processed
+    TERMINAL_OUTCOMES = ("QUOTED", "SKIPPED")
+
+    def __init__(
+        self,
+        db_path: str = "data/ledger.db",
+        owner_id: Optional[str] = None,
+        lease_seconds: int = 300,
+        max_attempts: int = 3
+    ):
+        """
+        Initialize the ledger.
+
+        Args:
+            db_path: Path to the SQLite database file
+            owner_id: Identifier of this agent instance (defaults to host-pid)
+            lease_seconds: How long a lease is held before other instances may take over
+            max_attempts: Failed attempts after which a message is given up on
+        """
+        self.db_path = db_path
+        self.owner_id = owner_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.lease_seconds = lease_seconds
+        self.max_attempts = max_attempts
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._init_schema()
+
+    @contextmanager
+    def _connect(self):
+        """Open a short-lived connection; safe to use from any thread or process."""
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_schema(self) -> None:
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS processed_messages (
+                    message_id TEXT PRIMARY KEY,
+                    outcome TEXT NOT NULL,
+                    quote_number TEXT,
+                    error TEXT,
+                    attempts INTEGER NOT NULL DEFAULT 0,
+                    updated_at REAL NOT NULL
+                )
+            """)
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS leases (
+                    message_id TEXT PRIMARY KEY,
+                    owner_id TEXT NOT NULL,
+                    expires_at REAL NOT NULL
+                )
+            """)
+
+    def get(self, message_id: str) -> Optional[Dict[str, Any]]:
+        """Return the ledger entry for a message, or None if never seen."""
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT outcome, quote_number, error, attempts, updated_at "
+                "FROM processed_messages WHERE message_id = ?",
+                (message_id,)
+            ).fetchone()
+        if row is None:
+            return None
+        return {
+            "message_id": message_id,
+            "outcome": row[0],
+            "quote_number": row[1],
+            "error": row[2],
+            "attempts": row[3],
+            "updated_at": row[4]
+        }
+
+    def should_process(self, message_id: str) -> bool:
+        """
+        Check whether a message still needs work.
+
+        Returns False for messages with a terminal outcome, or that have
+        failed `max_attempts` times already.
+        """
+        entry = self.get(message_id)
+        if entry is None:
+            return True
+        if entry["outcome"] in self.TERMINAL_OUTCOMES:
+            return False
+        return entry["attempts"] < self.max_attempts
+
+    def record(
+        self,
+        message_id: str,
+        outcome: str,
+        quote_number: Optional[str] = None,
+        error: Optional[str] = None
+    ) -> None:
+        """
+        Record the outcome of processing a message.
+
+        Args:
+            message_id: Gmail message ID
+            outcome: QUOTED, FAILED or SKIPPED
+            quote_number: Quote number produced for the message, if any
+            error: Error text for failed attempts
+        """
+        with self._connect() as conn:
+            conn.execute("""
+                INSERT INTO processed_messages (message_id, outcome, quote_number, error, attempts, updated_at)
+                VALUES (?, ?, ?, ?, 1, ?)
+                ON CONFLICT(message_id) DO UPDATE SET
+                    outcome = excluded.outcome,
+                    quote_number = COALESCE(excluded.quote_number, processed_messages.quote_number),
+                    error = excluded.error,
+                    attempts = processed_messages.attempts + 1,
+                    updated_at = excluded.updated_at
+            """, (message_id, outcome, quote_number, error, time.time()))
+
+    def acquire_lease(self, message_id: str) -> bool:
+        """
+        Try to take an exclusive lease on a message.
+
+        A lease is granted if nobody holds one, the current one has expired,
+        or this instance already holds it, and only while the message still
+        needs work (see should_process). Both checks run in one statement, so
+        a message another instance finished since should_process was called
+        is never leased again.
+
+        Returns:
+            True if this instance now owns the message
+        """
+        now = time.time()
+        terminal = ", ".join("?" for _ in self.TERMINAL_OUTCOMES)
+        with self._connect() as conn:
+            cursor = conn.execute(f"""
+                INSERT INTO leases (message_id, owner_id, expires_at)
+                SELECT ?, ?, ?
+                WHERE NOT EXISTS (
+                    SELECT 1 FROM processed_messages
+                    WHERE message_id = ? AND (outcome IN ({terminal}) OR attempts >= ?)
+                )
+                ON CONFLICT(message_id) DO UPDATE SET
+                    owner_id = excluded.owner_id,
+                    expires_at = excluded.expires_at
+                WHERE leases.expires_at < ? OR leases.owner_id = excluded.owner_id
+            """, (message_id, self.owner_id, now + self.lease_seconds,
+                  message_id, *self.TERMINAL_OUTCOMES, self.max_attempts, now))
+            return cursor.rowcount == 1
+
+    def renew_lease(self, message_id: str) -> bool:
+        """
+        Extend a lease held by this instance by another `lease_seconds`.
+
+        Returns:
+            False if the lease expired and another instance has taken it over
+        """
+        with self._connect() as conn:
+            cursor = conn.execute(
+                "UPDATE leases SET expires_at = ? WHERE message_id = ? AND owner_id = ?",
+                (time.time() + self.lease_seconds, message_id, self.owner_id)
+            )
+            return cursor.rowcount == 1
+
+    def release_lease(self, message_id: str) -> None:
+        """Release a lease held by this instance."""
+        with self._connect() as conn:
+            conn.execute(
+                "DELETE FROM leases WHERE message_id = ? AND owner_id = ?",
+                (message_id, self.owner_id)
+            )
+
+    def compact(self, max_age_days: int = 30) -> int:
+        """
+        Trim old ledger entries and drop expired leases, then reclaim disk space.
+
+        Entries that stop a message from being processed again (terminal
+        outcomes and exhausted retries) are kept as tombstones of message ID,
+        outcome and attempts, since the message may still be unread and listed
+        on the next sync. Only their details are cleared. Old entries that
+        would be retried anyway are removed.
+
+        Args:
+            max_age_days: Entries not updated for this long are compacted
+
+        Returns:
+            Number of ledger entries removed
+        """
+        now = time.time()
+        cutoff = now - max_age_days * 86400
+        terminal = ", ".join("?" for _ in self.TERMINAL_OUTCOMES)
+        with self._connect() as conn:
+            removed = conn.execute(
+                f"DELETE FROM processed_messages WHERE updated_at < ? "
+                f"AND outcome NOT IN ({terminal}) AND attempts < ?",
+                (cutoff, *self.TERMINAL_OUTCOMES, self.max_attempts)
+            ).rowcount
+            conn.execute(
+                "UPDATE processed_messages SET quote_number = NULL, error = NULL "
+                "WHERE updated_at < ? AND (quote_number IS NOT NULL OR error IS NOT NULL)",
+                (cutoff,)
+            )
+            conn.execute("DELETE FROM leases WHERE expires_at < ?", (now,))
+            conn.execute("VACUUM")
+        return removed
@@ -0,0 +1,279 @@
+"""
+LLM Batch
+Submits many chat completions as OpenAI Batch jobs (JSONL in, JSONL out) and
+polls them to completion, for backlogs where throughput matters more than latency.
+"""
+
+import hashlib
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from typing import Optional, Dict, Any, List, Callable
+
+from openai import OpenAI
+
+from services.llm_client import LLMUnavailableError, _is_retryable, _retry_after
+from services.metrics import external_call
+from services.log_service import get_logger
+
+logger = get_logger("llm.batch")
+
+
+# Batch statuses after which nothing more will happen
+TERMINAL_STATUSES = {"completed", "failed", "expired", "cancelled"}
+
+# Submitted batches older than this aren't resumed (OpenAI keeps their files for 30 days)
+RESUME_MAX_AGE = 7 * 86400
+
+
+class LLMBatchClient:
+    """
+    Runs chat completion requests through the OpenAI Batch API.
+
+    Requests are written as JSONL, split into as many batch jobs as the
+    per-job request and size limits need, submitted together and polled until
+    every job finishes. Each response is matched to its request by
+    `custom_id`. Batch jobs don't count against the interactive rate limits
+    and cost half as much, but they can take up to the completion window.
+
+    Every API call is retried on transient errors with the same full-jitter
+    backoff as AsyncLLMClient. With a `state_path`, the IDs of submitted jobs
+    are saved until their results are collected, so if polling fails for
+    good, running the same requests again picks up the existing jobs instead
+    of paying for new ones.
+    """
+
+    ENDPOINT = "/v1/chat/completions"
+
+    def __init__(
+        self,
+        client=None,
+        poll_interval: float = 30.0,
+        max_requests: int = 50000,
+        max_bytes: int = 190 * 1024 * 1024,
+        completion_window: str = "24h",
+        timeout: Optional[float] = None,
+        state_path: Optional[str] = None,
+        max_retries: int = 5,
+        base_delay: float = 1.0,
+        max_delay: float = 60.0
+    ):
+        """
+        Initialize the batch client.
+
+        Args:
+            client: OpenAI-compatible client with `files` and `batches` (defaults to OpenAI from OPENAI_API_KEY)
+            poll_interval: Seconds between status checks
+            max_requests: Requests per batch job (the API allows 50,000)
+            max_bytes: Input file size per batch job (the API allows 200 MB)
+            completion_window: Time the API has to finish a job
+            timeout: Seconds to wait before cancelling unfinished jobs (None waits for the completion window)
+            state_path: JSON file recording submitted jobs so an interrupted run can resume them
+            max_retries: Retries of each API call after the first attempt
+            base_delay: First backoff ceiling in seconds
+            max_delay: Largest backoff ceiling in seconds
+        """
+        self.client = client or OpenAI(api_key=os.getenv("OPENAI_API_KEY"))
+        self.poll_interval = poll_interval
+        self.max_requests = max_requests
+        self.max_bytes = max_bytes
+        self.completion_window = completion_window
+        self.timeout = timeout
+        self.state_path = state_path
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self._state_lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, client=None) -> "LLMBatchClient":
+        """
+        Build a client from OPENAI_BATCH_POLL_SECONDS, OPENAI_BATCH_MAX_REQUESTS,
+        OPENAI_BATCH_TIMEOUT_HOURS and OPENAI_BATCH_STATE_PATH.
+        """
+        timeout_hours = os.getenv("OPENAI_BATCH_TIMEOUT_HOURS")
+        return cls(
+            client=client,
+            poll_interval=float(os.getenv("OPENAI_BATCH_POLL_SECONDS", "30")),
+            max_requests=int(os.getenv("OPENAI_BATCH_MAX_REQUESTS", "50000")),
+            timeout=float(timeout_hours) * 3600 if timeout_hours else None,
+            state_path=os.getenv("OPENAI_BATCH_STATE_PATH", "data/llm_batches.json")
+        )
+
+    def _call(self, operation: str, call: Callable[[], Any]) -> Any:
+        """Run one API call, retrying transient failures with full-jitter backoff."""
+        attempt = 0
+        while True:
+            try:
+                with external_call("openai", operation):
+                    return call()
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    raise LLMUnavailableError(f"OpenAI {operation} failed: {e}", retry_after=_retry_after(e)) from e
+                # Full jitter, but never sooner than the server asked
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                delay = max(delay, _retry_after(e) or 0.0)
+                attempt += 1
+                logger.warning("OpenAI %s failed (%s); retry %d in %.1fs", operation, e, attempt, delay)
+                time.sleep(delay)
+
+    @staticmethod
+    def _run_key(requests: Dict[str, Dict[str, Any]]) -> str:
+        """Identifies a set of requests, so running it again finds its earlier jobs."""
+        return hashlib.sha256(json.dumps(requests, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+
+    def _load_state(self) -> Dict[str, Dict[str, Any]]:
+        try:
+            with open(self.state_path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring batch state file %s: %s", self.state_path, e)
+            return {}
+
+    def _update_state(self, run_key: str, batch_ids: Optional[Dict[int, str]]) -> None:
+        """Save (or with None, drop) the job IDs of a run, keyed by chunk index."""
+        if not self.state_path:
+            return
+        with self._state_lock:
+            state = self._load_state()
+            if batch_ids is None:
+                if state.pop(run_key, None) is None:
+                    return
+            else:
+                state[run_key] = {
+                    "batch_ids": {str(index): batch_id for index, batch_id in batch_ids.items()},
+                    "submitted_at": state.get(run_key, {}).get("submitted_at", time.time())
+                }
+            directory = os.path.dirname(os.path.abspath(self.state_path))
+            os.makedirs(directory, exist_ok=True)
+            fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+            with os.fdopen(fd, "w") as f:
+                json.dump(state, f)
+            os.replace(temp_path, self.state_path)
+
+    def _resumable(self, run_key: str) -> Dict[int, str]:
+        """Job IDs by chunk index, saved by an earlier, interrupted run of the same requests."""
+        if not self.state_path:
+            return {}
+        with self._state_lock:
+            entry = self._load_state().get(run_key)
+        if not entry or time.time() - entry.get("submitted_at", 0) > RESUME_MAX_AGE:
+            return {}
+        batch_ids = entry["batch_ids"]
+        if isinstance(batch_ids, list):
+            # Older state files list the IDs in chunk order
+            return dict(enumerate(batch_ids))
+        return {int(index): batch_id for index, batch_id in batch_ids.items()}
+
+    def _chunks(self, requests: Dict[str, Dict[str, Any]]) -> List[List[str]]:
+        """Split requests into JSONL files within the per-job limits."""
+        chunks, lines, size = [], [], 0
+        for custom_id, body in requests.items():
+            line = json.dumps({"custom_id": custom_id, "method": "POST", "url": self.ENDPOINT, "body": body})
+            line_size = len(line.encode("utf-8")) + 1
+            if lines and (len(lines) >= self.max_requests or size + line_size > self.max_bytes):
+                chunks.append(lines)
+                lines, size = [], 0
+            lines.append(line)
+            size += line_size
+        if lines:
+            chunks.append(lines)
+        return chunks
+
+    def _submit(self, lines: List[str], index: int) -> Any:
+        content = ("\n".join(lines) + "\n").encode("utf-8")
+        input_file = self._call("files.create", lambda: self.client.files.create(
+            file=(f"velocity-batch-{index}.jsonl", content), purpose="batch"
+        ))
+        batch = self._call("batches.create", lambda: self.client.batches.create(
+            input_file_id=input_file.id,
+            endpoint=self.ENDPOINT,
+            completion_window=self.completion_window,
+            metadata={"source": "velocity-logic"}
+        ))
+        logger.info("Submitted batch %s with %d request(s)", batch.id, len(lines))
+        return batch
+
+    def _download(self, file_id: Optional[str]) -> List[Dict[str, Any]]:
+        if not file_id:
+            return []
+        text = self._call("files.content", lambda: self.client.files.content(file_id).text)
+        return [json.loads(line) for line in text.splitlines() if line.strip()]
+
+    def run(self, requests: Dict[str, Dict[str, Any]]) -> Dict[str, Dict[str, Any]]:
+        """
+        Run chat completion requests as batch jobs and wait for them.
+
+        Args:
+            requests: chat.completions.create arguments keyed by a unique custom ID
+
+        Returns:
+            For every custom ID, either {"body": chat completion response} or
+            {"error": message}. Requests of failed, expired or cancelled jobs
+            without an answer come back as errors.
+
+        Raises:
+            LLMUnavailableError: An API call kept failing; the submitted jobs are
+                resumed when the same requests are run again
+        """
+        if not requests:
+            return {}
+
+        run_key = self._run_key(requests)
+        chunks = self._chunks(requests)
+        # Chunks submitted by an earlier run are polled again; the rest are submitted now
+        batch_ids = self._resumable(run_key)
+        if batch_ids:
+            logger.info("Resuming %d of %d batch(es) from an earlier run", len(batch_ids), len(chunks))
+        pending = [self._call("batches.retrieve", lambda batch_id=batch_id: self.client.batches.retrieve(batch_id))
+                   for _, batch_id in sorted(batch_ids.items())]
+        for index, lines in enumerate(chunks):
+            if index in batch_ids:
+                continue
+            batch = self._submit(lines, index)
+            batch_ids[index] = batch.id
+            self._update_state(run_key, batch_ids)
+            pending.append(batch)
+        finished = []
+        started = time.monotonic()
+        cancelled = False
+        while pending:
+            time.sleep(self.poll_interval)
+            still_pending = []
+            for batch in pending:
+                batch = self._call("batches.retrieve", lambda batch_id=batch.id: self.client.batches.retrieve(batch_id))
+                (finished if batch.status in TERMINAL_STATUSES else still_pending).append(batch)
+            pending = still_pending
+
+            if pending and not cancelled and self.timeout is not None and time.monotonic() - started > self.timeout:
+                # Cancelled jobs still return what they finished; keep polling until they stop
+                for batch in pending:
+                    logger.warning("Cancelling batch %s after %.0fs", batch.id, self.timeout)
+                    self._call("batches.cancel", lambda batch_id=batch.id: self.client.batches.cancel(batch_id))
+                cancelled = True
+
+        results: Dict[str, Dict[str, Any]] = {}
+        for batch in finished:
+            if batch.status != "completed":
+                logger.warning("Batch %s ended as %s", batch.id, batch.status)
+            for record in self._download(batch.output_file_id) + self._download(batch.error_file_id):
+                response = record.get("response") or {}
+                if record.get("error"):
+                    error = record["error"]
+                    results[record["custom_id"]] = {"error": error.get("message") or str(error)}
+                elif response.get("status_code") != 200:
+                    results[record["custom_id"]] = {
+                        "error": f"HTTP {response.get('status_code')}: {json.dumps(response.get('body'))[:200]}"
+                    }
+                else:
+                    results[record["custom_id"]] = {"body": response["body"]}
+
+        for custom_id in requests:
+            results.setdefault(custom_id, {"error": "No result returned by the batch job"})
+        self._update_state(run_key, None)
+        return results
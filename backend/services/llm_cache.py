@@ -0,0 +1,200 @@
+"""
+LLM Cache
+Persistent content-hash cache of parsed email intents.
+"""
+
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+import unicodedata
+from contextlib import contextmanager
+from typing import Optional, Dict, Any
+
+from services.metrics import record_cache
+from services.log_service import get_logger
+
+logger = get_logger("llm.cache")
+
+
+def normalize_email_body(email_body: str) -> str:
+    """
+    Normalize an email body so trivially different copies hash the same.
+
+    Unicode is NFKC-normalized, line endings are unified and runs of
+    whitespace are collapsed. Case is kept because it carries the customer's name.
+    """
+    text = unicodedata.normalize("NFKC", email_body or "")
+    lines = (re.sub(r"\s+", " ", line).strip() for line in text.replace("\r\n", "\n").split("\n"))
+    return "\n".join(line for line in lines if line)
+
+
+class LLMCache:
+    """
+    SQLite-backed cache of LLM parse results.
+
+    Entries are keyed on a hash of the normalized email body, the model and
+    the prompt version, so changing either the model or the prompt misses
+    the old entries. Entries expire after `ttl_seconds`. Once the cache grows past
+    `max_entries`, the least recently used entries are evicted.
+    """
+
+    # How often (in writes) to run eviction
+    EVICT_EVERY = 100
+
+    def __init__(self, db_path: str = "data/llm_cache.db", ttl_seconds: float = 30 * 86400, max_entries: int = 5000):
+        """
+        Initialize the cache.
+
+        Args:
+            db_path: Path to the SQLite database file
+            ttl_seconds: Age after which an entry is treated as missing
+            max_entries: Entries kept after eviction
+        """
+        self.db_path = db_path
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._writes = 0
+
+        db_dir = os.path.dirname(db_path)
+        if db_dir:
+            os.makedirs(db_dir, exist_ok=True)
+        self._init_schema()
+
+    @classmethod
+    def from_env(cls) -> Optional["LLMCache"]:
+        """
+        Build a cache from LLM_CACHE_PATH, LLM_CACHE_TTL_DAYS and LLM_CACHE_MAX_ENTRIES.
+
+        Returns None when LLM_CACHE_ENABLED=false.
+        """
+        if os.getenv("LLM_CACHE_ENABLED", "true").lower() == "false":
+            return None
+        return cls(
+            db_path=os.getenv("LLM_CACHE_PATH", "data/llm_cache.db"),
+            ttl_seconds=float(os.getenv("LLM_CACHE_TTL_DAYS", "30")) * 86400,
+            max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "5000"))
+        )
+
+    @contextmanager
+    def _connect(self):
+        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        try:
+            yield conn
+        finally:
+            conn.close()
+
+    def _init_schema(self) -> None:
+        with self._connect() as conn:
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS llm_cache (
+                    cache_key TEXT PRIMARY KEY,
+                    model TEXT NOT NULL,
+                    prompt_version TEXT NOT NULL,
+                    result TEXT NOT NULL,
+                    created_at REAL NOT NULL,
+                    last_used_at REAL NOT NULL,
+                    hits INTEGER NOT NULL DEFAULT 0
+                )
+            """)
+            conn.execute("CREATE INDEX IF NOT EXISTS idx_llm_cache_last_used ON llm_cache (last_used_at)")
+
+    @staticmethod
+    def make_key(email_body: str, model: str, prompt_version: str) -> str:
+        """Hash the normalized body, model and prompt version into a cache key."""
+        material = "\0".join((model, prompt_version, normalize_email_body(email_body)))
+        return hashlib.sha256(material.encode("utf-8")).hexdigest()
+
+    def get(self, email_body: str, model: str, prompt_version: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up a cached parse result.
+
+        Returns:
+            The cached result, or None on a miss or an expired entry
+        """
+        key = self.make_key(email_body, model, prompt_version)
+        now = time.time()
+        try:
+            row = self._lookup(key, now)
+        except sqlite3.Error as e:
+            logger.warning("LLM cache read failed: %s", e)
+            row = None
+
+        record_cache("llm", hit=row is not None)
+        return json.loads(row[0]) if row else None
+
+    def _lookup(self, key: str, now: float) -> Optional[tuple]:
+        with self._connect() as conn:
+            row = conn.execute(
+                "SELECT result, created_at FROM llm_cache WHERE cache_key = ?", (key,)
+            ).fetchone()
+            if row and now - row[1] > self.ttl_seconds:
+                conn.execute("DELETE FROM llm_cache WHERE cache_key = ?", (key,))
+                row = None
+            if row:
+                conn.execute(
+                    "UPDATE llm_cache SET last_used_at = ?, hits = hits + 1 WHERE cache_key = ?",
+                    (now, key)
+                )
+        return row
+
+    def put(self, email_body: str, model: str, prompt_version: str, result: Dict[str, Any]) -> None:
+        """Store a parse result, evicting old entries now and then."""
+        key = self.make_key(email_body, model, prompt_version)
+        now = time.time()
+        try:
+            self._store(key, model, prompt_version, json.dumps(result), now)
+        except sqlite3.Error as e:
+            logger.warning("LLM cache write failed: %s", e)
+            return
+
+        self._writes += 1
+        if self._writes % self.EVICT_EVERY == 0:
+            try:
+                self.evict()
+            except sqlite3.Error as e:
+                logger.warning("LLM cache eviction failed: %s", e)
+
+    def _store(self, key: str, model: str, prompt_version: str, result: str, now: float) -> None:
+        with self._connect() as conn:
+            conn.execute(
+                """
+                INSERT INTO llm_cache (cache_key, model, prompt_version, result, created_at, last_used_at)
+                VALUES (?, ?, ?, ?, ?, ?)
+                ON CONFLICT(cache_key) DO UPDATE SET
+                    result = excluded.result,
+                    created_at = excluded.created_at,
+                    last_used_at = excluded.last_used_at
+                """,
+                (key, model, prompt_version, result, now, now)
+            )
+
+    def evict(self) -> int:
+        """
+        Drop expired entries, then the least recently used beyond max_entries.
+
+        Returns:
+            Number of entries removed
+        """
+        with self._connect() as conn:
+            removed = conn.execute(
+                "DELETE FROM llm_cache WHERE created_at < ?", (time.time() - self.ttl_seconds,)
+            ).rowcount
+            removed += conn.execute(
+                """
+                DELETE FROM llm_cache WHERE cache_key IN (
+                    SELECT cache_key FROM llm_cache ORDER BY last_used_at DESC LIMIT -1 OFFSET ?
+                )
+                """,
+                (self.max_entries,)
+            ).rowcount
+        return removed
+
+    def stats(self) -> Dict[str, Any]:
+        """Entry count and lifetime hits of the cached entries."""
+        with self._connect() as conn:
+            entries, hits = conn.execute("SELECT COUNT(*), COALESCE(SUM(hits), 0) FROM llm_cache").fetchone()
+        return {"entries": entries, "hits": hits, "max_entries": self.max_entries}
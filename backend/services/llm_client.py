@@ -0,0 +1,302 @@
+"""
+LLM Client
+Shared async OpenAI client with RPM/TPM rate limiting, jittered retries,
+per-call timeouts and an in-flight cap.
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional, Any, Awaitable, Callable
+
+import openai
+from openai import AsyncOpenAI
+
+from services.metrics import external_call
+from services.log_service import get_logger
+
+logger = get_logger("llm")
+
+
+class LLMUnavailableError(Exception):
+    """The LLM could not produce a usable answer (rate limited, timed out, overloaded or malformed)."""
+
+    def __init__(self, message: str, retry_after: Optional[float] = None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+# HTTP statuses worth retrying
+RETRYABLE_STATUS = {408, 409, 429, 500, 502, 503, 504}
+
+
+def _is_retryable(error: BaseException) -> bool:
+    if isinstance(error, (openai.APIConnectionError, openai.APITimeoutError, asyncio.TimeoutError)):
+        return True
+    return getattr(error, "status_code", None) in RETRYABLE_STATUS
+
+
+def _retry_after(error: BaseException) -> Optional[float]:
+    """Seconds the server asked us to wait, if it said."""
+    response = getattr(error, "response", None)
+    headers = getattr(response, "headers", None) or {}
+    for header, scale in (("retry-after-ms", 0.001), ("retry-after", 1.0)):
+        value = headers.get(header)
+        if value:
+            try:
+                return float(value) * scale
+            except ValueError:
+                pass
+    return None
+
+
+class TokenBucket:
+    """Async token bucket refilled continuously at `rate_per_minute`."""
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity or rate_per_minute
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+        self._lock: Optional[asyncio.Lock] = None
+
+    def _refill(self) -> None:
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self, amount: float = 1.0) -> None:
+        """Wait until `amount` tokens are available and take them (FIFO)."""
+        if self._lock is None:
+            self._lock = asyncio.Lock()
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                self._refill()
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+    def adjust(self, delta: float) -> None:
+        """Charge (positive) or refund (negative) tokens after the real cost is known."""
+        self._refill()
+        self.tokens = min(self.capacity, self.tokens - delta)
+
+
+class _LoopThread:
+    """A private event loop on a daemon thread, so sync callers can share async clients."""
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self.thread = threading.Thread(target=self.loop.run_forever, name="llm-event-loop", daemon=True)
+        self.thread.start()
+
+    def submit(self, coroutine) -> Future:
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+
+class AsyncLLMClient:
+    """
+    Rate-limited wrapper around `AsyncOpenAI().chat.completions.create`.
+
+    Requests wait for request-per-minute and token-per-minute budget and for
+    a free in-flight slot. If that takes longer than `queue_timeout`, the
+    request is shed with LLMUnavailableError instead of piling up. Calls that
+    fail with 429, 5xx, connection errors or timeouts are retried with full-jitter
+    exponential backoff, honouring Retry-After; each retry waits for budget again.
+    """
+
+    def __init__(
+        self,
+        client=None,
+        rpm: int = 500,
+        tpm: int = 30000,
+        max_in_flight: int = 16,
+        timeout: float = 30.0,
+        max_retries: int = 4,
+        base_delay: float = 0.5,
+        max_delay: float = 20.0,
+        queue_timeout: float = 60.0
+    ):
+        """
+        Initialize the client.
+
+        Args:
+            client: AsyncOpenAI-compatible client (defaults to AsyncOpenAI from OPENAI_API_KEY)
+            rpm: Requests per minute quota
+            tpm: Tokens per minute quota (prompt + completion)
+            max_in_flight: Maximum concurrent requests
+            timeout: Seconds allowed per attempt
+            max_retries: Retries after the first attempt
+            base_delay: First backoff ceiling in seconds
+            max_delay: Largest backoff ceiling in seconds
+            queue_timeout: Seconds a request may wait for budget and a slot before it is shed
+        """
+        self.client = client or AsyncOpenAI(api_key=os.getenv("OPENAI_API_KEY"), max_retries=0)
+        self.requests = TokenBucket(rpm)
+        self.tokens = TokenBucket(tpm)
+        self.max_in_flight = max_in_flight
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.queue_timeout = queue_timeout
+        self._slots: Optional[asyncio.Semaphore] = None
+        self._runner: Optional[_LoopThread] = None
+        self._runner_lock = threading.Lock()
+        if hasattr(os, "register_at_fork"):
+            os.register_at_fork(after_in_child=self._forget_runner)
+
+    @classmethod
+    def from_env(cls, client=None) -> "AsyncLLMClient":
+        """Build a client from OPENAI_RPM, OPENAI_TPM, OPENAI_MAX_IN_FLIGHT, OPENAI_TIMEOUT and OPENAI_MAX_RETRIES."""
+        return cls(
+            client=client,
+            rpm=int(os.getenv("OPENAI_RPM", "500")),
+            tpm=int(os.getenv("OPENAI_TPM", "30000")),
+            max_in_flight=int(os.getenv("OPENAI_MAX_IN_FLIGHT", "16")),
+            timeout=float(os.getenv("OPENAI_TIMEOUT", "30")),
+            max_retries=int(os.getenv("OPENAI_MAX_RETRIES", "4")),
+            queue_timeout=float(os.getenv("OPENAI_QUEUE_TIMEOUT", "60"))
+        )
+
+    def _forget_runner(self) -> None:
+        # The loop thread doesn't survive fork
+        self._runner = None
+        self._runner_lock = threading.Lock()
+        self._slots = None
+        self.requests._lock = None
+        self.tokens._lock = None
+
+    async def _admit(self, estimated_tokens: int) -> None:
+        if self._slots is None:
+            self._slots = asyncio.Semaphore(self.max_in_flight)
+        await self.requests.acquire(1)
+        await self.tokens.acquire(estimated_tokens)
+        await self._slots.acquire()
+
+    async def _call(self, estimated_tokens: int, operation: str, attempt_call: Callable[[], Awaitable[Any]]) -> Any:
+        """
+        Run attempt_call() with timeouts and retries.
+
+        Every attempt, retries included, is admitted through the RPM and TPM
+        buckets and holds an in-flight slot only while it runs, so a burst of
+        429s or 5xx errors is retried within the limits rather than around them.
+        """
+        attempt = 0
+        while True:
+            try:
+                await asyncio.wait_for(self._admit(estimated_tokens), self.queue_timeout)
+            except asyncio.TimeoutError:
+                raise LLMUnavailableError("LLM request queue is full", retry_after=self.queue_timeout) from None
+
+            try:
+                with external_call("openai", operation):
+                    return await asyncio.wait_for(attempt_call(), self.timeout)
+            except Exception as e:
+                if not _is_retryable(e) or attempt >= self.max_retries:
+                    raise LLMUnavailableError(f"OpenAI request failed: {e}", retry_after=_retry_after(e)) from e
+                # Full jitter, but never sooner than the server asked
+                delay = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                delay = max(delay, _retry_after(e) or 0.0)
+                attempt += 1
+                logger.warning("OpenAI call failed (%s); retry %d in %.1fs", e, attempt, delay)
+            finally:
+                self._slots.release()
+            await asyncio.sleep(delay)
+
+    def _charge(self, usage: Any, estimated_tokens: int) -> None:
+        # Settle the up-front TPM estimate against what the call really used
+        if usage is not None:
+            actual = (usage.prompt_tokens or 0) + (usage.completion_tokens or 0)
+            self.tokens.adjust(actual - estimated_tokens)
+
+    async def create(self, estimated_tokens: int = 1000, **request) -> Any:
+        """
+        Call chat.completions.create within the rate limits.
+
+        Args:
+            estimated_tokens: Expected prompt + completion tokens, charged against TPM up front
+            **request: Arguments for chat.completions.create
+
+        Returns:
+            The completion response
+
+        Raises:
+            LLMUnavailableError: Budget wait exceeded queue_timeout, or retries ran out
+        """
+        async def attempt_call():
+            response = await self.client.chat.completions.create(**request)
+            self._charge(getattr(response, "usage", None), estimated_tokens)
+            return response
+
+        return await self._call(estimated_tokens, "chat.completions", attempt_call)
+
+    async def stream(self, estimated_tokens: int = 1000, on_text: Optional[Callable[[Optional[str]], None]] = None, **request) -> str:
+        """
+        Streaming version of create(), within the same rate limits.
+
+        Args:
+            estimated_tokens: Expected prompt + completion tokens, charged against TPM up front
+            on_text: Called on the event loop with each piece of the completion as it
+                arrives, and with None when a failed attempt is retried from the start
+            **request: Arguments for chat.completions.create
+
+        Returns:
+            The full completion text
+
+        Raises:
+            LLMUnavailableError: Budget wait exceeded queue_timeout, or retries ran out
+        """
+        attempts = 0
+
+        async def attempt_call():
+            nonlocal attempts
+            if attempts and on_text is not None:
+                on_text(None)
+            attempts += 1
+            parts = []
+            stream = await self.client.chat.completions.create(
+                stream=True, stream_options={"include_usage": True}, **request
+            )
+            async for chunk in stream:
+                self._charge(getattr(chunk, "usage", None), estimated_tokens)
+                for choice in chunk.choices or []:
+                    text = choice.delta.content
+                    if text:
+                        parts.append(text)
+                        if on_text is not None:
+                            on_text(text)
+            return "".join(parts)
+
+        return await self._call(estimated_tokens, "chat.completions.stream", attempt_call)
+
+    def submit(self, coroutine) -> Future:
+        """Schedule a coroutine on the shared event loop from a thread, without waiting."""
+        if self._runner is None:
+            with self._runner_lock:
+                if self._runner is None:
+                    self._runner = _LoopThread()
+        return self._runner.submit(coroutine)
+
+    def create_sync(self, estimated_tokens: int = 1000, **request) -> Any:
+        """Blocking version of create() for threads; runs on the shared event loop."""
+        return self.submit(self.create(estimated_tokens=estimated_tokens, **request)).result()
+
+
+_shared_client: Optional[AsyncLLMClient] = None
+_shared_lock = threading.Lock()
+
+
+def get_llm_client() -> AsyncLLMClient:
+    """The process-wide client, so the agent loop and web requests share one budget."""
+    global _shared_client
+    if _shared_client is None:
+        with _shared_lock:
+            if _shared_client is None:
+                _shared_client = AsyncLLMClient.from_env()
+    return _shared_client
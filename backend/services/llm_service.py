@@ -4,42 +4,25 @@ Handles OpenAI API interactions for parsing email intent.
 """
 
 import os
-from typing import Dict, Any, List
-from openai import OpenAI
+import queue
+import hashlib
+from typing import Dict, Any, List, Optional, Tuple, Callable
 from dotenv import load_dotenv
 import json
+from services.llm_cache import LLMCache
+from services.llm_client import AsyncLLMClient, LLMUnavailableError, get_llm_client
+from services.llm_batch import LLMBatchClient
+from services.service_catalog import ServiceCatalog
+from services.json_stream import ArrayItemStream
+from services.email_preprocessor import estimate_tokens
+from services.log_service import get_logger
 
 # Load environment variables
 load_dotenv()
 
+logger = get_logger("llm")
 
-class LLMService:
-    """Manages OpenAI API interactions for email parsing."""
-    
-    def __init__(self):
-        """Initialize the LLM service with API key from environment."""
-        api_key = os.getenv("OPENAI_API_KEY")
-        
-        if not api_key:
-            raise ValueError(
-                "OPENAI_API_KEY not found in environment variables. "
-                "Please set it in your .env file."
-            )
-        
-        self.client = OpenAI(api_key=api_key)
-        self.model = "gpt-4o"  # Can fallback to gpt-3.5-turbo if needed
-    
-    def parse_email_intent(self, email_body: str) -> Dict[str, Any]:
-        """
-        Parse email body to extract customer intent using OpenAI.
-        
-        Args:
-            email_body: The email body text to parse
-        
-        Returns:
-            Dictionary with customer_name, service_requested, and quantity
-        """
-        system_prompt = """You are the Velocity Logic AI Estimator. Your goal is to convert unstructured emails into structured line-item quotes.
+SYSTEM_PROMPT = """You are the Velocity Logic AI Estimator. Your goal is to convert unstructured emails into structured line-item quotes.
 
 CRITICAL RULES:
 1. EXPLANATION: Provide self-contained, plain-language reasoning for EVERY line item. 
@@ -48,6 +31,7 @@ CRITICAL RULES:
 2. TEMPLATES: If you detect a common job type (e.g., 'Full HVAC Install', 'Standard Maintenance'), suggest a match in your reasoning.
 3. CURRENCY: All prices in CAD.
 4. WINTER: Identify if the job involves frozen ground or sub-zero conditions (-40C).
+5. CATALOG: If the message includes a catalog shortlist (lines of "service_id | name | unit | keywords"), set service_id to the ID of the entry that fits each requested service and use that entry's name as service_requested. If nothing on the shortlist fits, set service_id to null and describe the service in service_requested.
 
 Return a JSON object with the following structure:
 {
@@ -58,6 +42,7 @@ Return a JSON object with the following structure:
     "template_hint": "Name of likely template (if any)",
     "items": [
         {
+            "service_id": "ID from the catalog shortlist, or null",
             "service_requested": "The specific service",
             "quantity": 1
         }
@@ -68,60 +53,220 @@ Be specific with service names. If an email is vague, assign a low confidence sc
 
 Always return valid JSON only, no additional text."""
 
-        try:
-            response = self.client.chat.completions.create(
-                model=self.model,
-                messages=[
-                    {"role": "system", "content": system_prompt},
-                    {"role": "user", "content": f"Parse this email:\n\n{email_body}"}
-                ],
-                temperature=0.3,
-                response_format={"type": "json_object"}
+# Changes whenever the prompt does, so cached results from older prompts miss
+PROMPT_VERSION = hashlib.sha256(SYSTEM_PROMPT.encode("utf-8")).hexdigest()[:12]
+
+# Upper bound on completion length; also charged against the TPM budget
+MAX_COMPLETION_TOKENS = 1000
+
+# Marks the end of a streamed completion on the item queue
+_STREAM_DONE = object()
+
+
+class LLMService:
+    """Manages OpenAI API interactions for email parsing."""
+    
+    def __init__(self, cache: Optional[LLMCache] = None, llm_client: Optional[AsyncLLMClient] = None, batch_client: Optional[LLMBatchClient] = None, catalog: Optional[ServiceCatalog] = None):
+        """
+        Initialize the LLM service with API key from environment.
+        
+        Args:
+            cache: Cache of parse results (defaults to LLMCache.from_env())
+            llm_client: Rate-limited client (defaults to the process-wide get_llm_client())
+            batch_client: Batch API client for backlogs (defaults to LLMBatchClient.from_env() on first use)
+            catalog: Pricing catalog whose shortlists are added to prompts, so the model answers with service IDs
+        """
+        api_key = os.getenv("OPENAI_API_KEY")
+        
+        if not api_key:
+            raise ValueError(
+                "OPENAI_API_KEY not found in environment variables. "
+                "Please set it in your .env file."
             )
-            
-            content = response.choices[0].message.content
+        
+        self.llm_client = llm_client or get_llm_client()
+        self.batch_client = batch_client
+        self.catalog = catalog
+        self.model = "gpt-4o"  # Can fallback to gpt-3.5-turbo if needed
+        
+        self.cache = cache
+        if self.cache is None:
+            try:
+                self.cache = LLMCache.from_env()
+            except Exception as e:
+                logger.warning("LLM cache unavailable, parsing without it: %s", e)
+    
+    def parse_email_intent(self, email_body: str, on_item: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Parse email body to extract customer intent using OpenAI.
+        
+        Blocks the calling thread; the request itself runs on the shared
+        client's event loop, within its rate limits.
+        
+        Args:
+            email_body: The email body text to parse
+            on_item: If given, the completion is streamed and on_item is called on
+                this thread with each items[] element as soon as the model has
+                written it, so work on early items overlaps with generation.
+                After a retried stream an item may be passed again.
+        
+        Returns:
+            Dictionary with customer_name, confidence_score, ai_reasoning and extracted_items
+        
+        Raises:
+            LLMUnavailableError: OpenAI is rate limiting, timing out or returned malformed JSON
+        """
+        cached = self._cached(email_body)
+        if cached is not None:
+            return cached
+        if on_item is not None:
+            return self._handle_content(email_body, self._stream_items(self._build_request(email_body), on_item))
+        response = self.llm_client.create_sync(**self._build_request(email_body))
+        return self._handle_response(email_body, response)
+    
+    def _stream_items(self, request: Dict[str, Any], on_item: Callable[[Dict[str, Any]], None]) -> str:
+        """Stream a completion, handing finished items to on_item; returns the full text."""
+        parser = ArrayItemStream("items")
+        items: "queue.Queue" = queue.Queue()
+        
+        def on_text(text: Optional[str]) -> None:
+            # Runs on the event loop; only scan here, leave the work to the caller's thread
+            if text is None:
+                parser.reset()
+                return
+            for item in parser.feed(text):
+                if isinstance(item, dict):
+                    items.put(item)
+        
+        future = self.llm_client.submit(self.llm_client.stream(on_text=on_text, **request))
+        future.add_done_callback(lambda _: items.put(_STREAM_DONE))
+        while True:
+            item = items.get()
+            if item is _STREAM_DONE:
+                break
+            on_item(item)
+        return future.result()
+    
+    async def parse_email_intent_async(self, email_body: str) -> Dict[str, Any]:
+        """Async version of parse_email_intent for callers already on an event loop."""
+        cached = self._cached(email_body)
+        if cached is not None:
+            return cached
+        response = await self.llm_client.create(**self._build_request(email_body))
+        return self._handle_response(email_body, response)
+    
+    def parse_email_intents_batch(self, emails: Dict[str, str]) -> Tuple[Dict[str, Dict[str, Any]], Dict[str, str]]:
+        """
+        Parse many emails with one OpenAI Batch job instead of a call each.
+        
+        Cached emails are answered immediately and identical bodies are sent
+        once. Blocks until the batch finishes, which can take hours; use it
+        for backlogs and reprocessing, not for live mail.
+        
+        Args:
+            emails: Email bodies keyed by a caller-chosen ID
+        
+        Returns:
+            Tuple of (parse results by ID, error messages by ID for emails
+            that could not be parsed)
+        """
+        results: Dict[str, Dict[str, Any]] = {}
+        # One request per distinct body; every email sharing it gets the answer
+        requests: Dict[str, Dict[str, Any]] = {}
+        waiting: Dict[str, List[str]] = {}
+        for email_id, email_body in emails.items():
+            cached = self._cached(email_body)
+            if cached is not None:
+                results[email_id] = cached
+                continue
+            key = LLMCache.make_key(email_body, self.model, self._prompt_version())
+            if key not in requests:
+                request = self._build_request(email_body)
+                request.pop("estimated_tokens")
+                requests[key] = request
+            waiting.setdefault(key, []).append(email_id)
+        
+        errors: Dict[str, str] = {}
+        if not requests:
+            return results, errors
+        
+        if self.batch_client is None:
+            self.batch_client = LLMBatchClient.from_env()
+        for key, answer in self.batch_client.run(requests).items():
+            email_ids = waiting[key]
+            try:
+                if "error" in answer:
+                    raise LLMUnavailableError(f"Batch request failed: {answer['error']}")
+                parsed = self._handle_content(emails[email_ids[0]], answer["body"]["choices"][0]["message"]["content"])
+            except (LLMUnavailableError, KeyError, IndexError, TypeError) as e:
+                for email_id in email_ids:
+                    errors[email_id] = str(e)
+                continue
+            for email_id in email_ids:
+                results[email_id] = parsed
+        return results, errors
+    
+    def _cached(self, email_body: str) -> Optional[Dict[str, Any]]:
+        # Forwarded duplicates and dashboard reprocessing hit the cache
+        if self.cache is None:
+            return None
+        return self.cache.get(email_body, self.model, self._prompt_version())
+    
+    def _prompt_version(self) -> str:
+        # The shortlist is part of the prompt, so catalog edits miss old results too
+        if self.catalog is None:
+            return PROMPT_VERSION
+        return f"{PROMPT_VERSION}-{self.catalog.version}"
+    
+    def _build_request(self, email_body: str) -> Dict[str, Any]:
+        user_message = f"Parse this email:\n\n{email_body}"
+        shortlist = self.catalog.render_shortlist(email_body) if self.catalog is not None else ""
+        if shortlist:
+            # After the static system prompt, so OpenAI can reuse its cached prefix
+            user_message = f"Catalog shortlist (service_id | name | unit | keywords):\n{shortlist}\n\n{user_message}"
+        return {
+            "estimated_tokens": estimate_tokens(SYSTEM_PROMPT) + estimate_tokens(user_message) + MAX_COMPLETION_TOKENS,
+            "model": self.model,
+            "messages": [
+                {"role": "system", "content": SYSTEM_PROMPT},
+                {"role": "user", "content": user_message}
+            ],
+            "temperature": 0.3,
+            "max_tokens": MAX_COMPLETION_TOKENS,
+            "response_format": {"type": "json_object"}
+        }
+    
+    def _handle_response(self, email_body: str, response: Any) -> Dict[str, Any]:
+        return self._handle_content(email_body, response.choices[0].message.content)
+    
+    def _handle_content(self, email_body: str, content: Optional[str]) -> Dict[str, Any]:
+        try:
             parsed_data = json.loads(content)
-            
-            # Normalize the response format
-            if "items" in parsed_data:
-                # Multiple items format
-                extracted_items = parsed_data["items"]
-                customer_name = parsed_data.get("customer_name", "Customer")
-            else:
-                # Single item format - convert to items array
-                extracted_items = [{
-                    "service_requested": parsed_data.get("service_requested", ""),
-                    "quantity": parsed_data.get("quantity", 1)
-                }]
-                customer_name = parsed_data.get("customer_name", "Customer")
-            
-            return {
-                "customer_name": customer_name,
-                "confidence_score": parsed_data.get("confidence_score", 70),
-                "ai_reasoning": parsed_data.get("ai_reasoning", ["Standard AI processing"]),
-                "extracted_items": extracted_items
-            }
-            
-        except json.JSONDecodeError as e:
-            print(f"✗ Error parsing JSON response: {e}")
-            print(f"Response content: {content}")
-            # Return default structure
-            return {
-                "customer_name": "Customer",
-                "extracted_items": [{
-                    "service_requested": "Service Call",
-                    "quantity": 1
-                }]
-            }
-        
-        except Exception as e:
-            print(f"✗ Error calling OpenAI API: {e}")
-            # Return default structure on error
-            return {
-                "customer_name": "Customer",
-                "extracted_items": [{
-                    "service_requested": "Service Call",
-                    "quantity": 1
-                }]
-            }
-
+        except (TypeError, json.JSONDecodeError) as e:
+            # A truncated or non-JSON answer must not become a made-up quote
+            raise LLMUnavailableError(f"Malformed JSON from OpenAI: {e}")
+        
+        # Normalize the response format
+        if "items" in parsed_data:
+            # Multiple items format
+            extracted_items = parsed_data["items"]
+            customer_name = parsed_data.get("customer_name", "Customer")
+        else:
+            # Single item format - convert to items array
+            extracted_items = [{
+                "service_requested": parsed_data.get("service_requested", ""),
+                "quantity": parsed_data.get("quantity", 1)
+            }]
+            customer_name = parsed_data.get("customer_name", "Customer")
+        
+        result = {
+            "customer_name": customer_name,
+            "confidence_score": parsed_data.get("confidence_score", 70),
+            "ai_reasoning": parsed_data.get("ai_reasoning", ["Standard AI processing"]),
+            "extracted_items": extracted_items
+        }
+        if parsed_data.get("template_hint"):
+            result["template_hint"] = parsed_data["template_hint"]
+        if self.cache is not None:
+            self.cache.put(email_body, self.model, self._prompt_version(), result)
+        return result
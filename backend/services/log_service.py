@@ -0,0 +1,168 @@
+"""
+Log Service
+Structured, non-blocking logging for the agent hot path.
+
+Records are put on an in-memory queue by the calling thread; formatting and
+I/O happen on a background listener thread. Per-item chatter can be sampled
+by level so bulk runs don't drown in output.
+
+Environment:
+    LOG_LEVEL        Minimum level (default INFO)
+    LOG_FORMAT       text or json (default text)
+    LOG_FILE         Also write to this file
+    LOG_SAMPLE_RATE  Fraction of sampled-level records to keep (default 1.0)
+    LOG_SAMPLE_LEVEL Records at or below this level are sampled (default DEBUG)
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import sys
+import threading
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener
+from typing import Optional
+
+
+ROOT_LOGGER_NAME = "velocity"
+
+# Attributes every LogRecord has; anything else came from `extra=`
+_STANDARD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
+
+_lock = threading.Lock()
+_listener: Optional[QueueListener] = None
+
+
+def _extra_fields(record: logging.LogRecord) -> dict:
+    return {key: value for key, value in record.__dict__.items() if key not in _STANDARD_ATTRS}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line, including any `extra=` fields."""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+            "thread": record.threadName
+        }
+        entry.update(_extra_fields(record))
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable line with `key=value` pairs for `extra=` fields."""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s %(message)s", "%Y-%m-%d %H:%M:%S")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = _extra_fields(record)
+        if fields:
+            line += " " + " ".join(f"{key}={value}" for key, value in fields.items())
+        return line
+
+
+class SamplingFilter(logging.Filter):
+    """Keeps only a fraction of records at or below a level; higher levels always pass."""
+
+    def __init__(self, rate: float = 1.0, max_level: int = logging.DEBUG):
+        super().__init__()
+        self.rate = rate
+        self.max_level = max_level
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno > self.max_level or self.rate >= 1.0:
+            return True
+        return random.random() < self.rate
+
+
+class DeferredQueueHandler(QueueHandler):
+    """
+    QueueHandler that leaves message formatting to the listener thread.
+
+    The stock handler merges `msg % args` on the calling thread. Records stay
+    in-process, so nothing needs to be pickled and the work can be deferred.
+    Callers should pass immutable arguments.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def _build_output_handlers() -> list:
+    formatter = JsonFormatter() if os.getenv("LOG_FORMAT", "text").lower() == "json" else TextFormatter()
+    handlers = [logging.StreamHandler(sys.stdout)]
+    log_file = os.getenv("LOG_FILE")
+    if log_file:
+        handlers.append(logging.FileHandler(log_file))
+    for handler in handlers:
+        handler.setFormatter(formatter)
+    return handlers
+
+
+def configure_logging(force: bool = False) -> None:
+    """Attach the queue handler and start the listener thread (idempotent)."""
+    global _listener
+    with _lock:
+        if _listener is not None and not force:
+            return
+
+        root = logging.getLogger(ROOT_LOGGER_NAME)
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+
+        log_queue = queue.SimpleQueue()
+        queue_handler = DeferredQueueHandler(log_queue)
+        queue_handler.addFilter(SamplingFilter(
+            rate=float(os.getenv("LOG_SAMPLE_RATE", "1.0")),
+            max_level=logging.getLevelName(os.getenv("LOG_SAMPLE_LEVEL", "DEBUG").upper())
+        ))
+        root.addHandler(queue_handler)
+        root.setLevel(os.getenv("LOG_LEVEL", "INFO").upper())
+        root.propagate = False
+
+        _listener = QueueListener(log_queue, *_build_output_handlers(), respect_handler_level=True)
+        _listener.start()
+
+
+def shutdown_logging() -> None:
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    with _lock:
+        if _listener is not None:
+            _listener.stop()
+            _listener = None
+
+
+def _after_fork_in_child() -> None:
+    # The listener thread doesn't survive fork; start a fresh one in the child
+    global _listener, _lock
+    _lock = threading.Lock()
+    if _listener is not None:
+        _listener = None
+        configure_logging()
+
+
+def get_logger(name: str) -> logging.Logger:
+    """
+    Get a logger under the `velocity` namespace, configuring logging on first use.
+
+    Args:
+        name: Component name, e.g. "agent" or "gmail"
+    """
+    configure_logging()
+    return logging.getLogger(f"{ROOT_LOGGER_NAME}.{name}")
+
+
+atexit.register(shutdown_logging)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
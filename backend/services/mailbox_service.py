@@ -0,0 +1,151 @@
+"""
+Mailbox Service
+Manages one Gmail mailbox per contractor so a single agent can serve them all.
+"""
+
+import os
+import json
+from typing import Optional, Dict, Any, List, Set
+from services.gmail_service import GmailService
+from services.log_service import get_logger
+
+logger = get_logger("mailbox")
+
+
+class Mailbox:
+    """A contractor's Gmail inbox and its sync position."""
+
+    def __init__(self, contractor_id: Optional[str], gmail_service: GmailService, email_address: Optional[str] = None):
+        """
+        Initialize a mailbox.
+
+        Args:
+            contractor_id: Owning contractor ID (None for the default mailbox)
+            gmail_service: Authenticated Gmail service for this inbox
+            email_address: Inbox address, used to route push notifications
+        """
+        self.contractor_id = contractor_id
+        self.gmail_service = gmail_service
+        self.email_address = email_address
+        self.history_id = None
+        self.pushed_history_id = None
+        # History ID reached by the current sync, adopted once its messages are recorded
+        self.next_history_id = None
+        # Messages seen but not finished (deferred, failed under max_attempts, fetch failed)
+        self.retry_ids: Set[str] = set()
+        self.last_full_sync = 0.0
+
+    @property
+    def label(self) -> str:
+        return self.contractor_id or "default"
+
+    def ledger_key(self, message_id: str) -> str:
+        """Message IDs are only unique per mailbox, so namespace them for the ledger."""
+        if self.contractor_id:
+            return f"{self.contractor_id}:{message_id}"
+        return message_id
+
+    def commit_history(self) -> None:
+        """Move the sync position to where the last sync got to."""
+        if self.next_history_id is not None:
+            self.history_id = self.next_history_id
+            self.next_history_id = None
+
+    def note_push(self, history_id: str) -> None:
+        """Remember the newest history ID seen in a push notification; invalid IDs are ignored."""
+        try:
+            pushed = int(history_id)
+        except (TypeError, ValueError):
+            logger.warning("Ignoring push notification with invalid history ID %r for %s", history_id, self.label)
+            return
+        if self.pushed_history_id is None or pushed > int(self.pushed_history_id):
+            self.pushed_history_id = str(pushed)
+
+
+class MailboxPool:
+    """Loads per-contractor Gmail credentials and hands out mailboxes."""
+
+    def __init__(
+        self,
+        default_service: Optional[GmailService] = None,
+        contractors_path: str = "data/contractors.json",
+        tokens_dir: str = "data/tokens",
+        credentials_path: str = "credentials.json"
+    ):
+        """
+        Initialize the mailbox pool.
+
+        A contractor gets a mailbox if it has a `gmail` block in contractors.json
+        or a token at `<tokens_dir>/<contractor_id>.pickle`. The `gmail` block may
+        set `email_address`, `token_path` and `credentials_path`. When no
+        contractor mailbox is configured, the default service is polled alone.
+
+        Args:
+            default_service: The agent's single-inbox Gmail service
+            contractors_path: Path to the contractors JSON
+            tokens_dir: Directory holding per-contractor OAuth tokens
+            credentials_path: Shared Google OAuth client credentials
+        """
+        self.contractors_path = contractors_path
+        self.tokens_dir = tokens_dir
+        self.credentials_path = credentials_path
+        self.default_service = default_service
+        self.mailboxes: Dict[str, Mailbox] = {}
+        self.load_mailboxes()
+
+    def _load_contractors(self) -> List[Dict[str, Any]]:
+        if not os.path.exists(self.contractors_path):
+            return []
+        try:
+            with open(self.contractors_path, 'r') as f:
+                return json.load(f)
+        except Exception as e:
+            logger.warning("Failed to load contractors: %s", e)
+            return []
+
+    def load_mailboxes(self) -> None:
+        """Create a Gmail service for every contractor with mailbox credentials."""
+        for contractor in self._load_contractors():
+            contractor_id = contractor.get("id")
+            gmail_config = contractor.get("gmail") or {}
+            token_path = gmail_config.get("token_path", os.path.join(self.tokens_dir, f"{contractor_id}.pickle"))
+
+            if not gmail_config and not os.path.exists(token_path):
+                continue
+
+            try:
+                service = GmailService(
+                    credentials_path=gmail_config.get("credentials_path", self.credentials_path),
+                    token_path=token_path
+                )
+            except Exception as e:
+                logger.error("Failed to initialize mailbox for %s: %s", contractor_id, e)
+                continue
+
+            self.mailboxes[contractor_id] = Mailbox(contractor_id, service, gmail_config.get("email_address"))
+            logger.info("Mailbox ready for %s", contractor_id)
+
+        if not self.mailboxes and self.default_service is not None:
+            self.mailboxes[None] = Mailbox(None, self.default_service)
+
+    def all(self) -> List[Mailbox]:
+        return list(self.mailboxes.values())
+
+    def get(self, contractor_id: Optional[str]) -> Optional[Mailbox]:
+        return self.mailboxes.get(contractor_id)
+
+    def find_by_email(self, email_address: Optional[str]) -> Optional[Mailbox]:
+        """Find the mailbox a push notification was sent for."""
+        if not email_address:
+            return None
+        for mailbox in self.mailboxes.values():
+            if mailbox.email_address and mailbox.email_address.lower() == email_address.lower():
+                return mailbox
+        return None
+
+    def gmail_for(self, contractor_id: Optional[str]) -> Optional[GmailService]:
+        """Gmail service to draft replies from, falling back to the default inbox."""
+        mailbox = self.mailboxes.get(contractor_id)
+        if mailbox is not None:
+            return mailbox.gmail_service
+        return self.default_service
@@ -0,0 +1,311 @@
+"""
+Metrics
+Lightweight in-process counters, gauges and histograms rendered as Prometheus text.
+"""
+
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+
+# Default latency buckets in seconds, from 5ms to 2 minutes
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+
+def _label_key(labels: Dict[str, str]) -> Tuple[Tuple[str, str], ...]:
+    return tuple(sorted((k, str(v)) for k, v in labels.items()))
+
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _format_labels(key: Iterable[Tuple[str, str]], extra: Optional[Tuple[str, str]] = None) -> str:
+    pairs = list(key)
+    if extra:
+        pairs.append(extra)
+    if not pairs:
+        return ""
+    return "{" + ",".join(f'{k}="{_escape(v)}"' for k, v in pairs) + "}"
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value))
+
+
+class Counter:
+    """Monotonically increasing value, per label set."""
+
+    type_name = "counter"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[tuple, float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1.0, **labels) -> None:
+        key = _label_key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0.0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(_label_key(labels), 0.0)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = list(self._values.items())
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in items]
+
+
+class Gauge:
+    """Point-in-time value, either set directly or read from a callback at scrape time."""
+
+    type_name = "gauge"
+
+    def __init__(self, name: str, help_text: str):
+        self.name = name
+        self.help_text = help_text
+        self._values: Dict[tuple, float] = {}
+        self._callbacks: List[Callable[[], Dict[tuple, float]]] = []
+        self._lock = threading.Lock()
+
+    def set(self, value: float, **labels) -> None:
+        with self._lock:
+            self._values[_label_key(labels)] = value
+
+    def set_function(self, callback: Callable[[], Dict[Tuple[Tuple[str, str], ...], float]]) -> None:
+        """
+        Register a callback evaluated on every scrape.
+
+        The callback returns a mapping of label tuples (as built by
+        `label_set`) to values.
+        """
+        self._callbacks.append(callback)
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            values = dict(self._values)
+        for callback in self._callbacks:
+            try:
+                values.update(callback())
+            except Exception:
+                continue
+        return [f"{self.name}{_format_labels(key)} {_format_value(value)}" for key, value in values.items()]
+
+
+class Histogram:
+    """Bucketed distribution of observations, per label set."""
+
+    type_name = "histogram"
+
+    def __init__(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = tuple(sorted(buckets))
+        # label key -> [bucket counts..., +Inf count, sum]
+        self._series: Dict[tuple, List[float]] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels) -> None:
+        key = _label_key(labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 1) + [0.0]
+            series[index] += 1
+            series[-1] += value
+
+    @contextmanager
+    def time(self, **labels):
+        """Observe the wall-clock duration of a block."""
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.observe(time.perf_counter() - start, **labels)
+
+    def snapshot(self, **labels) -> Dict[str, float]:
+        """Count, sum and mean for one label set."""
+        series = self._series.get(_label_key(labels))
+        if series is None:
+            return {"count": 0, "sum": 0.0, "mean": 0.0}
+        count = sum(series[:-1])
+        return {"count": count, "sum": series[-1], "mean": series[-1] / count if count else 0.0}
+
+    def quantile(self, q: float, **labels) -> float:
+        """Estimate a quantile (0-1) for one label set by interpolating within buckets."""
+        series = self._series.get(_label_key(labels))
+        if series is None:
+            return 0.0
+        counts = series[:-1]
+        total = sum(counts)
+        if not total:
+            return 0.0
+        rank = q * total
+        cumulative = 0
+        lower = 0.0
+        for bound, count in zip(self.buckets, counts):
+            if count and cumulative + count >= rank:
+                return lower + (bound - lower) * (rank - cumulative) / count
+            cumulative += count
+            lower = bound
+        # Falls in the +Inf bucket; the last finite bound is the best estimate
+        return self.buckets[-1]
+
+    def label_sets(self) -> List[Dict[str, str]]:
+        with self._lock:
+            return [dict(key) for key in self._series]
+
+    def samples(self) -> List[str]:
+        with self._lock:
+            items = [(key, list(series)) for key, series in self._series.items()]
+        lines = []
+        for key, series in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), series[:-1]):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(key, ('le', _format_value(bound)))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(key)} {_format_value(series[-1])}")
+            lines.append(f"{self.name}_count{_format_labels(key)} {cumulative}")
+        return lines
+
+
+class MetricsRegistry:
+    """Holds every metric and renders them in the Prometheus text format."""
+
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = threading.Lock()
+
+    def _get_or_create(self, cls, name: str, help_text: str, **kwargs):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = cls(name, help_text, **kwargs)
+            return metric
+
+    def counter(self, name: str, help_text: str) -> Counter:
+        return self._get_or_create(Counter, name, help_text)
+
+    def gauge(self, name: str, help_text: str) -> Gauge:
+        return self._get_or_create(Gauge, name, help_text)
+
+    def histogram(self, name: str, help_text: str, buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._get_or_create(Histogram, name, help_text, buckets=buckets)
+
+    def render(self) -> str:
+        """Render all metrics in Prometheus text exposition format (0.0.4)."""
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.help_text}")
+            lines.append(f"# TYPE {metric.name} {metric.type_name}")
+            lines.extend(metric.samples())
+        return "\n".join(lines) + "\n"
+
+
+def label_set(**labels) -> Tuple[Tuple[str, str], ...]:
+    """Build the label tuple expected from Gauge.set_function callbacks."""
+    return _label_key(labels)
+
+
+# Process-wide registry and the metrics shared across services
+REGISTRY = MetricsRegistry()
+
+STAGE_SECONDS = REGISTRY.histogram(
+    "velocity_stage_duration_seconds",
+    "Duration of each process_email stage"
+)
+EXTERNAL_CALL_SECONDS = REGISTRY.histogram(
+    "velocity_external_call_duration_seconds",
+    "Duration of calls to external services (OpenAI, Gmail, Twilio, Stripe, Whisper)"
+)
+EXTERNAL_CALL_ERRORS = REGISTRY.counter(
+    "velocity_external_call_errors_total",
+    "Failed calls to external services"
+)
+HTTP_REQUEST_SECONDS = REGISTRY.histogram(
+    "velocity_http_request_duration_seconds",
+    "Duration of Flask requests by route"
+)
+EMAILS_PROCESSED = REGISTRY.counter(
+    "velocity_emails_processed_total",
+    "Emails that went through process_email, by outcome"
+)
+CACHE_REQUESTS = REGISTRY.counter(
+    "velocity_cache_requests_total",
+    "Cache lookups by cache and result (hit/miss)"
+)
+CACHE_HIT_RATIO = REGISTRY.gauge(
+    "velocity_cache_hit_ratio",
+    "Fraction of cache lookups that were hits"
+)
+PARSE_SOURCE = REGISTRY.counter(
+    "velocity_parse_source_total",
+    "Parsed emails by source (rules fast path or llm)"
+)
+PROMPT_TOKENS_SAVED = REGISTRY.counter(
+    "velocity_prompt_tokens_saved_total",
+    "Estimated prompt tokens removed by email pre-processing"
+)
+QUEUE_DEPTH = REGISTRY.gauge(
+    "velocity_queue_depth",
+    "Jobs waiting in front of each pipeline stage"
+)
+PDF_STORAGE_BYTES = REGISTRY.gauge(
+    "velocity_pdf_storage_bytes",
+    "Disk used by quote PDFs, by tier (cache, archive, output)"
+)
+PDF_STORAGE_FILES = REGISTRY.gauge(
+    "velocity_pdf_storage_files",
+    "Quote PDF files on disk, by tier (cache, archive, output)"
+)
+PDF_ARCHIVED = REGISTRY.counter(
+    "velocity_pdf_archived_total",
+    "PDFs moved to the archive, by source (cache or output)"
+)
+PDF_RESTORED = REGISTRY.counter(
+    "velocity_pdf_restored_total",
+    "Archived PDFs brought back into the cache on request"
+)
+
+
+@contextmanager
+def external_call(service: str, operation: str):
+    """Time a call to an external service and count failures."""
+    start = time.perf_counter()
+    try:
+        yield
+    except BaseException:
+        EXTERNAL_CALL_ERRORS.inc(service=service, operation=operation)
+        raise
+    finally:
+        EXTERNAL_CALL_SECONDS.observe(time.perf_counter() - start, service=service, operation=operation)
+
+
+def record_cache(cache: str, hit: bool) -> None:
+    """Count a cache lookup."""
+    CACHE_REQUESTS.inc(cache=cache, result="hit" if hit else "miss")
+
+
+def _cache_hit_ratios() -> Dict[tuple, float]:
+    totals: Dict[str, List[float]] = {}
+    for key, value in list(CACHE_REQUESTS._values.items()):
+        labels = dict(key)
+        entry = totals.setdefault(labels.get("cache", ""), [0.0, 0.0])
+        entry[0 if labels.get("result") == "hit" else 1] += value
+    return {
+        label_set(cache=cache): hits / (hits + misses)
+        for cache, (hits, misses) in totals.items()
+        if hits + misses
+    }
+
+
+CACHE_HIT_RATIO.set_function(_cache_hit_ratios)
@@ -0,0 +1,181 @@
+"""
+PDF Bulk
+Renders many quote PDFs across a process pool and streams them out as a zip
+archive or a single merged PDF.
+"""
+
+import io
+import os
+import threading
+import zipfile
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from typing import Optional, Dict, Any, List, Iterator, Tuple
+
+from services.pdf_service import PDFService
+from services.pdf_cache import PDFCache
+from services.log_service import get_logger
+
+try:
+    from pypdf import PdfReader, PdfWriter
+except ImportError:
+    # Optional: only needed to merge quotes into one PDF
+    PdfReader = PdfWriter = None
+
+logger = get_logger("pdf.bulk")
+
+
+# Per-process PDF service for the render workers (set by _init_render_worker)
+_worker_pdf_service = None
+
+
+def _init_render_worker(output_dir: str, branding: Optional[Dict[str, Any]] = None) -> None:
+    """Load PDF settings once per worker process."""
+    global _worker_pdf_service
+    _worker_pdf_service = PDFService(output_dir, branding=branding)
+
+
+def _render_in_worker(customer_name: str, quote_data: Dict[str, Any], quote_number: str) -> bytes:
+    return _worker_pdf_service.render_quote_pdf(customer_name, quote_data, quote_number)
+
+
+class _ChunkSink:
+    """Write-only file object that hands back what was written, for streaming a zip."""
+
+    def __init__(self):
+        self._chunks: List[bytes] = []
+
+    def write(self, data) -> int:
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+    def drain(self) -> bytes:
+        data, self._chunks = b"".join(self._chunks), []
+        return data
+
+
+class BulkPDFRenderer:
+    """
+    Renders batches of quote PDFs in parallel.
+
+    fpdf rendering is CPU-bound, so PDFs that aren't already cached are
+    rendered in worker processes rather than threads. Results are yielded as
+    they finish and stored in the PDF cache, so re-issuing the same quotes
+    later costs nothing. The process pool is only started on first use.
+    """
+
+    def __init__(self, pdf_service: PDFService, cache: Optional[PDFCache] = None, max_workers: Optional[int] = None):
+        """
+        Initialize the renderer.
+
+        Args:
+            pdf_service: Branding and layout to render with
+            cache: Cache consulted before rendering and filled after
+            max_workers: Render processes (defaults to the CPU count)
+        """
+        self.pdf_service = pdf_service
+        self.cache = cache
+        self.max_workers = max_workers or os.cpu_count() or 2
+        self._pool: Optional[ProcessPoolExecutor] = None
+        self._pool_lock = threading.Lock()
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        if self._pool is None:
+            with self._pool_lock:
+                if self._pool is None:
+                    self._pool = ProcessPoolExecutor(
+                        max_workers=self.max_workers,
+                        initializer=_init_render_worker,
+                        initargs=(self.pdf_service.output_dir, self.pdf_service.branding)
+                    )
+        return self._pool
+
+    def render(self, quotes: List[Dict[str, Any]]) -> Iterator[Tuple[str, bytes]]:
+        """
+        Render quote PDFs, yielding each as soon as it is ready.
+
+        Args:
+            quotes: Dicts with customer_name, quote_data and quote_number
+
+        Yields:
+            (file name, PDF bytes) in completion order; cached PDFs come first
+        """
+        pending = {}
+        cached = []
+        try:
+            # Queue every miss before yielding anything, so the pool stays busy
+            for quote in quotes:
+                key = self.pdf_service.content_key(quote["customer_name"], quote["quote_data"], quote["quote_number"])
+                filename = self.pdf_service.pdf_filename(quote["quote_number"])
+                pdf_bytes = (self.cache.get(key) or self.cache.restore(key)) if self.cache else None
+                if pdf_bytes is not None:
+                    cached.append((filename, pdf_bytes))
+                    continue
+                future = self._get_pool().submit(
+                    _render_in_worker, quote["customer_name"], quote["quote_data"], quote["quote_number"]
+                )
+                pending[future] = (key, filename)
+            logger.info("Bulk render: %d cached, %d to render", len(cached), len(pending))
+
+            yield from cached
+            for future in as_completed(list(pending)):
+                key, filename = pending.pop(future)
+                pdf_bytes = future.result()
+                if self.cache:
+                    self.cache.put(key, pdf_bytes)
+                yield filename, pdf_bytes
+        finally:
+            # The consumer went away (e.g. the download was aborted)
+            for future in pending:
+                future.cancel()
+
+    def iter_zip(self, quotes: List[Dict[str, Any]]) -> Iterator[bytes]:
+        """
+        Stream quote PDFs as a zip archive, one chunk per finished PDF.
+
+        Args:
+            quotes: Dicts with customer_name, quote_data and quote_number
+
+        Yields:
+            Successive pieces of the zip file
+        """
+        sink = _ChunkSink()
+        date_time = datetime.now().timetuple()[:6]
+        with zipfile.ZipFile(sink, "w") as archive:
+            for filename, pdf_bytes in self.render(quotes):
+                # PDF page streams are already compressed; storing them is faster
+                archive.writestr(zipfile.ZipInfo(filename, date_time), pdf_bytes, compress_type=zipfile.ZIP_STORED)
+                yield sink.drain()
+        yield sink.drain()
+
+    def merged_pdf(self, quotes: List[Dict[str, Any]]) -> bytes:
+        """
+        Render quotes into one PDF, in the order given.
+
+        Args:
+            quotes: Dicts with customer_name, quote_data and quote_number
+
+        Returns:
+            The merged PDF bytes
+
+        Raises:
+            RuntimeError: pypdf is not installed
+        """
+        if PdfWriter is None:
+            raise RuntimeError("Merging PDFs requires pypdf (pip install pypdf)")
+        rendered = dict(self.render(quotes))
+        writer = PdfWriter()
+        for quote in quotes:
+            writer.append(PdfReader(io.BytesIO(rendered[self.pdf_service.pdf_filename(quote["quote_number"])])))
+        output = io.BytesIO()
+        writer.write(output)
+        return output.getvalue()
+
+    def shutdown(self) -> None:
+        """Stop the render processes, if they were started."""
+        if self._pool is not None:
+            self._pool.shutdown(cancel_futures=True)
+            self._pool = None
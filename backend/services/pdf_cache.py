@@ -0,0 +1,249 @@
+"""
+PDF Cache
+Size-bounded, content-addressed disk cache of rendered quote PDFs.
+"""
+
+import gzip
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Optional, Callable, Dict
+
+from services.metrics import PDF_RESTORED, record_cache
+from services.log_service import get_logger
+
+logger = get_logger("pdf.cache")
+
+
+def sharded_path(root: str, name: str, key: Optional[str] = None) -> str:
+    """
+    Path of a file under root, spread across 256 subdirectories.
+
+    Args:
+        root: Top-level directory
+        name: File name
+        key: Hex string to shard by (defaults to a hash of the name)
+    """
+    key = key or hashlib.sha256(name.encode("utf-8")).hexdigest()
+    return os.path.join(root, key[:2], name)
+
+
+class PDFCache:
+    """
+    Rendered PDFs stored as `<content key>.pdf` files, sharded into
+    subdirectories by the first two characters of the key.
+
+    The key is a hash of everything that goes into the PDF (see
+    PDFService.content_key), so an identical quote is never rendered twice
+    and an edited quote simply gets a new key. Once the files add up to more
+    than `max_bytes`, the least recently used ones are deleted. Concurrent
+    requests for a PDF that isn't cached yet share a single render. With
+    `precompress`, a gzipped copy is stored next to each PDF for clients
+    that accept gzip. With an `archive`, misses are restored from it before
+    anything is rendered.
+    """
+
+    def __init__(
+        self,
+        cache_dir: str = "output/pdf_cache",
+        max_bytes: int = 512 * 1024 * 1024,
+        precompress: bool = False,
+        archive=None
+    ):
+        """
+        Initialize the cache.
+
+        Args:
+            cache_dir: Directory holding the cached PDFs
+            max_bytes: Total size kept after eviction
+            precompress: Also store a `.pdf.gz` copy of each PDF
+            archive: PDFArchive holding PDFs moved out of the cache
+        """
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.precompress = precompress
+        self.archive = archive
+        os.makedirs(cache_dir, exist_ok=True)
+
+        self._lock = threading.Lock()
+        self._inflight: Dict[str, Future] = {}
+        # key -> size, least recently used first; file mtimes carry the order across restarts
+        self._entries: "OrderedDict[str, int]" = OrderedDict()
+        self._total = 0
+        files = {}
+        for directory, _, names in os.walk(cache_dir):
+            for name in names:
+                if not name.endswith((".pdf", ".pdf.gz")):
+                    continue
+                key = name.split(".", 1)[0]
+                path = os.path.join(directory, name)
+                if directory == cache_dir:
+                    # Cached before sharding
+                    target = sharded_path(cache_dir, name, key)
+                    os.makedirs(os.path.dirname(target), exist_ok=True)
+                    os.replace(path, target)
+                    path = target
+                stat = os.stat(path)
+                mtime, size = files.get(key, (0.0, 0))
+                files[key] = (max(mtime, stat.st_mtime), size + stat.st_size)
+        for key, (_, size) in sorted(files.items(), key=lambda pair: pair[1][0]):
+            self._entries[key] = size
+            self._total += size
+
+    @classmethod
+    def from_env(cls, archive=None) -> "PDFCache":
+        """Build a cache from PDF_CACHE_DIR, PDF_CACHE_MAX_MB and PDF_PRECOMPRESS."""
+        return cls(
+            cache_dir=os.getenv("PDF_CACHE_DIR", "output/pdf_cache"),
+            max_bytes=int(float(os.getenv("PDF_CACHE_MAX_MB", "512")) * 1024 * 1024),
+            precompress=os.getenv("PDF_PRECOMPRESS", "false").lower() == "true",
+            archive=archive
+        )
+
+    def path_for(self, key: str) -> str:
+        """Where the PDF for a content key is (or would be) stored."""
+        return sharded_path(self.cache_dir, f"{key}.pdf", key)
+
+    def compressed_path_for(self, key: str) -> Optional[str]:
+        """The gzipped copy of a cached PDF, if one was stored."""
+        path = self.path_for(key) + ".gz"
+        return path if os.path.exists(path) else None
+
+    def _touch(self, key: str) -> None:
+        try:
+            os.utime(self.path_for(key))
+        except FileNotFoundError:
+            pass
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+
+    def _forget(self, key: str) -> None:
+        with self._lock:
+            self._total -= self._entries.pop(key, 0)
+
+    def get(self, key: str) -> Optional[bytes]:
+        """Cached PDF bytes for a content key, or None."""
+        try:
+            with open(self.path_for(key), "rb") as f:
+                pdf_bytes = f.read()
+        except FileNotFoundError:
+            # Never rendered, or evicted (possibly by another process)
+            self._forget(key)
+            return None
+        self._touch(key)
+        return pdf_bytes
+
+    def get_or_render(self, key: str, render: Callable[[], bytes]) -> bytes:
+        """
+        Cached PDF for a content key, rendering and storing it on a miss.
+
+        Args:
+            key: Content key of the PDF
+            render: Produces the PDF bytes; called at most once per key at a time
+
+        Returns:
+            The PDF bytes
+        """
+        pdf_bytes = self.get(key)
+        record_cache("pdf", hit=pdf_bytes is not None)
+        if pdf_bytes is not None:
+            return pdf_bytes
+        return self._render_once(key, render)
+
+    def get_or_render_path(self, key: str, render: Callable[[], bytes]) -> str:
+        """
+        Like get_or_render(), but returns the cached file's path without reading it.
+
+        Args:
+            key: Content key of the PDF
+            render: Produces the PDF bytes; called at most once per key at a time
+
+        Returns:
+            Path of the cached PDF
+        """
+        path = self.path_for(key)
+        hit = os.path.exists(path)
+        record_cache("pdf", hit=hit)
+        if hit:
+            self._touch(key)
+        else:
+            self._forget(key)
+            self._render_once(key, render)
+        return path
+
+    def _render_once(self, key: str, render: Callable[[], bytes]) -> bytes:
+        with self._lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = self._inflight[key] = Future()
+        if not owner:
+            return future.result()
+
+        try:
+            pdf_bytes = self.restore(key)
+            if pdf_bytes is None:
+                pdf_bytes = render()
+                self.put(key, pdf_bytes)
+            future.set_result(pdf_bytes)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._lock:
+                del self._inflight[key]
+        return pdf_bytes
+
+    def restore(self, key: str) -> Optional[bytes]:
+        """Move an archived PDF back into the cache; None if it isn't archived."""
+        pdf_bytes = self.archive.get(f"{key}.pdf") if self.archive is not None else None
+        if pdf_bytes is not None:
+            self.put(key, pdf_bytes)
+            PDF_RESTORED.inc()
+            logger.debug("Restored archived PDF %s", key)
+        return pdf_bytes
+
+    def remove(self, key: str) -> None:
+        """Drop a PDF from the cache (e.g. once it has been archived)."""
+        self._forget(key)
+        for path in (self.path_for(key), self.path_for(key) + ".gz"):
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+
+    def put(self, key: str, pdf_bytes: bytes) -> None:
+        """Store a rendered PDF under its content key, evicting old ones if the cache is full."""
+        path = self.path_for(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        size = self._write(path, pdf_bytes)
+        if self.precompress:
+            compressed = gzip.compress(pdf_bytes, mtime=0)
+            # Only worth keeping if it is noticeably smaller
+            if len(compressed) < len(pdf_bytes) * 0.9:
+                size += self._write(path + ".gz", compressed)
+
+        with self._lock:
+            self._total += size - self._entries.pop(key, 0)
+            self._entries[key] = size
+            evicted = []
+            while self._total > self.max_bytes and len(self._entries) > 1:
+                old_key, size = self._entries.popitem(last=False)
+                self._total -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            self.remove(old_key)
+        if evicted:
+            logger.debug("Evicted %d cached PDF(s)", len(evicted))
+
+    @staticmethod
+    def _write(path: str, data: bytes) -> int:
+        # Write then rename, so readers never see half a file
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(data)
+        os.replace(temp_path, path)
+        return len(data)
@@ -0,0 +1,247 @@
+"""
+PDF Retention
+Moves PDFs of closed quotes out of the hot cache into a compressed archive,
+prunes old output files and reports how much disk each tier uses.
+"""
+
+import gzip
+import os
+import threading
+import time
+from typing import Optional, Dict, Any, List, Callable, Iterable, Iterator, Tuple
+
+from services.pdf_cache import PDFCache, sharded_path
+from services.pdf_service import PDFService
+from services.metrics import PDF_STORAGE_BYTES, PDF_STORAGE_FILES, PDF_ARCHIVED
+from services.log_service import get_logger
+
+logger = get_logger("pdf.retention")
+
+
+# Quotes past these statuses won't be opened often; their PDFs go to the archive
+DEFAULT_ARCHIVE_STATUSES = ("APPROVED", "EXPIRED", "REJECTED", "SCHEDULED", "INVOICED")
+
+
+def _walk_files(root: str, skip: Iterable[str] = ()) -> Iterator[str]:
+    """Paths of the files under root, not descending into the directories in skip."""
+    skip = {os.path.abspath(path) for path in skip}
+    for directory, subdirectories, names in os.walk(root):
+        subdirectories[:] = [d for d in subdirectories if os.path.abspath(os.path.join(directory, d)) not in skip]
+        for name in names:
+            yield os.path.join(directory, name)
+
+
+def _disk_usage(root: str, skip: Iterable[str] = ()) -> Tuple[int, int]:
+    """(files, bytes) under root, not descending into the directories in skip."""
+    files = size = 0
+    for path in _walk_files(root, skip):
+        try:
+            size += os.path.getsize(path)
+            files += 1
+        except FileNotFoundError:
+            pass
+    return files, size
+
+
+class PDFArchive:
+    """
+    Cold storage for PDFs: gzipped files sharded under `root`.
+
+    Archived PDFs are kept byte-for-byte, so a restored quote shows the date it
+    was issued rather than the day it was reopened.
+    """
+
+    def __init__(self, root: str = "output/archive"):
+        """
+        Initialize the archive.
+
+        Args:
+            root: Directory holding the archived PDFs
+        """
+        self.root = root
+        os.makedirs(root, exist_ok=True)
+
+    @classmethod
+    def from_env(cls) -> "PDFArchive":
+        """Build an archive from PDF_ARCHIVE_DIR."""
+        return cls(os.getenv("PDF_ARCHIVE_DIR", "output/archive"))
+
+    def path_for(self, name: str) -> str:
+        """Where a PDF named `name` is (or would be) archived."""
+        return sharded_path(self.root, f"{name}.gz")
+
+    def __contains__(self, name: str) -> bool:
+        return os.path.exists(self.path_for(name))
+
+    def put(self, name: str, pdf_bytes: bytes) -> None:
+        """Archive a PDF under a name (a cache key file name or a quote file name)."""
+        path = self.path_for(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(gzip.compress(pdf_bytes, mtime=0))
+        os.replace(temp_path, path)
+
+    def get(self, name: str) -> Optional[bytes]:
+        """An archived PDF, or None."""
+        try:
+            with open(self.path_for(name), "rb") as f:
+                return gzip.decompress(f.read())
+        except FileNotFoundError:
+            return None
+
+    def prune(self, max_age_seconds: float) -> int:
+        """Delete archived PDFs older than max_age_seconds; returns how many."""
+        cutoff = time.time() - max_age_seconds
+        removed = 0
+        for directory, _, names in os.walk(self.root):
+            for name in names:
+                path = os.path.join(directory, name)
+                try:
+                    if os.path.getmtime(path) < cutoff:
+                        os.remove(path)
+                        removed += 1
+                except FileNotFoundError:
+                    pass
+        return removed
+
+
+class PDFRetentionManager:
+    """
+    Background sweeper for generated PDFs.
+
+    Every `interval` seconds it:
+    - moves the cached PDFs of quotes in `archive_statuses` to the archive (PDFs
+      of active quotes stay in the cache)
+    - archives files older than `output_max_age` written directly to the PDF
+      service's output directory
+    - optionally deletes archived PDFs older than `archive_max_age`
+    - publishes per-tier disk usage as metrics
+    Archived PDFs are restored into the cache when requested again (see PDFCache.restore).
+    """
+
+    def __init__(
+        self,
+        pdf_service: PDFService,
+        cache: PDFCache,
+        archive: PDFArchive,
+        load_quotes: Callable[[], List[Dict[str, Any]]],
+        interval: float = 3600.0,
+        archive_statuses: Iterable[str] = DEFAULT_ARCHIVE_STATUSES,
+        output_max_age: float = 30 * 86400,
+        archive_max_age: Optional[float] = None
+    ):
+        """
+        Initialize the manager.
+
+        Args:
+            pdf_service: Source of content keys and the output directory
+            cache: Hot PDF cache
+            archive: Where closed quotes' PDFs are moved
+            load_quotes: Returns every saved quote (with status and pdf_data)
+            interval: Seconds between sweeps
+            archive_statuses: Quote statuses whose PDFs are archived
+            output_max_age: Age after which files in the output directory are archived
+            archive_max_age: Age after which archived PDFs are deleted (None keeps them)
+        """
+        self.pdf_service = pdf_service
+        self.cache = cache
+        self.archive = archive
+        self.load_quotes = load_quotes
+        self.interval = interval
+        self.archive_statuses = set(archive_statuses)
+        self.output_max_age = output_max_age
+        self.archive_max_age = archive_max_age
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    @classmethod
+    def from_env(cls, pdf_service: PDFService, cache: PDFCache, archive: PDFArchive, load_quotes: Callable[[], List[Dict[str, Any]]]) -> "PDFRetentionManager":
+        """
+        Build a manager from PDF_RETENTION_INTERVAL_SECONDS, PDF_ARCHIVE_STATUSES,
+        PDF_OUTPUT_MAX_AGE_DAYS and PDF_ARCHIVE_MAX_AGE_DAYS.
+        """
+        archive_days = os.getenv("PDF_ARCHIVE_MAX_AGE_DAYS")
+        statuses = os.getenv("PDF_ARCHIVE_STATUSES")
+        return cls(
+            pdf_service, cache, archive, load_quotes,
+            interval=float(os.getenv("PDF_RETENTION_INTERVAL_SECONDS", "3600")),
+            archive_statuses=[s.strip() for s in statuses.split(",") if s.strip()] if statuses else DEFAULT_ARCHIVE_STATUSES,
+            output_max_age=float(os.getenv("PDF_OUTPUT_MAX_AGE_DAYS", "30")) * 86400,
+            archive_max_age=float(archive_days) * 86400 if archive_days else None
+        )
+
+    def start(self) -> None:
+        """Run sweeps on a daemon thread until stop()."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="pdf-retention", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def _run(self) -> None:
+        while not self._stop.is_set():
+            try:
+                self.sweep()
+            except Exception as e:
+                logger.error("PDF retention sweep failed: %s", e)
+            self._stop.wait(self.interval)
+
+    def sweep(self) -> Dict[str, int]:
+        """
+        Run one retention pass.
+
+        Returns:
+            Counts of PDFs archived from the cache and the output directory, and pruned from the archive
+        """
+        stats = {"archived_cache": 0, "archived_output": 0, "pruned": 0}
+
+        for quote in self.load_quotes():
+            if quote.get("status") not in self.archive_statuses or not quote.get("pdf_data"):
+                continue
+            key = self.pdf_service.content_key(quote["customer_name"], quote["pdf_data"], quote["quote_number"])
+            pdf_bytes = self.cache.get(key)
+            if pdf_bytes is None:
+                continue
+            name = f"{key}.pdf"
+            if name not in self.archive:
+                self.archive.put(name, pdf_bytes)
+                PDF_ARCHIVED.inc(source="cache")
+                stats["archived_cache"] += 1
+            self.cache.remove(key)
+
+        # Files written straight to the output directory (generate_quote_pdf, older releases)
+        cutoff = time.time() - self.output_max_age
+        for path in list(_walk_files(self.pdf_service.output_dir, skip=(self.cache.cache_dir, self.archive.root))):
+            if not path.endswith(".pdf"):
+                continue
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                with open(path, "rb") as f:
+                    self.archive.put(os.path.basename(path), f.read())
+                os.remove(path)
+            except FileNotFoundError:
+                # Deleted while we were looking (eviction or a concurrent request); nothing to archive
+                continue
+            PDF_ARCHIVED.inc(source="output")
+            stats["archived_output"] += 1
+
+        if self.archive_max_age is not None:
+            stats["pruned"] = self.archive.prune(self.archive_max_age)
+
+        for tier, (files, size) in self.usage().items():
+            PDF_STORAGE_FILES.set(files, tier=tier)
+            PDF_STORAGE_BYTES.set(size, tier=tier)
+        if any(stats.values()):
+            logger.info("PDF retention sweep", extra=stats)
+        return stats
+
+    def usage(self) -> Dict[str, Tuple[int, int]]:
+        """(files, bytes) per storage tier: cache, archive and output."""
+        return {
+            "cache": _disk_usage(self.cache.cache_dir),
+            "archive": _disk_usage(self.archive.root),
+            "output": _disk_usage(self.pdf_service.output_dir, skip=(self.cache.cache_dir, self.archive.root))
+        }
@@ -7,9 +7,16 @@ try:
     from fpdf import FPDF
 except ImportError:
     from fpdf2 import FPDF
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
 from datetime import datetime
+import hashlib
+import json
 import os
+from services.quote_ids import next_quote_number
+from services.pdf_cache import sharded_path
+from services.log_service import get_logger
+
+logger = get_logger("pdf")
 
 
 class PDFService:
@@ -19,14 +26,37 @@ class PDFService:
     NAVY_BLUE = (15, 23, 42)  # #0f172a
     TEAL_ACCENT = (45, 212, 191)  # #2dd4bf
     
-    def __init__(self, output_dir: str = "output"):
+    DEFAULT_BRANDING = {
+        "company_name": "VELOCITY LOGIC",
+        "tagline": "HVAC Solutions & Service",
+        "footer_lines": [
+            "Thank you for choosing Velocity Logic!",
+            "This quote is valid for 30 days from the date issued.",
+            "For questions, please contact us at your convenience."
+        ],
+        "primary_color": NAVY_BLUE,
+        "accent_color": TEAL_ACCENT
+    }
+    
+    def __init__(self, output_dir: str = "output", branding: Optional[Dict[str, Any]] = None):
         """
         Initialize PDF service.
         
         Args:
             output_dir: Directory to save generated PDFs
+            branding: Overrides for DEFAULT_BRANDING (company_name, tagline, footer_lines,
+                primary_color, accent_color); defaults to the JSON file at PDF_BRANDING_PATH
         """
         self.output_dir = output_dir
+        if branding is None:
+            branding = self._load_branding(os.getenv("PDF_BRANDING_PATH", "data/branding.json"))
+        self.branding = {**self.DEFAULT_BRANDING, **branding}
+        self.NAVY_BLUE = tuple(self.branding["primary_color"])
+        self.TEAL_ACCENT = tuple(self.branding["accent_color"])
+        # Part of every content_key, so a branding change re-renders cached PDFs
+        self.branding_key = hashlib.sha256(
+            json.dumps(self.branding, sort_keys=True, default=list).encode("utf-8")
+        ).hexdigest()[:16]
         os.makedirs(output_dir, exist_ok=True)
     
     def generate_quote_pdf(
@@ -36,7 +66,7 @@ class PDFService:
         quote_number: str = None
     ) -> str:
         """
-        Generate a professional PDF quote.
+        Generate a professional PDF quote and save it to output_dir.
         
         Args:
             customer_name: Name of the customer
@@ -47,19 +77,36 @@ class PDFService:
             Path to the generated PDF file
         """
         if quote_number is None:
-            quote_number = f"QT-{datetime.now().strftime('%Y%m%d-%H%M%S')}"
+            quote_number = next_quote_number()
+        return self.save_pdf(self.render_quote_pdf(customer_name, quote_data, quote_number), quote_number)
+    
+    def render_quote_pdf(
+        self,
+        customer_name: str,
+        quote_data: Dict[str, Any],
+        quote_number: str
+    ) -> bytes:
+        """
+        Render a professional PDF quote in memory.
         
-        filename = f"{self.output_dir}/quote_{quote_number}.pdf"
+        Args:
+            customer_name: Name of the customer
+            quote_data: Dictionary with line_items, subtotal, tax, total
+            quote_number: Quote number printed on the PDF
         
+        Returns:
+            The PDF document bytes
+        """
         pdf = FPDF()
         pdf.set_auto_page_break(auto=True, margin=15)
         pdf.add_page()
         
         # Header with branding
         self._draw_header(pdf)
+        self._draw_date(pdf)
         
         # Customer information
-        y_pos = self._draw_customer_info(pdf, customer_name, quote_number)
+        y_pos = self._draw_customer_info(pdf, customer_name, quote_number, quote_data)
         
         # Quote items table
         y_pos = self._draw_items_table(pdf, quote_data["line_items"], y_pos)
@@ -70,24 +117,68 @@ class PDFService:
         # Footer
         self._draw_footer(pdf)
         
-        pdf.output(filename)
-        print(f"✓ Generated PDF quote: {filename}")
+        return bytes(pdf.output())
+    
+    def pdf_filename(self, quote_number: str) -> str:
+        """File name a quote's PDF is saved and attached under."""
+        return f"quote_{quote_number}.pdf"
+    
+    def content_key(self, customer_name: str, quote_data: Dict[str, Any], quote_number: str) -> str:
+        """
+        Hash of everything a quote's PDF is rendered from, branding included.
+        
+        Returns:
+            Hex digest that changes whenever the rendered PDF would
+        """
+        payload = json.dumps(
+            {"customer_name": customer_name, "quote_data": quote_data, "quote_number": quote_number},
+            sort_keys=True, default=str
+        )
+        return hashlib.sha256(f"{self.branding_key}:{payload}".encode("utf-8")).hexdigest()
+    
+    def saved_path(self, quote_number: str) -> str:
+        """Where save_pdf() puts a quote's PDF, in one of 256 subdirectories of output_dir."""
+        return sharded_path(self.output_dir, self.pdf_filename(quote_number))
+    
+    def save_pdf(self, pdf_bytes: bytes, quote_number: str) -> str:
+        """
+        Write rendered PDF bytes to output_dir.
         
+        Returns:
+            Path to the saved PDF file
+        """
+        filename = self.saved_path(quote_number)
+        os.makedirs(os.path.dirname(filename), exist_ok=True)
+        with open(filename, 'wb') as f:
+            f.write(pdf_bytes)
+        logger.debug("Generated PDF quote: %s", filename)
         return filename
     
+    @staticmethod
+    def _load_branding(path: str) -> Dict[str, Any]:
+        if not os.path.exists(path):
+            return {}
+        try:
+            with open(path, 'r') as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            logger.warning("Ignoring branding file %s: %s", path, e)
+            return {}
+    
     def _draw_header(self, pdf: FPDF) -> None:
         """Draw the header with Velocity Logic branding."""
         # Company name in Navy Blue
         pdf.set_font("Arial", "B", 24)
         pdf.set_text_color(*self.NAVY_BLUE)
-        pdf.cell(0, 15, "VELOCITY LOGIC", ln=1, align="L")
+        pdf.cell(0, 15, self.branding["company_name"], ln=1, align="L")
         
         # Tagline
         pdf.set_font("Arial", "", 10)
         pdf.set_text_color(100, 100, 100)
-        pdf.cell(0, 5, "HVAC Solutions & Service", ln=1, align="L")
-        
-        # Date
+        pdf.cell(0, 5, self.branding["tagline"], ln=1, align="L")
+    
+    def _draw_date(self, pdf: FPDF) -> None:
+        """Draw the issue date below the header."""
         pdf.set_font("Arial", "", 10)
         pdf.set_text_color(0, 0, 0)
         pdf.ln(5)
@@ -95,7 +186,7 @@ class PDFService:
         
         pdf.ln(10)
     
-    def _draw_customer_info(self, pdf: FPDF, customer_name: str, quote_number: str) -> float:
+    def _draw_customer_info(self, pdf: FPDF, customer_name: str, quote_number: str, quote_data: Dict[str, Any]) -> float:
         """Draw customer information section."""
         pdf.set_font("Arial", "B", 12)
         pdf.set_text_color(*self.NAVY_BLUE)
@@ -246,7 +337,6 @@ class PDFService:
         pdf.set_y(-30)
         pdf.set_font("Arial", "", 8)
         pdf.set_text_color(100, 100, 100)
-        pdf.cell(0, 5, "Thank you for choosing Velocity Logic!", ln=1, align="C")
-        pdf.cell(0, 5, "This quote is valid for 30 days from the date issued.", ln=1, align="C")
-        pdf.cell(0, 5, "For questions, please contact us at your convenience.", ln=1, align="C")
+        for line in self.branding["footer_lines"]:
+            pdf.cell(0, 5, line, ln=1, align="C")
 
@@ -0,0 +1,237 @@
+"""
+Quote Pipeline
+Runs the parse -> price -> PDF -> compose -> draft stages on separate worker pools.
+"""
+
+import os
+import queue
+import threading
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Optional, Dict, Any, List
+
+from services.pricing_engine import PricingEngine, item_key
+from services.pdf_service import PDFService
+from services.metrics import STAGE_SECONDS, QUEUE_DEPTH, label_set
+from services.llm_client import LLMUnavailableError
+from services.email_preprocessor import EmptyEmailError
+from services.log_service import get_logger
+
+logger = get_logger("pipeline")
+
+
+# Per-process services for the CPU-bound stages (set by _init_cpu_worker)
+_worker_pricing_engine = None
+_worker_pdf_service = None
+
+
+def _init_cpu_worker(pricing_csv_path: str, labour_rates_path: str, output_dir: str, branding: Optional[Dict[str, Any]] = None) -> None:
+    """Load pricing data and PDF settings once per worker process."""
+    global _worker_pricing_engine, _worker_pdf_service
+    _worker_pricing_engine = PricingEngine(pricing_csv_path, labour_rates_path)
+    _worker_pdf_service = PDFService(output_dir, branding=branding)
+
+
+def _price_in_worker(extracted_items: List[Dict[str, Any]], pricing_options: Dict[str, Any], priced_items: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    return _worker_pricing_engine.calculate_quote(extracted_items, priced_items=priced_items, **pricing_options)
+
+
+def _render_in_worker(customer_name: str, quote_data: Dict[str, Any], quote_number: str) -> bytes:
+    return _worker_pdf_service.render_quote_pdf(
+        customer_name=customer_name,
+        quote_data=quote_data,
+        quote_number=quote_number
+    )
+
+
+class QuotePipeline:
+    """
+    Staged worker pipeline for VelocityLogicAgent.
+
+    Each stage has its own worker threads reading from a bounded input queue,
+    so a slow stage (the LLM) applies backpressure instead of starving the
+    others. The I/O-bound stages (parse, draft) run directly on their threads;
+    the CPU-bound stages (price, PDF) hand work to a shared process pool so
+    PDF rendering can use every core while LLM calls are in flight.
+    """
+
+    STAGES = ("parse", "price", "pdf", "compose", "draft")
+
+    DEFAULT_CONCURRENCY = {
+        "parse": 8,
+        "price": 2,
+        "pdf": os.cpu_count() or 2,
+        "compose": 1,
+        "draft": 4
+    }
+
+    _STOP = object()
+
+    def __init__(
+        self,
+        agent,
+        concurrency: Optional[Dict[str, int]] = None,
+        queue_size: int = 32,
+        use_processes: bool = True
+    ):
+        """
+        Initialize the pipeline.
+
+        Args:
+            agent: VelocityLogicAgent whose stage methods and services are used
+            concurrency: Workers per stage, overriding DEFAULT_CONCURRENCY
+            queue_size: Capacity of the queue in front of each stage
+            use_processes: Run pricing and PDF rendering in a process pool
+        """
+        self.agent = agent
+        self.concurrency = {**self.DEFAULT_CONCURRENCY, **(concurrency or {})}
+        self.queue_size = queue_size
+        self.use_processes = use_processes
+        self._queues = [queue.Queue(maxsize=queue_size) for _ in self.STAGES]
+        self._threads: Dict[str, List[threading.Thread]] = {}
+        self._process_pool = None
+
+    @classmethod
+    def from_env(cls, agent) -> "QuotePipeline":
+        """
+        Build a pipeline configured from environment variables.
+
+        PIPELINE_<STAGE>_WORKERS sets per-stage concurrency (e.g.
+        PIPELINE_PDF_WORKERS=8), PIPELINE_QUEUE_SIZE the queue capacity and
+        PIPELINE_USE_PROCESSES=false keeps CPU stages on threads.
+        """
+        concurrency = {}
+        for stage in cls.STAGES:
+            value = os.getenv(f"PIPELINE_{stage.upper()}_WORKERS")
+            if value:
+                concurrency[stage] = int(value)
+        return cls(
+            agent,
+            concurrency=concurrency,
+            queue_size=int(os.getenv("PIPELINE_QUEUE_SIZE", "32")),
+            use_processes=os.getenv("PIPELINE_USE_PROCESSES", "true").lower() != "false"
+        )
+
+    def start(self) -> None:
+        """Start the process pool and stage worker threads."""
+        if self.use_processes:
+            pricing = self.agent.pricing_engine
+            self._process_pool = ProcessPoolExecutor(
+                max_workers=max(self.concurrency["price"], self.concurrency["pdf"]),
+                initializer=_init_cpu_worker,
+                initargs=(
+                    pricing.pricing_csv_path, pricing.labour_rates_path,
+                    self.agent.pdf_service.output_dir, self.agent.pdf_service.branding
+                )
+            )
+
+        QUEUE_DEPTH.set_function(
+            lambda: {label_set(stage=stage): depth for stage, depth in self.queue_depths().items()}
+        )
+
+        for index, stage in enumerate(self.STAGES):
+            self._threads[stage] = []
+            for n in range(self.concurrency[stage]):
+                thread = threading.Thread(
+                    target=self._run_stage,
+                    args=(index,),
+                    name=f"pipeline-{stage}-{n}",
+                    daemon=True
+                )
+                thread.start()
+                self._threads[stage].append(thread)
+
+    def submit(self, job: Dict[str, Any], stage: str = "parse") -> Future:
+        """
+        Queue a job (see VelocityLogicAgent._new_job) for processing.
+
+        Blocks while the first stage's queue is full.
+
+        Args:
+            job: Job dictionary
+            stage: Stage to start at; jobs parsed elsewhere (batch mode) start at "price"
+
+        Returns:
+            Future resolving to the process_email-style result dictionary
+        """
+        job["future"] = Future()
+        self._queues[self.STAGES.index(stage)].put(job)
+        return job["future"]
+
+    def queue_depths(self) -> Dict[str, int]:
+        """Approximate number of jobs waiting in front of each stage."""
+        return {stage: q.qsize() for stage, q in zip(self.STAGES, self._queues)}
+
+    def shutdown(self) -> None:
+        """Drain in-flight jobs stage by stage, then stop all workers."""
+        for index, stage in enumerate(self.STAGES):
+            for _ in self._threads.get(stage, []):
+                self._queues[index].put(self._STOP)
+            for thread in self._threads.get(stage, []):
+                thread.join()
+        if self._process_pool is not None:
+            self._process_pool.shutdown()
+            self._process_pool = None
+
+    def _run_stage(self, index: int) -> None:
+        stage = self.STAGES[index]
+        handler = getattr(self, f"_{stage}")
+        in_queue = self._queues[index]
+
+        while True:
+            job = in_queue.get()
+            if job is self._STOP:
+                break
+
+            try:
+                with STAGE_SECONDS.time(stage=stage):
+                    handler(job)
+            except Exception as e:
+                if isinstance(e, LLMUnavailableError):
+                    logger.warning("LLM unavailable in %s stage: %s", stage, e)
+                elif isinstance(e, EmptyEmailError):
+                    logger.warning("Email not quoted: %s", e)
+                else:
+                    logger.exception("Error in %s stage: %s", stage, e)
+                job["future"].set_result(self.agent._error_result(e))
+                continue
+
+            if index + 1 < len(self.STAGES):
+                # Blocks while the next stage is saturated (backpressure)
+                self._queues[index + 1].put(job)
+            else:
+                try:
+                    job["future"].set_result(self.agent._build_result(job))
+                except Exception as e:
+                    job["future"].set_result({"success": False, "error": str(e)})
+
+    def _parse(self, job: Dict[str, Any]) -> None:
+        self.agent._stage_parse(job)
+
+    def _price(self, job: Dict[str, Any]) -> None:
+        if self._process_pool is None:
+            self.agent._stage_price(job)
+            return
+        if job.get("priced_items") and all(item_key(item) in job["priced_items"] for item in job["extracted_items"]):
+            # Everything was priced while the LLM streamed; only the totals are left
+            self.agent._stage_price(job)
+            return
+        job["quote_data"] = self._process_pool.submit(
+            _price_in_worker, job["extracted_items"], job["pricing_options"], job.get("priced_items")
+        ).result()
+        self.agent._report_pricing(job)
+
+    def _pdf(self, job: Dict[str, Any]) -> None:
+        if self._process_pool is None:
+            self.agent._stage_pdf(job)
+            return
+        quote_number = self.agent._assign_quote_number(job)
+        # Only cache misses go to the pool
+        self.agent._attach_pdf(job, quote_number, lambda: self._process_pool.submit(
+            _render_in_worker, job["customer_name"], job["quote_data"], quote_number
+        ).result())
+
+    def _compose(self, job: Dict[str, Any]) -> None:
+        self.agent._stage_compose(job)
+
+    def _draft(self, job: Dict[str, Any]) -> None:
+        self.agent._stage_draft(job)
@@ -5,10 +5,18 @@ Handles loading pricing data and calculating quotes with fuzzy matching.
 
 import pandas as pd
 import os
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 import json
-from typing import Dict, List, Any
 from thefuzz import fuzz, process
+from services.service_catalog import ServiceCatalog
+from services.log_service import get_logger
+
+logger = get_logger("pricing")
+
+
+def item_key(item: Dict[str, Any]) -> str:
+    """Identity of an extracted item, for matching pre-priced items to the final list."""
+    return json.dumps(item, sort_keys=True, default=str)
 
 
 class PricingEngine:
@@ -25,6 +33,7 @@ class PricingEngine:
         self.pricing_csv_path = pricing_csv_path
         self.labour_rates_path = labour_rates_path
         self.df = None
+        self.catalog = None
         self.labour_rates = {}
         self.load_pricing_data()
         self.load_labour_rates()
@@ -35,9 +44,9 @@ class PricingEngine:
             if os.path.exists(self.labour_rates_path):
                 with open(self.labour_rates_path, 'r') as f:
                     self.labour_rates = json.load(f)
-                print(f"✓ Loaded regional labour rates from {self.labour_rates_path}")
+                logger.info("Loaded regional labour rates from %s", self.labour_rates_path)
         except Exception as e:
-            print(f"✗ Warning: Failed to load labour rates: {e}")
+            logger.warning("Failed to load labour rates: %s", e)
             self.labour_rates = {}
 
     def get_labour_premium(self, province: str, city: str) -> float:
@@ -65,10 +74,16 @@ class PricingEngine:
             # Convert Unit Price to float
             self.df["Unit Price"] = pd.to_numeric(self.df["Unit Price"], errors="coerce")
             
-            print(f"✓ Loaded {len(self.df)} pricing items from {self.pricing_csv_path}")
+            # ID and exact-name lookups, and the shortlists used in LLM prompts
+            self.catalog = ServiceCatalog(
+                self.df.to_dict("records"),
+                shortlist_size=int(os.getenv("CATALOG_SHORTLIST_SIZE", "8"))
+            )
+            
+            logger.info("Loaded %d pricing items from %s", len(self.df), self.pricing_csv_path)
             
         except Exception as e:
-            print(f"✗ Error loading pricing data: {e}")
+            logger.error("Error loading pricing data: %s", e)
             raise
     
     def _fuzzy_match_service(self, service_request: str, threshold: int = 60) -> Dict[str, Any]:
@@ -116,28 +131,57 @@ class PricingEngine:
         
         return None
     
-    def calculate_quote(self, extracted_items: List[Dict[str, Any]], tax_rate: float = 0.10, markup_percent: float = 0.0, winter_multiplier_active: bool = False, city: str = None, province: str = None) -> Dict[str, Any]:
+    def _match_service(self, item: Dict[str, Any]) -> Dict[str, Any]:
         """
-        Calculate quote from extracted items.
+        Find the pricing row for an extracted item.
+        
+        Catalog IDs (from the LLM) and exact service names (from the rules)
+        are plain dictionary lookups; only free-text requests are fuzzy matched.
         
         Args:
-            extracted_items: List of dicts with 'service_requested' and 'quantity' keys
-            tax_rate: Tax rate as decimal (default 10%)
+            item: Extracted item with 'service_id' and/or 'service_requested'
+        
+        Returns:
+            Dictionary with matched service row and match_method, or None
+        """
+        for method, row in (
+            ("id", self.catalog.get(item.get("service_id"))),
+            ("name", self.catalog.by_name(item.get("service_requested")))
+        ):
+            if row is not None:
+                return {**row, "match_score": 100, "match_method": method}
+        
+        service_requested = (item.get("service_requested") or "").strip()
+        if not service_requested:
+            return None
+        matched_row = self._fuzzy_match_service(service_requested)
+        if matched_row is not None:
+            matched_row["match_method"] = "fuzzy"
+        return matched_row
+    
+    def price_item(self, item: Dict[str, Any], markup_percent: float = 0.0, winter_multiplier_active: bool = False, city: str = None, province: str = None) -> Optional[Dict[str, Any]]:
+        """
+        Price one extracted item.
+        
+        Args:
+            item: Dict with 'service_requested' and/or 'service_id', and 'quantity'
             markup_percent: Optional markup percentage (e.g., 0.20 for 20%)
             winter_multiplier_active: Whether to apply the +30% frozen ground surcharge
             city: Customer city for regional labour premium
             province: Customer province
         
         Returns:
-            Dictionary with line_items, subtotal, tax, and total
+            Dictionary with the line_item and its unrounded line_total,
+            winter_surcharge and regional_premium, or None for an empty item
         """
         if self.df is None:
             raise ValueError("Pricing data not loaded")
         
-        line_items = []
-        subtotal = 0.0
-        winter_surcharge_total = 0.0
-        regional_premium_total = 0.0
+        service_requested = (item.get("service_requested") or "").strip()
+        quantity = item.get("quantity", 1)
+        
+        if not service_requested and not item.get("service_id"):
+            return None
         
         # Regional Labour Premium
         regional_multiplier = 1.0
@@ -149,72 +193,109 @@ class PricingEngine:
         winter_multiplier = 1.30 if winter_multiplier_active else 1.0
         markup_multiplier = 1.0 + markup_percent
         
+        # Try to match the service
+        matched_service = self._match_service(item)
+        
+        if not matched_service:
+            # If no match found, add as unknown item with zero price
+            logger.warning("Could not match service '%s'", service_requested or item.get("service_id"))
+            line_item = {
+                "service_name": service_requested or str(item.get("service_id")),
+                "description": "Service not found in pricing database",
+                "quantity": quantity,
+                "unit_price": 0.0,
+                "unit": "Each",
+                "line_total": 0.0,
+                "match_score": 0,
+                "needs_price": True
+            }
+            return {"line_item": line_item, "line_total": 0.0, "winter_surcharge": 0.0, "regional_premium": 0.0}
+        
+        base_unit_price = float(matched_service.get("Unit Price", 0))
+        
+        # Apply multipliers: Base * Markup * Regional * Winter
+        final_unit_price = base_unit_price * markup_multiplier * regional_multiplier * winter_multiplier
+        line_total = final_unit_price * quantity
+        
+        # Surcharge breakdowns for visibility
+        winter_surcharge = (base_unit_price * markup_multiplier * regional_multiplier * 0.30) * quantity if winter_multiplier_active else 0
+        regional_premium_amt = (base_unit_price * markup_multiplier * premium_rate) * quantity if premium_rate > 0 else 0
+        
+        # Build AI Reasoning hint
+        ai_reasoning = f"Market rate for {matched_service.get('Service Name')}"
+        if markup_percent > 0:
+            ai_reasoning += f" + {int(markup_percent*100)}% standard markup"
+        if premium_rate > 0:
+            ai_reasoning += f" + {int(premium_rate*100)}% {city} labour premium"
+        if winter_multiplier_active:
+            ai_reasoning += " + 30% winter condition surcharge"
+
+        line_item = {
+            "service_name": matched_service.get("Service Name", service_requested),
+            "description": matched_service.get("Description", ""),
+            "quantity": quantity,
+            "unit_price": round(final_unit_price, 2),
+            "base_price": base_unit_price,
+            "unit": matched_service.get("Unit", "Each"),
+            "line_total": round(line_total, 2),
+            "match_score": matched_service.get("match_score", 0),
+            "match_method": matched_service.get("match_method", "fuzzy"),
+            "winter_multiplier_active": winter_multiplier_active,
+            "winter_surcharge": round(winter_surcharge, 2),
+            "regional_premium_active": premium_rate > 0,
+            "regional_premium_amount": round(regional_premium_amt, 2),
+            "city": city,
+            "ai_reasoning": ai_reasoning
+        }
+        return {
+            "line_item": line_item,
+            "line_total": line_total,
+            "winter_surcharge": winter_surcharge,
+            "regional_premium": regional_premium_amt
+        }
+    
+    def calculate_quote(self, extracted_items: List[Dict[str, Any]], tax_rate: float = 0.10, markup_percent: float = 0.0, winter_multiplier_active: bool = False, city: str = None, province: str = None, priced_items: Optional[Dict[str, Dict[str, Any]]] = None) -> Dict[str, Any]:
+        """
+        Calculate quote from extracted items.
+        
+        Args:
+            extracted_items: List of dicts with 'service_requested' and/or 'service_id', and 'quantity' keys
+            tax_rate: Tax rate as decimal (default 10%)
+            markup_percent: Optional markup percentage (e.g., 0.20 for 20%)
+            winter_multiplier_active: Whether to apply the +30% frozen ground surcharge
+            city: Customer city for regional labour premium
+            province: Customer province
+            priced_items: price_item results computed earlier (e.g. while the LLM was
+                still streaming), keyed by item_key(item) for the same pricing options
+        
+        Returns:
+            Dictionary with line_items, subtotal, tax, and total
+        """
+        if self.df is None:
+            raise ValueError("Pricing data not loaded")
+        
+        line_items = []
+        subtotal = 0.0
+        winter_surcharge_total = 0.0
+        regional_premium_total = 0.0
+        
         for item in extracted_items:
-            service_requested = item.get("service_requested", "").strip()
-            quantity = item.get("quantity", 1)
-            
-            if not service_requested:
+            priced = (priced_items or {}).get(item_key(item))
+            if priced is None:
+                priced = self.price_item(
+                    item,
+                    markup_percent=markup_percent,
+                    winter_multiplier_active=winter_multiplier_active,
+                    city=city,
+                    province=province
+                )
+            if priced is None:
                 continue
             
-            # Try to match the service
-            matched_service = self._fuzzy_match_service(service_requested)
-            
-            if matched_service:
-                base_unit_price = float(matched_service.get("Unit Price", 0))
-                
-                # Apply multipliers: Base * Markup * Regional * Winter
-                final_unit_price = base_unit_price * markup_multiplier * regional_multiplier * winter_multiplier
-                line_total = final_unit_price * quantity
-                
-                # Surcharge breakdowns for visibility
-                winter_surcharge = (base_unit_price * markup_multiplier * regional_multiplier * 0.30) * quantity if winter_multiplier_active else 0
-                regional_premium_amt = (base_unit_price * markup_multiplier * premium_rate) * quantity if premium_rate > 0 else 0
-                
-                winter_surcharge_total += winter_surcharge
-                regional_premium_total += regional_premium_amt
-                
-                # Build AI Reasoning hint
-                ai_reasoning = f"Market rate for {matched_service.get('Service Name')}"
-                if markup_percent > 0:
-                    ai_reasoning += f" + {int(markup_percent*100)}% standard markup"
-                if premium_rate > 0:
-                    ai_reasoning += f" + {int(premium_rate*100)}% {city} labour premium"
-                if winter_multiplier_active:
-                    ai_reasoning += " + 30% winter condition surcharge"
-
-                line_item = {
-                    "service_name": matched_service.get("Service Name", service_requested),
-                    "description": matched_service.get("Description", ""),
-                    "quantity": quantity,
-                    "unit_price": round(final_unit_price, 2),
-                    "base_price": base_unit_price,
-                    "unit": matched_service.get("Unit", "Each"),
-                    "line_total": round(line_total, 2),
-                    "match_score": matched_service.get("match_score", 0),
-                    "winter_multiplier_active": winter_multiplier_active,
-                    "winter_surcharge": round(winter_surcharge, 2),
-                    "regional_premium_active": premium_rate > 0,
-                    "regional_premium_amount": round(regional_premium_amt, 2),
-                    "city": city,
-                    "ai_reasoning": ai_reasoning
-                }
-                
-                line_items.append(line_item)
-                subtotal += line_total
-            else:
-                # If no match found, add as unknown item with zero price
-                print(f"⚠ Warning: Could not match service '{service_requested}'")
-                line_item = {
-                    "service_name": service_requested,
-                    "description": "Service not found in pricing database",
-                    "quantity": quantity,
-                    "unit_price": 0.0,
-                    "unit": "Each",
-                    "line_total": 0.0,
-                    "match_score": 0,
-                    "needs_price": True
-                }
-                line_items.append(line_item)
+            line_items.append(priced["line_item"])
+            subtotal += priced["line_total"]
+            winter_surcharge_total += priced["winter_surcharge"]
+            regional_premium_total += priced["regional_premium"]
         
         tax = subtotal * tax_rate
         total = subtotal + tax
@@ -231,4 +312,3 @@ class PricingEngine:
             "regional_premium_total": round(regional_premium_total, 2),
             "city": city
         }
-
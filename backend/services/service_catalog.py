@@ -0,0 +1,130 @@
+"""
+Service Catalog
+Stable service IDs for pricing rows, and per-email shortlists of relevant
+services for the LLM prompt.
+"""
+
+import hashlib
+import re
+import threading
+from collections import OrderedDict
+from typing import Optional, Dict, Any, List
+
+from services.intent_rules import tokenize
+from services.llm_cache import normalize_email_body
+
+
+def service_id_for(row: Dict[str, Any]) -> str:
+    """The row's `Service ID` column if it has one, otherwise a slug of its name."""
+    explicit = str(row.get("Service ID") or "").strip()
+    if explicit and explicit.lower() != "nan":
+        return explicit
+    return re.sub(r"[^a-z0-9]+", "-", str(row["Service Name"]).lower()).strip("-")
+
+
+class ServiceCatalog:
+    """
+    Pricing catalog rows indexed by service ID and exact name.
+
+    `shortlist()` picks the few rows an email is most likely about, by the
+    same inverse-frequency keyword weights as the rule-based parser. Only
+    those go into the prompt, so the prompt stays the same size however large
+    the catalog grows. Rendered shortlists are cached per normalized email body.
+    """
+
+    # Keywords rendered per entry; keeps each prompt line short
+    MAX_KEYWORDS = 6
+
+    def __init__(self, rows: List[Dict[str, Any]], shortlist_size: int = 8, cache_size: int = 1024):
+        """
+        Initialize the catalog.
+
+        Args:
+            rows: Pricing rows (dicts with Service Name, Keywords, Unit, Unit Price)
+            shortlist_size: Maximum entries in a shortlist
+            cache_size: Rendered shortlists kept in memory
+        """
+        self.shortlist_size = shortlist_size
+        self.cache_size = cache_size
+        self._by_id: Dict[str, Dict[str, Any]] = {}
+        self._by_name: Dict[str, Dict[str, Any]] = {}
+        self._lines: Dict[str, str] = {}
+        self._row_tokens: Dict[str, set] = {}
+
+        document_frequency: Dict[str, int] = {}
+        for row in rows:
+            service_id = service_id_for(row)
+            self._by_id[service_id] = row
+            self._by_name[str(row["Service Name"]).strip().lower()] = row
+
+            keywords = [k.strip() for k in str(row.get("Keywords") or "").split(",") if k.strip() and k.strip().lower() != "nan"]
+            self._lines[service_id] = " | ".join((
+                service_id,
+                str(row["Service Name"]),
+                str(row.get("Unit") or "Each"),
+                ", ".join(keywords[:self.MAX_KEYWORDS])
+            ))
+
+            tokens = set(tokenize(str(row["Service Name"]) + " " + " ".join(keywords)))
+            self._row_tokens[service_id] = tokens
+            for token in tokens:
+                document_frequency[token] = document_frequency.get(token, 0) + 1
+
+        self._weights = {token: 1.0 / count for token, count in document_frequency.items()}
+        self.version = hashlib.sha256("\n".join(self._lines.values()).encode("utf-8")).hexdigest()[:12]
+
+        self._cache: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, service_id: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Row for a service ID, or None for unknown IDs."""
+        if not service_id:
+            return None
+        return self._by_id.get(str(service_id).strip())
+
+    def by_name(self, service_name: Optional[str]) -> Optional[Dict[str, Any]]:
+        """Row whose Service Name matches exactly (case-insensitive), or None."""
+        if not service_name:
+            return None
+        return self._by_name.get(service_name.strip().lower())
+
+    def shortlist(self, email_body: str) -> List[str]:
+        """
+        IDs of the catalog entries most relevant to an email, best first.
+
+        Args:
+            email_body: The email body text
+
+        Returns:
+            Up to shortlist_size service IDs sharing keywords with the email
+        """
+        tokens = set(tokenize(email_body))
+        scored = []
+        for service_id, row_tokens in self._row_tokens.items():
+            score = sum(self._weights[token] for token in tokens & row_tokens)
+            if score > 0:
+                scored.append((score, service_id))
+        # Stable sort keeps catalog order between equal scores
+        scored.sort(key=lambda pair: pair[0], reverse=True)
+        return [service_id for _, service_id in scored[:self.shortlist_size]]
+
+    def render_shortlist(self, email_body: str) -> str:
+        """
+        Shortlist as compact prompt lines (`id | name | unit | keywords`).
+
+        Returns:
+            The rendered lines, or an empty string when nothing in the catalog is relevant
+        """
+        key = normalize_email_body(email_body)
+        with self._lock:
+            if key in self._cache:
+                self._cache.move_to_end(key)
+                return self._cache[key]
+
+        rendered = "\n".join(self._lines[service_id] for service_id in self.shortlist(email_body))
+
+        with self._lock:
+            self._cache[key] = rendered
+            if len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+        return rendered
@@ -8,6 +8,7 @@ import logging
 from typing import Optional
 from twilio.rest import Client
 from twilio.base.exceptions import TwilioRestException
+from services.metrics import external_call
 
 class SMSService:
     def __init__(self):
@@ -35,11 +36,12 @@ class SMSService:
         )
         
         try:
-            self.client.messages.create(
-                body=message_body,
-                from_=self.from_number,
-                to=to_number
-            )
+            with external_call("twilio", "messages.create"):
+                self.client.messages.create(
+                    body=message_body,
+                    from_=self.from_number,
+                    to=to_number
+                )
             return True
         except TwilioRestException as e:
             logging.error(f"Twilio error: {e}")
@@ -53,11 +55,12 @@ class SMSService:
             return True
             
         try:
-            self.client.messages.create(
-                body=message,
-                from_=self.from_number,
-                to=to_number
-            )
+            with external_call("twilio", "messages.create"):
+                self.client.messages.create(
+                    body=message,
+                    from_=self.from_number,
+                    to=to_number
+                )
             return True
         except TwilioRestException as e:
             logging.error(f"Twilio error: {e}")
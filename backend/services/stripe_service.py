@@ -1,6 +1,7 @@
 import os
 import stripe
 from typing import Optional, Dict, Any
+from services.metrics import external_call
 
 class StripeService:
     """Handles Stripe payment link generation and payment status tracking."""
@@ -22,26 +23,27 @@ class StripeService:
         try:
             # Create a simple product/price for the quote
             # In production, you'd likely reuse products or create one-time line items
-            session = stripe.checkout.Session.create(
-                payment_method_types=['card'],
-                line_items=[{
-                    'price_data': {
-                        'currency': 'cad',
-                        'product_data': {
-                            'name': f"Quote {quote_id} - {customer_name}",
+            with external_call("stripe", "checkout.session.create"):
+                session = stripe.checkout.Session.create(
+                    payment_method_types=['card'],
+                    line_items=[{
+                        'price_data': {
+                            'currency': 'cad',
+                            'product_data': {
+                                'name': f"Quote {quote_id} - {customer_name}",
+                            },
+                            'unit_amount': int(amount * 100), # Stripe uses cents
                         },
-                        'unit_amount': int(amount * 100), # Stripe uses cents
-                    },
-                    'quantity': 1,
-                }],
-                mode='payment',
-                success_url='https://velocitylogic.app/success?session_id={CHECKOUT_SESSION_ID}',
-                cancel_url='https://velocitylogic.app/cancel',
-                metadata={
-                    'quote_id': quote_id,
-                    'customer_name': customer_name
-                }
-            )
+                        'quantity': 1,
+                    }],
+                    mode='payment',
+                    success_url='https://velocitylogic.app/success?session_id={CHECKOUT_SESSION_ID}',
+                    cancel_url='https://velocitylogic.app/cancel',
+                    metadata={
+                        'quote_id': quote_id,
+                        'customer_name': customer_name
+                    }
+                )
             return session.url
         except Exception as e:
             print(f"✗ Stripe Error: {e}")
@@ -53,7 +55,8 @@ class StripeService:
             return "PAID" if "mock" in session_id else "UNPAID"
             
         try:
-            session = stripe.checkout.Session.retrieve(session_id)
+            with external_call("stripe", "checkout.session.retrieve"):
+                session = stripe.checkout.Session.retrieve(session_id)
             return session.payment_status.upper() # 'paid', 'unpaid', 'no_payment_required'
         except Exception as e:
             print(f"✗ Stripe Retrieve Error: {e}")
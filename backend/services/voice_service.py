@@ -4,12 +4,14 @@ Handles audio transcription using Whisper.
 """
 
 import os
-import whisper
 from typing import Optional
+from services.metrics import external_call
 
 class VoiceService:
     def __init__(self, model_name: str = "base"):
         """Initialize Whisper model."""
+        # Imported here so importing this module doesn't pull in torch
+        import whisper
         print(f"🎙 Loading Whisper model: {model_name}...")
         self.model = whisper.load_model(model_name)
         print("✓ Whisper model loaded")
@@ -22,7 +24,8 @@ class VoiceService:
                 return None
             
             print(f"🎙 Transcribing {audio_path}...")
-            result = self.model.transcribe(audio_path)
+            with external_call("whisper", "transcribe"):
+                result = self.model.transcribe(audio_path)
             text = result.get("text", "").strip()
             print(f"✓ Transcription complete: '{text[:50]}...'")
             return text
@@ -0,0 +1,56 @@
+"""
+Velocity Logic - Stub Pub/Sub Publisher
+Sends a Gmail-style push notification to a locally running web interface.
+
+Usage:
+    python stub_publisher.py --history-id 12345
+"""
+
+import argparse
+import base64
+import json
+import urllib.request
+import uuid
+from datetime import datetime, timezone
+
+
+def build_envelope(email_address: str, history_id: str, subscription: str) -> dict:
+    """Build a push envelope in the shape Pub/Sub delivers Gmail notifications."""
+    data = json.dumps({"emailAddress": email_address, "historyId": history_id})
+    return {
+        "message": {
+            "data": base64.b64encode(data.encode("utf-8")).decode("ascii"),
+            "messageId": uuid.uuid4().hex,
+            "publishTime": datetime.now(timezone.utc).isoformat()
+        },
+        "subscription": subscription
+    }
+
+
+def main():
+    """Main entry point."""
+    parser = argparse.ArgumentParser(description="Publish a stub Gmail push notification")
+    parser.add_argument("--url", default="http://localhost:5001/api/webhook/gmail")
+    parser.add_argument("--email", default="me@example.com")
+    parser.add_argument("--history-id", default="1")
+    parser.add_argument("--subscription", default="projects/local/subscriptions/gmail-push")
+    parser.add_argument("--token", help="Value of GMAIL_PUSH_TOKEN, if the server requires one")
+    args = parser.parse_args()
+    
+    url = args.url
+    if args.token:
+        url += f"?token={args.token}"
+    
+    envelope = build_envelope(args.email, args.history_id, args.subscription)
+    req = urllib.request.Request(
+        url,
+        data=json.dumps(envelope).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+        method="POST"
+    )
+    with urllib.request.urlopen(req) as response:
+        print(f"✓ Published notification (HTTP {response.status})")
+
+
+if __name__ == "__main__":
+    main()
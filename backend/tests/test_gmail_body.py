@@ -0,0 +1,86 @@
+"""Tests for reading message bodies out of Gmail payloads."""
+
+import base64
+
+from services.gmail_service import extract_message_body
+
+
+def _data(text, encoding="utf-8"):
+    return base64.urlsafe_b64encode(text.encode(encoding)).decode("ascii")
+
+
+def _part(mime_type, text=None, parts=None, **extra):
+    part = {"mimeType": mime_type, "body": {"data": _data(text)} if text is not None else {}}
+    if parts is not None:
+        part["parts"] = parts
+    part.update(extra)
+    return part
+
+
+def test_plain_text_found_in_nested_outlook_style_message():
+    payload = _part("multipart/mixed", parts=[
+        _part("multipart/related", parts=[
+            _part("multipart/alternative", parts=[
+                _part("text/plain", "Need a furnace installed"),
+                _part("text/html", "<p>Need a furnace installed</p>"),
+            ]),
+            _part("image/png", "not really a png", filename="logo.png"),
+        ]),
+        _part("application/pdf", "%PDF", filename="plans.pdf"),
+    ])
+
+    assert extract_message_body(payload) == "Need a furnace installed"
+
+
+def test_html_used_when_there_is_no_plain_text_part():
+    payload = _part("multipart/alternative", parts=[
+        _part("text/html", "<html><body><p>Two AC units</p><script>x()</script></body></html>"),
+    ])
+
+    assert extract_message_body(payload).strip() == "Two AC units"
+
+
+def test_attachments_are_skipped_even_if_they_are_text():
+    payload = _part("multipart/mixed", parts=[
+        _part("text/plain", "attached notes", headers=[{"name": "Content-Disposition", "value": "attachment"}]),
+        _part("text/plain", "The actual request"),
+    ])
+
+    assert extract_message_body(payload) == "The actual request"
+
+
+def test_parts_are_read_in_document_order():
+    payload = _part("multipart/mixed", parts=[
+        _part("multipart/alternative", parts=[_part("text/plain", "first")]),
+        _part("text/plain", "second"),
+    ])
+
+    assert extract_message_body(payload) == "first"
+
+
+def test_body_is_cut_at_max_bytes():
+    payload = _part("text/plain", "x" * 10000)
+
+    assert extract_message_body(payload, max_bytes=1000) == "x" * 1000
+
+
+def test_byte_cap_in_the_middle_of_a_multibyte_character():
+    payload = _part("text/plain", "é" * 100)
+
+    body = extract_message_body(payload, max_bytes=11)
+
+    assert body.startswith("é" * 5)
+    assert len(body.encode("utf-8")) <= 11 + 3
+
+
+def test_declared_charset_is_used():
+    part = _part("text/plain", headers=[{"name": "Content-Type", "value": 'text/plain; charset="iso-8859-1"'}])
+    part["body"]["data"] = _data("Café", encoding="iso-8859-1")
+
+    assert extract_message_body(part) == "Café"
+
+
+def test_message_without_text_is_empty():
+    payload = _part("multipart/mixed", parts=[_part("application/pdf", "%PDF", filename="quote.pdf")])
+
+    assert extract_message_body(payload) == ""
@@ -0,0 +1,55 @@
+"""Tests for the Gmail Pub/Sub push webhook and Mailbox.note_push."""
+
+import base64
+import json
+import os
+
+import pytest
+
+from harness.fakes import FaultInjector
+from harness.replay import Harness
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def harness(tmp_path, monkeypatch):
+    monkeypatch.chdir(BACKEND_DIR)
+    monkeypatch.delenv("GMAIL_PUSH_TOKEN", raising=False)
+    h = Harness(FaultInjector(seed=1), str(tmp_path))
+    yield h
+    h.shutdown()
+
+
+def _push(client, notification):
+    data = base64.b64encode(json.dumps(notification).encode("utf-8")).decode("ascii")
+    return client.post("/api/webhook/gmail", json={"message": {"data": data}})
+
+
+@pytest.mark.parametrize("history_id", ["not-a-number", None, [1]])
+def test_invalid_history_id_is_acknowledged_and_ignored(harness, history_id):
+    client = harness.install_web_fakes().test_client()
+    harness.agent.loop_running = True  # don't start a background sync
+
+    response = _push(client, {"emailAddress": "me@example.com", "historyId": history_id})
+
+    assert response.status_code == 204
+    assert all(mailbox.pushed_history_id is None for mailbox in harness.agent.mailboxes.all())
+
+
+def test_undecodable_message_is_acknowledged(harness):
+    client = harness.install_web_fakes().test_client()
+
+    response = client.post("/api/webhook/gmail", json={"message": {"data": "%%%"}})
+
+    assert response.status_code == 204
+
+
+def test_note_push_keeps_the_newest_valid_history_id(harness):
+    mailbox = harness.agent.mailboxes.all()[0]
+
+    mailbox.note_push("1200")
+    mailbox.note_push("garbage")
+    mailbox.note_push("1100")
+
+    assert mailbox.pushed_history_id == "1200"
@@ -0,0 +1,52 @@
+"""Tests for the agent's inbox loop against the harness's fake Gmail."""
+
+import os
+
+import pytest
+
+from harness.fakes import FaultInjector
+from harness.replay import Harness
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def harness(tmp_path, monkeypatch):
+    # The agent reads data/pricing.csv relative to the backend directory
+    monkeypatch.chdir(BACKEND_DIR)
+    h = Harness(FaultInjector(seed=1), str(tmp_path))
+    yield h
+    h.shutdown()
+
+
+def test_empty_email_is_recorded_skipped_and_not_retried(harness):
+    mailbox = harness.agent.mailboxes.all()[0]
+    msg_id = harness.gmail.deliver("blank@example.com", "   ")
+
+    harness.agent.sync_inbox()
+
+    entry = harness.agent.ledger.get(mailbox.ledger_key(msg_id))
+    assert entry["outcome"] == "SKIPPED"
+    assert msg_id not in mailbox.retry_ids
+    assert harness.gmail.drafts == []
+
+
+def test_leases_are_renewed_while_messages_are_in_flight(tmp_path, monkeypatch):
+    monkeypatch.chdir(BACKEND_DIR)
+    h = Harness(FaultInjector(latency_ms={"openai": 600}, seed=1), str(tmp_path))
+    try:
+        ledger = h.agent.ledger
+        ledger.lease_seconds = 0.3
+        renewed = []
+        renew_lease = ledger.renew_lease
+        monkeypatch.setattr(ledger, "renew_lease", lambda key: renewed.append(key) or renew_lease(key))
+        # Needs advice, so it goes to the (slow) LLM rather than the local rules
+        msg_id = h.gmail.deliver("unsure@example.com", "Not sure what I need, something's wrong with the heating.")
+
+        h.agent.sync_inbox()
+
+        mailbox = h.agent.mailboxes.all()[0]
+        assert mailbox.ledger_key(msg_id) in renewed
+        assert h.agent.ledger.get(mailbox.ledger_key(msg_id))["outcome"] == "QUOTED"
+    finally:
+        h.shutdown()
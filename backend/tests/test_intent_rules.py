@@ -0,0 +1,65 @@
+"""Tests for the rule-based fast path parser."""
+
+import os
+
+import pytest
+
+from services.intent_rules import RuleBasedIntentExtractor
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# FAST_PATH_MIN_CONFIDENCE default in main.py
+FAST_PATH_MIN_CONFIDENCE = 80
+
+
+@pytest.fixture(scope="module")
+def rules():
+    return RuleBasedIntentExtractor(os.path.join(BACKEND_DIR, "data", "pricing.csv"))
+
+
+def _items(result):
+    return [(item["service_requested"], item["quantity"]) for item in result["extracted_items"]]
+
+
+@pytest.mark.parametrize("body, expected", [
+    ("Hi, I need a new furnace installed. Thanks, John Smith", [("Furnace Installation", 1)]),
+    ("Please quote 2 AC installations", [("AC Installation", 2)]),
+    ("Can you install a smart thermostat?", [("Thermostat Installation", 1)]),
+    ("Need an air filter replacement", [("Air Filter Replacement", 1)]),
+])
+def test_routine_requests_take_the_fast_path(rules, body, expected):
+    result = rules.extract(body)
+
+    assert _items(result) == expected
+    assert result["confidence_score"] >= FAST_PATH_MIN_CONFIDENCE
+
+
+@pytest.mark.parametrize("body", [
+    "I need my ducts cleaned",
+    "Cancel my furnace installation",
+    "Please send me an invoice for the furnace installation you did",
+    "Don't install a furnace, just the AC please",
+    "I need a furnace installed and 3 thermostats",
+    "Not sure what I need, maybe a furnace installation?",
+])
+def test_non_routine_wording_is_left_to_the_llm(rules, body):
+    assert rules.extract(body)["confidence_score"] < FAST_PATH_MIN_CONFIDENCE
+
+
+def test_negated_service_is_not_quoted(rules):
+    result = rules.extract("Don't install a furnace, just the AC please")
+
+    assert "Furnace Installation" not in [name for name, _ in _items(result)]
+
+
+def test_quantity_only_counts_directly_in_front_of_the_service(rules):
+    result = rules.extract("We have 3 units in the 2 story house. I need 2 furnaces installed.")
+
+    assert ("Furnace Installation", 2) in _items(result)
+
+
+def test_unmatched_email_scores_zero(rules):
+    result = rules.extract("What are your opening hours?")
+
+    assert result["confidence_score"] == 0
+    assert result["extracted_items"] == []
@@ -0,0 +1,57 @@
+"""Tests for ArrayItemStream."""
+
+import json
+
+import pytest
+
+from services.json_stream import ArrayItemStream
+
+DOCUMENT = json.dumps({
+    "customer_name": "Jane [the \"boss\"] {Doe}",
+    "extracted_items": [
+        {"service_requested": "Furnace Installation", "quantity": 2, "notes": "braces } ] in \\ a string"},
+        {"service_requested": "AC Repair", "quantity": 1, "tags": [["nested"], {"deep": [1, 2]}]},
+        {"service_requested": "Ductwork Installation", "quantity": 1}
+    ],
+    "confidence_score": 90,
+    "later": [{"not": "wanted"}]
+})
+ITEMS = json.loads(DOCUMENT)["extracted_items"]
+
+
+def _feed_in_pieces(stream, text, size):
+    items = []
+    for start in range(0, len(text), size):
+        items.extend(stream.feed(text[start:start + size]))
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 64, len(DOCUMENT)])
+def test_items_are_the_same_whatever_the_chunk_boundaries(size):
+    stream = ArrayItemStream(key="extracted_items")
+
+    assert _feed_in_pieces(stream, DOCUMENT, size) == ITEMS
+
+
+def test_each_item_arrives_once_its_closing_brace_does():
+    stream = ArrayItemStream(key="extracted_items")
+    # The first "}" after the item is inside its notes string
+    first_end = DOCUMENT.index('string"}') + len('string"}')
+
+    assert stream.feed(DOCUMENT[:first_end - 1]) == []
+    assert stream.feed(DOCUMENT[first_end - 1:first_end]) == ITEMS[:1]
+
+
+def test_only_the_requested_array_is_scanned():
+    stream = ArrayItemStream(key="later")
+
+    assert stream.feed(DOCUMENT) == [{"not": "wanted"}]
+
+
+def test_reset_starts_over_for_a_retried_stream():
+    stream = ArrayItemStream(key="extracted_items")
+    stream.feed(DOCUMENT[:len(DOCUMENT) // 2])
+
+    stream.reset()
+
+    assert _feed_in_pieces(stream, DOCUMENT, 5) == ITEMS
@@ -0,0 +1,108 @@
+"""Tests for MessageLedger outcomes, leases and compaction."""
+
+import sqlite3
+import threading
+
+import pytest
+
+from services.ledger_service import MessageLedger
+
+
+@pytest.fixture
+def db_path(tmp_path):
+    return str(tmp_path / "ledger.db")
+
+
+def test_lease_is_exclusive_until_released(db_path):
+    first = MessageLedger(db_path, owner_id="first")
+    second = MessageLedger(db_path, owner_id="second")
+
+    assert first.acquire_lease("m1")
+    assert not second.acquire_lease("m1")
+    first.release_lease("m1")
+    assert second.acquire_lease("m1")
+
+
+def test_expired_lease_can_be_taken_over(db_path):
+    first = MessageLedger(db_path, owner_id="first", lease_seconds=-1)
+    second = MessageLedger(db_path, owner_id="second")
+
+    assert first.acquire_lease("m1")
+    assert second.acquire_lease("m1")
+    assert not first.renew_lease("m1")
+
+
+def test_renew_lease_extends_only_own_lease(db_path):
+    first = MessageLedger(db_path, owner_id="first")
+    second = MessageLedger(db_path, owner_id="second")
+
+    first.acquire_lease("m1")
+
+    assert first.renew_lease("m1")
+    assert not second.renew_lease("m1")
+
+
+def test_lease_refused_once_another_instance_finished_the_message(db_path):
+    first = MessageLedger(db_path, owner_id="first")
+    second = MessageLedger(db_path, owner_id="second")
+
+    # Both checked the ledger before either took a lease
+    assert first.should_process("m1") and second.should_process("m1")
+    assert first.acquire_lease("m1")
+    first.record("m1", "QUOTED", quote_number="QT-1")
+    first.release_lease("m1")
+
+    assert not second.acquire_lease("m1")
+
+
+def test_lease_refused_after_max_attempts(db_path):
+    ledger = MessageLedger(db_path, owner_id="first", max_attempts=2)
+    for _ in range(2):
+        assert ledger.acquire_lease("m1")
+        ledger.record("m1", "FAILED", error="boom")
+        ledger.release_lease("m1")
+
+    assert not ledger.acquire_lease("m1")
+
+
+def test_concurrent_instances_quote_each_message_once(db_path):
+    message_ids = [f"m{index}" for index in range(50)]
+    quoted = []
+    lock = threading.Lock()
+
+    def worker(owner_id):
+        ledger = MessageLedger(db_path, owner_id=owner_id)
+        for msg_id in message_ids:
+            if not ledger.should_process(msg_id) or not ledger.acquire_lease(msg_id):
+                continue
+            with lock:
+                quoted.append(msg_id)
+            ledger.record(msg_id, "QUOTED")
+            ledger.release_lease(msg_id)
+
+    threads = [threading.Thread(target=worker, args=(f"owner-{index}",)) for index in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(quoted) == sorted(message_ids)
+
+
+def test_compact_keeps_tombstones_of_finished_messages(db_path):
+    ledger = MessageLedger(db_path, max_attempts=2)
+    ledger.record("quoted", "QUOTED", quote_number="QT-1")
+    ledger.record("skipped", "SKIPPED", error="Email has no body text to quote from")
+    ledger.record("exhausted", "FAILED", error="boom")
+    ledger.record("exhausted", "FAILED", error="boom")
+    ledger.record("retryable", "FAILED", error="boom")
+    with sqlite3.connect(db_path) as conn:
+        conn.execute("UPDATE processed_messages SET updated_at = 0")
+
+    assert ledger.compact(max_age_days=30) == 1
+
+    assert ledger.get("retryable") is None
+    for msg_id in ("quoted", "skipped", "exhausted"):
+        entry = ledger.get(msg_id)
+        assert entry["quote_number"] is None and entry["error"] is None
+        assert not ledger.should_process(msg_id)
@@ -0,0 +1,76 @@
+"""Tests for LLMBatchClient submission, state saving and resume."""
+
+import json
+import time
+
+import pytest
+
+from harness.fakes import FakeBatchAPI, FakeOpenAI, FaultInjector, InjectedFault
+from services.llm_batch import LLMBatchClient
+from services.llm_client import LLMUnavailableError
+
+
+def _requests(count):
+    return {
+        f"email-{index}": {"model": "gpt-4o-mini", "messages": [{"role": "user", "content": f"Need {index} furnaces"}]}
+        for index in range(count)
+    }
+
+
+def _client(api, state_path):
+    return LLMBatchClient(
+        client=api, poll_interval=0.01, max_requests=2, state_path=str(state_path),
+        max_retries=0, base_delay=0.0
+    )
+
+
+@pytest.fixture
+def api():
+    faults = FaultInjector(seed=1)
+    return FakeBatchAPI(faults, FakeOpenAI(faults, catalog=[]))
+
+
+def test_resume_submits_chunks_a_failed_run_never_reached(api, tmp_path):
+    state_path = tmp_path / "batches.json"
+    requests = _requests(6)  # three chunks of two
+    create = api.batches.create
+    calls = []
+
+    def flaky_create(**kwargs):
+        calls.append(kwargs)
+        if len(calls) == 2:
+            raise InjectedFault("batches.create failed")
+        return create(**kwargs)
+
+    api.batches.create = flaky_create
+    with pytest.raises(LLMUnavailableError):
+        _client(api, state_path).run(requests)
+
+    saved = json.loads(state_path.read_text())
+    assert [list(entry["batch_ids"]) for entry in saved.values()] == [["0"]]
+
+    api.batches.create = create
+    results = _client(api, state_path).run(requests)
+
+    assert set(results) == set(requests)
+    assert all("body" in result for result in results.values())
+    # Chunk 0 was polled again rather than submitted twice
+    assert len(api._batches) == 3
+    assert json.loads(state_path.read_text()) == {}
+
+
+def test_resume_reads_state_files_that_list_ids_in_chunk_order(api, tmp_path):
+    state_path = tmp_path / "batches.json"
+    requests = _requests(4)
+    client = _client(api, state_path)
+    first = api.batches.create(
+        input_file_id=api.files.create(file=("a.jsonl", ("\n".join(client._chunks(requests)[0]) + "\n").encode()),
+                                       purpose="batch").id,
+        endpoint=client.ENDPOINT, completion_window="24h"
+    )
+    state_path.write_text(json.dumps({client._run_key(requests): {"batch_ids": [first.id], "submitted_at": time.time()}}))
+
+    results = client.run(requests)
+
+    assert all("body" in result for result in results.values())
+    assert len(api._batches) == 2
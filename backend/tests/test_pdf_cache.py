@@ -0,0 +1,89 @@
+"""Tests for PDFCache eviction and single-flight rendering."""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from services.pdf_cache import PDFCache
+
+
+def _pdf(label, size=100):
+    return (b"%PDF-" + label.encode("ascii")).ljust(size, b"x")
+
+
+@pytest.fixture
+def cache(tmp_path):
+    return PDFCache(cache_dir=str(tmp_path / "pdf_cache"), max_bytes=250)
+
+
+def test_miss_renders_and_hit_reads_from_disk(cache):
+    renders = []
+
+    first = cache.get_or_render("a" * 64, lambda: renders.append(1) or _pdf("a"))
+    second = cache.get_or_render("a" * 64, lambda: renders.append(1) or _pdf("a"))
+
+    assert first == second == _pdf("a")
+    assert renders == [1]
+    assert os.path.exists(cache.path_for("a" * 64))
+
+
+def test_least_recently_used_pdf_is_evicted(cache):
+    cache.put("a" * 64, _pdf("a"))
+    cache.put("b" * 64, _pdf("b"))
+    # Reading "a" makes "b" the least recently used
+    assert cache.get("a" * 64) == _pdf("a")
+
+    cache.put("c" * 64, _pdf("c"))
+
+    assert cache.get("b" * 64) is None
+    assert cache.get("a" * 64) == _pdf("a")
+    assert cache.get("c" * 64) == _pdf("c")
+    assert not os.path.exists(cache.path_for("b" * 64))
+
+
+def test_eviction_order_survives_a_restart(cache):
+    cache.put("a" * 64, _pdf("a"))
+    time.sleep(0.01)
+    cache.put("b" * 64, _pdf("b"))
+
+    reopened = PDFCache(cache_dir=cache.cache_dir, max_bytes=250)
+    reopened.put("c" * 64, _pdf("c"))
+
+    assert reopened.get("a" * 64) is None
+    assert reopened.get("b" * 64) == _pdf("b")
+
+
+def test_concurrent_misses_share_one_render(cache):
+    renders = []
+
+    def render():
+        renders.append(1)
+        time.sleep(0.2)
+        return _pdf("slow")
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        results = list(pool.map(lambda _: cache.get_or_render("d" * 64, render), range(8)))
+
+    assert renders == [1]
+    assert results == [_pdf("slow")] * 8
+
+
+def test_failed_render_is_raised_to_every_waiter_and_not_cached(cache):
+    release = threading.Event()
+
+    def render():
+        release.wait(1)
+        raise RuntimeError("render failed")
+
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        futures = [pool.submit(cache.get_or_render, "e" * 64, render) for _ in range(4)]
+        time.sleep(0.05)
+        release.set()
+        errors = [future.exception() for future in futures]
+
+    assert all(isinstance(error, RuntimeError) for error in errors)
+    assert cache.get("e" * 64) is None
+    assert cache.get_or_render("e" * 64, lambda: _pdf("e")) == _pdf("e")
@@ -0,0 +1,64 @@
+"""Tests for quote number allocation."""
+
+import multiprocessing
+import re
+import threading
+
+import pytest
+
+from services import quote_ids
+from services.quote_ids import QuoteNumberAllocator, next_quote_number
+
+NUMBER = re.compile(r"^QT-\d{8}-\d{6}-\d{3}-[0-9A-F]{4}-[0-9A-F]{6}-\d{4}(-[A-Z0-9]+)?$")
+
+
+def _allocate(count):
+    return [next_quote_number() for _ in range(count)]
+
+
+def test_number_format_and_tenant_suffix():
+    allocator = QuoteNumberAllocator(worker_id=0x7F3A)
+
+    number = allocator.next(tenant="con-1")
+
+    assert NUMBER.match(number)
+    assert "-7F3A-" in number and number.endswith("-CON1")
+
+
+def test_numbers_are_unique_across_threads():
+    allocator = QuoteNumberAllocator(worker_id=1)
+    numbers = []
+    lock = threading.Lock()
+
+    def worker():
+        batch = [allocator.next() for _ in range(2000)]
+        with lock:
+            numbers.extend(batch)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert len(set(numbers)) == len(numbers)
+
+
+@pytest.fixture
+def shared_worker_id(monkeypatch):
+    """The process-wide allocator, configured as if started with QUOTE_WORKER_ID=7."""
+    monkeypatch.setenv("QUOTE_WORKER_ID", "7")
+    quote_ids._default_allocator._reset()
+    yield
+    monkeypatch.undo()
+    quote_ids._default_allocator._reset()
+
+
+@pytest.mark.skipif("fork" not in multiprocessing.get_all_start_methods(), reason="needs fork")
+def test_numbers_are_unique_across_forked_workers_sharing_a_worker_id(shared_worker_id):
+    with multiprocessing.get_context("fork").Pool(4) as pool:
+        numbers = [number for batch in pool.map(_allocate, [2000] * 8) for number in batch]
+    numbers += _allocate(2000)
+
+    assert len(set(numbers)) == len(numbers)
+    assert {number.split("-")[4] for number in numbers} == {"0007"}
@@ -3,20 +3,20 @@ Velocity Logic - Web Interface
 Simple Flask web interface for the Velocity Logic agent.
 """
 
-from flask import Flask, render_template_string, request, jsonify, send_file, Response
+from flask import Flask, render_template_string, request, jsonify, send_file, Response, g
 import os
 import json
 from datetime import datetime
-from main import VelocityLogicAgent
 import threading
 import time
-from services.voice_service import VoiceService, MockVoiceService
+from services.metrics import REGISTRY, HTTP_REQUEST_SECONDS
+from services.quote_ids import next_quote_number
+from services.lazy_service import LazyService
+from services.pdf_cache import sharded_path
 
 app = Flask(__name__)
 app.config['UPLOAD_FOLDER'] = 'output'
 
-# Initialize agent
-agent = None
 agent_status = {
     "running": False,
     "last_check": None,
@@ -24,25 +24,56 @@ agent_status = {
     "errors": []
 }
 
-def init_agent():
-    """Initialize the agent in a separate thread."""
-    global agent
+def build_agent():
+    """Construct the agent (OpenAI, pandas, fpdf and Gmail OAuth) and start PDF retention."""
+    from main import VelocityLogicAgent
+    from services.pdf_retention import PDFRetentionManager
+    agent = VelocityLogicAgent()
+    if os.getenv('PDF_RETENTION_ENABLED', 'true').lower() != 'false':
+        PDFRetentionManager.from_env(agent.pdf_service, agent.pdf_cache, agent.pdf_archive, load_all_quotes).start()
+    return agent
+
+def build_voice_service():
+    """Load the Whisper model, falling back to the mock service."""
+    from services.voice_service import VoiceService, MockVoiceService
     try:
-        agent = VelocityLogicAgent()
-        print("✓ Agent initialized for web interface")
-    except Exception as e:
-        print(f"✗ Error initializing agent: {e}")
-        agent = None
+        return VoiceService()
+    except Exception:
+        print("⚠ Using Mock Voice Service (Whisper not initialized)")
+        return MockVoiceService()
+
+# Services are built on first use so cold starts don't pay for them;
+# WARMUP_SERVICES (e.g. "agent,voice") builds them in the background instead
+agent_service = LazyService("agent", build_agent)
+voice = LazyService("voice", build_voice_service)
+SERVICES = {"agent": agent_service, "voice": voice}
 
-# Initialize agent on startup
-init_agent()
+def get_agent():
+    return agent_service.get()
 
-# Initialize Voice Service
-try:
-    voice_service = VoiceService()
-except:
-    print("⚠ Using Mock Voice Service (Whisper not initialized)")
-    voice_service = MockVoiceService()
+def warm_up_services(names):
+    for name in names:
+        if name in SERVICES:
+            SERVICES[name].warm_up()
+
+warm_up_services([s.strip() for s in os.getenv('WARMUP_SERVICES', '').split(',') if s.strip()])
+
+@app.before_request
+def start_request_timer():
+    g.request_started = time.perf_counter()
+
+@app.after_request
+def record_request_latency(response):
+    started = g.pop('request_started', None)
+    if started is not None:
+        route = request.url_rule.rule if request.url_rule else 'unmatched'
+        HTTP_REQUEST_SECONDS.observe(
+            time.perf_counter() - started,
+            route=route,
+            method=request.method,
+            status=response.status_code
+        )
+    return response
 
 QUOTES_DB = 'data/quotes.json'
 CALENDAR_DB = 'data/calendar.json'
@@ -68,6 +99,16 @@ def get_current_contractor_id():
     """Extract contractor ID from header for multi-tenancy scoping."""
     return request.headers.get('X-Impersonate-Client-ID')
 
+def load_all_quotes():
+    """Every contractor's quotes; usable outside a request (e.g. background threads)."""
+    if not os.path.exists(QUOTES_DB):
+        return []
+    try:
+        with open(QUOTES_DB, 'r') as f:
+            return json.load(f)
+    except:
+        return []
+
 def load_quotes():
     if not os.path.exists('data'):
         os.makedirs('data')
@@ -472,12 +513,24 @@ def index():
 def get_status():
     """Get agent status."""
     return jsonify({
-        "agent_ready": agent is not None,
+        "agent_ready": agent_service.ready,
         "processed_count": agent_status["processed_count"],
         "last_check": agent_status["last_check"],
         "contractor_id": get_current_contractor_id()
     })
 
+@app.route('/api/ready')
+def get_readiness():
+    """Readiness probe: 200 once the agent is built, 503 while it is loading or failed."""
+    services = {name: service.status() for name, service in SERVICES.items()}
+    status_code = 200 if agent_service.ready else 503
+    return jsonify({"ready": agent_service.ready, "services": services}), status_code
+
+@app.route('/api/metrics')
+def get_metrics():
+    """Expose latency histograms, cache hit ratios and queue depths in Prometheus text format."""
+    return Response(REGISTRY.render(), mimetype='text/plain; version=0.0.4')
+
 @app.route('/api/auth/login', methods=['POST'])
 def login():
     data = request.json
@@ -563,7 +616,7 @@ import io
 
 # Initialize services
 rebate_service = RebateService()
-TEMPLATES_DB = 'data/templates.json'
+TEMPLATES_DB = os.getenv("QUOTE_TEMPLATES_PATH", 'data/templates.json')
 
 def load_templates():
     if not os.path.exists(TEMPLATES_DB):
@@ -596,9 +649,19 @@ def calculate_priority_score(quote):
         
     return round(score, 1)
 
+def failure_response(result):
+    """Error response for a failed process_email; LLM overload becomes a retryable 503."""
+    if result.get("retryable"):
+        response = jsonify({"success": False, "error": result.get("error"), "retryable": True})
+        response.status_code = 503
+        response.headers['Retry-After'] = str(int(result.get("retry_after") or 30))
+        return response
+    return jsonify({"success": False, "error": result.get("error")}), 500
+
 @app.route('/api/process-email', methods=['POST'])
 def process_email():
     """Process an email and generate a quote."""
+    agent = get_agent()
     if agent is None:
         return jsonify({"success": False, "error": "Agent not initialized"}), 500
     
@@ -619,25 +682,11 @@ def process_email():
             markup_percent=markup_percent,
             winter_multiplier_active=winter_multiplier_active,
             city=city,
-            province=province
+            province=province,
+            contractor_id=get_current_contractor_id()
         )
         
-        # Phase 10: AI-Template Pre-population
-        template_matched = False
-        template_hint = result.get("template_hint")
-        if template_hint:
-            templates = load_templates()
-            match = next((t for t in templates if template_hint.lower() in t.get('name', '').lower()), None)
-            if match:
-                print(f"✨ AI Template Match: {match['name']}")
-                result["quote_data"]["line_items"] = match["line_items"]
-                # Recalculate totals for the new items
-                subtotal = sum(item["line_total"] for item in match["line_items"])
-                tax = subtotal * 0.10
-                result["quote_data"]["subtotal"] = subtotal
-                result["quote_data"]["tax"] = tax
-                result["quote_data"]["total"] = subtotal + tax
-                template_matched = True
+        # Phase 10: AI-Template Pre-population happens in the agent, before the PDF is keyed
 
         if result.get("success"):
             # Check for rebates
@@ -648,6 +697,7 @@ def process_email():
             quote_data = {
                 "id": result["quote_number"],
                 "quote_number": result["quote_number"],
+                "contractor_id": result.get("contractor_id"),
                 "customer_name": result["customer_name"],
                 "customer_email": customer_email,
                 "province": province,
@@ -658,10 +708,13 @@ def process_email():
                 "markup_percent": markup_percent,
                 "winter_multiplier_active": winter_multiplier_active,
                 "winter_surcharge_total": result["quote_data"].get("winter_surcharge_total", 0),
-                "pdf_url": f"/api/pdf/{os.path.basename(result['pdf_path'])}",
+                # The version makes the URL immutable, so browsers can cache it for good
+                "pdf_url": f"/api/pdf/quote_{result['quote_number']}.pdf?v={result['pdf_key'][:16]}",
+                # What the PDF is rendered from, so /api/pdf can render it again after eviction
+                "pdf_data": result["quote_data"],
                 "confidence_score": result["confidence_score"],
                 "ai_reasoning": result["ai_reasoning"],
-                "status": result["status"] if result["confidence_score"] >= 70 else "NEEDS_REVIEW",
+                "status": result["status"],
                 "status_history": result["status_history"],
                 "eligible_rebates": eligible_rebates,
                 "net_cost_estimate": rebate_calc,
@@ -672,9 +725,10 @@ def process_email():
             quote_data["priority_score"] = calculate_priority_score(quote_data)
             
             save_quote(quote_data)
+            agent_status["processed_count"] += 1
             return jsonify(quote_data)
         
-        return jsonify({"success": False, "error": result.get("error")}), 500
+        return failure_response(result)
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
 
@@ -704,6 +758,51 @@ def export_quotes():
         headers={"Content-disposition": "attachment; filename=quotes_export.csv"}
     )
 
+@app.route('/api/quotes/export/pdf')
+def export_quote_pdfs():
+    """
+    Download the PDFs of a filtered set of quotes as a zip (default) or, with
+    format=pdf, one merged PDF. Filters: ids (comma-separated), status, since, until.
+    """
+    agent = get_agent()
+    if agent is None:
+        return jsonify({"success": False, "error": "Agent not initialized"}), 500
+    
+    ids = {i for i in request.args.get('ids', '').split(',') if i}
+    statuses = {s for s in request.args.get('status', '').split(',') if s}
+    since = request.args.get('since')
+    until = request.args.get('until')
+    
+    quotes = [
+        q for q in load_quotes()
+        if (not ids or q.get('id') in ids)
+        and (not statuses or q.get('status') in statuses)
+        and (not since or q.get('created_at', '') >= since)
+        and (not until or q.get('created_at', '') <= until)
+    ]
+    # Imported quotes have nothing to render a PDF from
+    renderable = [
+        {"customer_name": q["customer_name"], "quote_data": q["pdf_data"], "quote_number": q["quote_number"]}
+        for q in quotes if q.get('pdf_data')
+    ]
+    if not renderable:
+        return jsonify({"success": False, "error": "No matching quotes with PDFs"}), 404
+    max_quotes = int(os.getenv("PDF_BULK_MAX_QUOTES", "500"))
+    if len(renderable) > max_quotes:
+        return jsonify({"success": False, "error": f"Too many quotes ({len(renderable)}); narrow the filter to {max_quotes} or fewer"}), 400
+    headers = {"X-Skipped-Quotes": str(len(quotes) - len(renderable))}
+    
+    if request.args.get('format') == 'pdf':
+        try:
+            merged = agent.pdf_bulk.merged_pdf(renderable)
+        except RuntimeError as e:
+            return jsonify({"success": False, "error": str(e)}), 501
+        headers["Content-Disposition"] = "attachment; filename=quotes.pdf"
+        return Response(merged, mimetype="application/pdf", headers=headers)
+    
+    headers["Content-Disposition"] = "attachment; filename=quotes.zip"
+    return Response(agent.pdf_bulk.iter_zip(renderable), mimetype="application/zip", headers=headers)
+
 @app.route('/api/templates', methods=['GET', 'POST'])
 def manage_templates():
     if request.method == 'POST':
@@ -731,7 +830,7 @@ def import_csv():
     
     for row in csv_input:
         # Expected columns: customer_name, customer_email, service, total, date
-        quote_id = f"IMP-{int(time.time())}-{imported_count}"
+        quote_id = next_quote_number(tenant=contractor_id, prefix="IMP")
         new_quote = {
             "id": quote_id,
             "quote_number": quote_id,
@@ -763,11 +862,14 @@ def process_voice():
     audio_file.save(temp_path)
     
     try:
-        transcript = voice_service.transcribe(temp_path)
+        transcript = voice.get().transcribe(temp_path)
         if not transcript:
             return jsonify({"success": False, "error": "Transcription failed"}), 500
         
         # Now process as if it were an email
+        agent = get_agent()
+        if agent is None:
+            return jsonify({"success": False, "error": "Agent not initialized"}), 500
         data = request.form.to_dict()
         result = agent.process_email(
             transcript,
@@ -775,7 +877,8 @@ def process_voice():
             markup_percent=float(data.get('markup_percent', 0.0)),
             winter_multiplier_active=data.get('winter_multiplier_active', 'false').lower() == 'true',
             city=data.get('city'),
-            province=data.get('province', 'Manitoba')
+            province=data.get('province', 'Manitoba'),
+            contractor_id=get_current_contractor_id()
         )
         
         if result.get("success"):
@@ -783,9 +886,10 @@ def process_voice():
             result["transcript"] = transcript
             result["source"] = "VOICE"
             save_quote(result)
+            agent_status["processed_count"] += 1
             return jsonify(result)
         else:
-            return jsonify(result), 500
+            return failure_response(result)
             
     except Exception as e:
         return jsonify({"success": False, "error": str(e)}), 500
@@ -896,6 +1000,38 @@ def sms_webhook():
             
     return jsonify({"success": False, "error": "Invalid command or no matching quote"}), 400
 
+@app.route('/api/webhook/gmail', methods=['POST'])
+def gmail_push_webhook():
+    """Handle Gmail push notifications delivered by a Pub/Sub push subscription."""
+    expected_token = os.getenv('GMAIL_PUSH_TOKEN')
+    if expected_token and request.args.get('token') != expected_token:
+        return jsonify({"error": "Invalid token"}), 403
+    
+    envelope = request.get_json(silent=True) or {}
+    message = envelope.get('message') or {}
+    try:
+        import base64
+        notification = json.loads(base64.b64decode(message.get('data', '')).decode('utf-8'))
+        history_id = str(int(notification['historyId']))
+    except Exception as e:
+        # Anything but a 2xx makes Pub/Sub redeliver, and a bad payload never gets better
+        print(f"⚠ Ignoring malformed Gmail push message: {e}")
+        return '', 204
+    
+    agent = get_agent()
+    if agent is None:
+        return jsonify({"error": "Agent not initialized"}), 503
+    
+    agent.notify_push(history_id, notification.get('emailAddress'))
+    agent_status["last_check"] = datetime.now().isoformat()
+    
+    # No polling loop in this process - run the incremental sync ourselves
+    if not agent.loop_running:
+        threading.Thread(target=agent.sync_inbox, daemon=True).start()
+    
+    # Any 2xx acknowledges the message to Pub/Sub
+    return '', 204
+
 @app.route('/api/pixel/<quote_id>')
 def track_pixel(quote_id):
     """Track when an email is opened."""
@@ -920,11 +1056,56 @@ def track_pixel(quote_id):
 
 @app.route('/api/pdf/<filename>')
 def get_pdf(filename):
-    """Serve PDF files."""
-    file_path = os.path.join('output', filename)
-    if os.path.exists(file_path):
-        return send_file(file_path, mimetype='application/pdf')
-    return jsonify({"error": "PDF not found"}), 404
+    """Serve a quote's PDF, rendering it on first request."""
+    quote_number = filename[len("quote_"):-len(".pdf")] if filename.startswith("quote_") and filename.endswith(".pdf") else None
+    quote = next((q for q in load_quotes() if quote_number and q.get("quote_number") == quote_number and q.get("pdf_data")), None)
+    agent = get_agent() if quote else None
+    if agent is not None:
+        last_modified = datetime.fromisoformat(quote.get('updated_at') or quote['created_at']).astimezone() if quote.get('created_at') else None
+        for attempt in range(2):
+            key, path = agent.quote_pdf(quote["customer_name"], quote["pdf_data"], quote["quote_number"])
+            compressed_path = agent.pdf_cache.compressed_path_for(key)
+            gzip_ok = compressed_path and 'Range' not in request.headers and 'gzip' in request.accept_encodings
+            try:
+                response = send_file(
+                    compressed_path if gzip_ok else path,
+                    mimetype='application/pdf',
+                    download_name=filename,
+                    etag=f"{key}.gz" if gzip_ok else key,
+                    last_modified=last_modified,
+                    conditional=True
+                )
+                break
+            except FileNotFoundError:
+                # Evicted between lookup and open; render it again
+                if attempt:
+                    raise
+        if gzip_ok:
+            response.headers['Content-Encoding'] = 'gzip'
+        response.headers['Vary'] = 'Accept-Encoding'
+        # Versioned URLs point at one exact PDF; others must be revalidated (cheap 304s)
+        if request.args.get('v') and key.startswith(request.args['v']):
+            response.headers['Cache-Control'] = 'private, max-age=31536000, immutable'
+        else:
+            response.headers['Cache-Control'] = 'private, no-cache'
+        return response
+    
+    # Quotes saved before PDFs were cached, in the flat or sharded output/ layout or archived
+    name = os.path.basename(filename)
+    response = None
+    for file_path in (os.path.join('output', name), sharded_path('output', name)):
+        if os.path.exists(file_path):
+            response = send_file(file_path, mimetype='application/pdf', conditional=True)
+            break
+    else:
+        agent = get_agent()
+        archived = agent.pdf_archive.get(name) if agent is not None else None
+        if archived is not None:
+            response = send_file(io.BytesIO(archived), mimetype='application/pdf', download_name=name, conditional=True)
+    if response is None:
+        return jsonify({"error": "PDF not found"}), 404
+    response.headers['Cache-Control'] = 'private, no-cache'
+    return response
 
 def load_calendar():
     if not os.path.exists(CALENDAR_DB): return []
@@ -1022,5 +1203,7 @@ if __name__ == '__main__':
     print("=" * 60)
     print("📱 Open your browser to: http://localhost:5001")
     print("=" * 60)
+    # A long-running server can afford to build everything up front
+    warm_up_services(SERVICES)
     app.run(debug=False, host='0.0.0.0', port=5001)
 